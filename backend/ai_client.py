@@ -1,10 +1,29 @@
+import asyncio
 import base64
 import re
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_MAX_TOKENS
-from ocr_utils import find_text_on_screen
+import time
+from api_client import ApiClient
+from config import (OPENAI_MODEL, OPENAI_MAX_TOKENS, OPENAI_STREAM, UPLOAD_DETAIL,
+                    INSTRUCTIONS_INPUT, RESPONSE_FORMAT, LOCAL_IDENTIFY, ICON_LOCATOR, ICON_CROP_SIZE)
+from icon_locator import find_icon, propose_icon, remember_icon
+from knowledge_base import knowledge_base, normalize_key
+from ocr_utils import find_text_on_screen, get_ocr_index, to_coordinates
+from screenshot import as_frame, load_image
+from image_prep import prepare_upload
+from program_cache import define_program_cache, perceptual_hash
+from program_identity import identify_program
+from structured_output import StructuredOutputError, decode, empty, partial, repair_messages, response_format
+import tracing
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = ApiClient()
+
+STEP_RULES = {
+    "elements": '- End EVERY step with the ID of the element to use in square brackets, e.g. Click "Save" [12]',
+    "icons": ('- For an icon without visible text, end the step with the icon centre in the image, '
+              'e.g. Click the "Bold" icon @(412,88)'),
+    "none": "",
+}
+JSON_STEP_FIELDS = {"elements": ("element",), "icons": ("point",), "none": ()}
 
 
 def image_to_base64(path: str) -> str:
@@ -12,6 +31,22 @@ def image_to_base64(path: str) -> str:
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 
+def image_content(screenshot) -> dict:
+    """Готує скріншот до відправки та повертає блок повідомлення з зображенням"""
+    frame = as_frame(screenshot)
+    with tracing.span("encode") as item:
+        upload = prepare_upload(frame)
+        item.attrs["bytes"] = upload.sent_bytes
+    frame.upload_transform = upload.transform
+
+    print(f"📦 Upload: {upload.size[0]}x{upload.size[1]}, "
+          f"{upload.sent_bytes // 1024} KB (-{upload.savings:.0%} vs raw)")
+    return {
+        "type": "image_url",
+        "image_url": {"url": upload.data_url, "detail": UPLOAD_DETAIL}
+    }
+
+
 def parse_program_message(message: str) -> dict:
     name_match = re.search(r'Name:\s*"([^"]+)"', message)
     location_match = re.search(r'Location:\s*"([^"]+)"', message)
@@ -24,8 +59,74 @@ def parse_program_message(message: str) -> dict:
     }
 
 
-def define_program(screenshot_path: str) -> dict:
-    b64_img = image_to_base64(screenshot_path)
+def program_from_json(data: dict) -> dict:
+    return {
+        "Name": data.get("name") or None,
+        "Location": data.get("location") or None,
+        "Actions": [action for action in data["actions"] if action]
+    }
+
+
+def structured_reply(text: str, name: str, fields: tuple = (), max_tokens: int = OPENAI_MAX_TOKENS,
+                     finish_reason: str = None):
+    """Декодує JSON відповідь за схемою name; невалідну - виправляє текстовим запитом без зображення"""
+    if finish_reason == "length":
+        # Обрізану відповідь виправлення не відновить: лишаємо елементи, що дійшли повністю
+        print("✂️ Відповідь обрізана - лише повні елементи")
+        with tracing.span("parse", format="json"):
+            try:
+                return partial(text, name, fields)
+            except StructuredOutputError as e:
+                # Схема не з одного масиву (program) або обрізано ще до масиву
+                print(f"✂️ Повних елементів немає ({e}) - порожній результат")
+                return empty(name, fields)
+    try:
+        with tracing.span("parse", format="json"):
+            return decode(text, name, fields)
+    except StructuredOutputError as e:
+        print(f"🔧 Невалідна відповідь ({e}) - запит на виправлення")
+        error = e
+
+    with tracing.span("repair", schema=name) as item:
+        response = client.create(
+            model=OPENAI_MODEL,
+            messages=repair_messages(text, error),
+            max_tokens=max_tokens,
+            response_format=response_format(name, fields)
+        )
+        item.add_usage(response.usage)
+    with tracing.span("parse", format="json"):
+        return decode(response.choices[0].message.content.strip(), name, fields)
+
+
+def cached_program(screenshot, use_cache: bool = True) -> tuple:
+    """Повертає (результат з кешу або None, перцептивний хеш скріншоту)"""
+    if not use_cache:
+        return None, None
+
+    with tracing.span("phash") as item:
+        phash = perceptual_hash(load_image(screenshot))
+        cached = define_program_cache.lookup(phash)
+        item.attrs["hit"] = cached is not None
+    if cached:
+        print(f"⚡ Кеш: {cached['Name']} ({define_program_cache.stats_text()})")
+    return cached, phash
+
+
+def program_request(screenshot, output: str = None) -> dict:
+    """Будує параметри запиту define_program"""
+    output = output or RESPONSE_FORMAT
+    if output == "json":
+        prompt = "Name the program, its current page path and 5 actions available here."
+        return dict(
+            model=OPENAI_MODEL,
+            messages=[{
+                "role": "user",
+                "content": [image_content(screenshot), {"type": "text", "text": prompt}]
+            }],
+            max_tokens=OPENAI_MAX_TOKENS,
+            response_format=response_format("program")
+        )
 
     prompt = """You are a UI expert analyzing a program screenshot in Base64 format.
     Response EXACTLY in this format:
@@ -39,26 +140,120 @@ def define_program(screenshot_path: str) -> dict:
 
     No explanations, no extra text."""
 
-    response = client.chat.completions.create(
+    return dict(
         model=OPENAI_MODEL,
         messages=[{
             "role": "user",
             "content": [
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{b64_img}"}
-                },
+                image_content(screenshot),
                 {"type": "text", "text": prompt}
             ]
         }],
         max_tokens=OPENAI_MAX_TOKENS
     )
 
+
+def actions_request(screenshot, identity: dict, output: str = None) -> dict:
+    """Будує скорочений запит: програма вже відома локально, потрібні лише дії"""
+    output = output or RESPONSE_FORMAT
+    if output == "json":
+        prompt = f"{identity['Name']}, {identity['Location']}. List 5 actions available here."
+        return dict(
+            model=OPENAI_MODEL,
+            messages=[{
+                "role": "user",
+                "content": [image_content(screenshot), {"type": "text", "text": prompt}]
+            }],
+            max_tokens=OPENAI_MAX_TOKENS,
+            response_format=response_format("actions")
+        )
+
+    prompt = f"""You are a UI expert analyzing a screenshot of {identity["Name"]}.
+    Current location: {identity["Location"]}
+    Response EXACTLY in this format:
+    Action: "action_1"
+    Action: "action_2"
+    Action: "action_3"
+    Action: "action_4"
+    Action: "action_5"
+
+    No explanations, no extra text."""
+
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[{
+            "role": "user",
+            "content": [image_content(screenshot), {"type": "text", "text": prompt}]
+        }],
+        max_tokens=OPENAI_MAX_TOKENS
+    )
+
+
+def local_identity(screenshot) -> dict:
+    """Повертає програму, визначену за активним вікном кадру, або None"""
+    if not LOCAL_IDENTIFY:
+        return None
+    with tracing.span("identify") as item:
+        identity = identify_program(getattr(screenshot, "window", None))
+        item.attrs["known"] = bool(identity and identity["Actions"])
+    return identity
+
+
+def program_result(response, phash, use_cache: bool = True, screenshot=None,
+                   identity: dict = None) -> dict:
     response_text = response.choices[0].message.content.strip()
     print(response_text)
     print("--" * 20)
 
-    return parse_program_message(response_text)
+    if RESPONSE_FORMAT == "json":
+        reply = structured_reply(response_text, "actions" if identity else "program",
+                                 finish_reason=response.choices[0].finish_reason)
+        program_info = program_from_json(reply)
+    else:
+        with tracing.span("parse"):
+            program_info = parse_program_message(response_text)
+    if identity:
+        program_info.update(Name=identity["Name"], Location=identity["Location"])
+    if use_cache and program_info["Name"]:
+        define_program_cache.store(phash, program_info, getattr(screenshot, "digest", None))
+    return program_info
+
+
+def define_program(screenshot, use_cache: bool = True) -> dict:
+    identity = local_identity(screenshot)
+    if identity and identity["Actions"]:
+        print(f"🪟 Локально: {identity['Name']} ({identity['Location']})")
+        return identity
+
+    cached, phash = cached_program(screenshot, use_cache)
+    if cached:
+        return cached
+
+    request = actions_request(screenshot, identity) if identity else program_request(screenshot)
+    with tracing.span("api", format=RESPONSE_FORMAT) as item:
+        response = client.create(**request)
+        item.add_usage(response.usage)
+    return program_result(response, phash, use_cache, screenshot, identity)
+
+
+async def adefine_program(screenshot, use_cache: bool = True) -> dict:
+    """Асинхронна версія define_program (CPU робота - в окремому потоці)"""
+    identity = local_identity(screenshot)
+    if identity and identity["Actions"]:
+        return identity
+
+    cached, phash = await asyncio.to_thread(cached_program, screenshot, use_cache)
+    if cached:
+        return cached
+
+    if identity:
+        request = await asyncio.to_thread(actions_request, screenshot, identity)
+    else:
+        request = await asyncio.to_thread(program_request, screenshot)
+    started = time.perf_counter()
+    response = await client.acreate(**request)
+    tracing.record("api", time.perf_counter() - started, usage=response.usage, format=RESPONSE_FORMAT)
+    return await asyncio.to_thread(program_result, response, phash, use_cache, screenshot, identity)
 
 
 def extract_quoted_text(text: str) -> list:
@@ -66,12 +261,47 @@ def extract_quoted_text(text: str) -> list:
     return re.findall(r'"([^"]+)"', text)
 
 
-def generate_instructions(program_name: str, current_location: str,
-                          action: str, screenshot_path: str = None) -> list:
+def screen_context(screenshot, rules: dict = STEP_RULES) -> tuple:
+    """Повертає (блоки повідомлення, додаткове правило): зображення або карта OCR елементів"""
+    if INSTRUCTIONS_INPUT == "elements":
+        try:
+            element_map = get_ocr_index(screenshot).element_map()
+        except Exception as e:
+            print(f"⚠️ Карта елементів недоступна: {e}")
+            element_map = ""
+
+        if element_map:
+            print(f"🗺 Елементи: {len(element_map.splitlines())}, {len(element_map) // 1024} KB")
+            text = f"On-screen text elements ([id] text @left,top,widthxheight):\n{element_map}"
+            return [{"type": "text", "text": text}], rules["elements"]
+
+    return [image_content(screenshot)], rules["icons" if ICON_LOCATOR else "none"]
 
-    if screenshot_path:
-        b64_img = image_to_base64(screenshot_path)
 
+def structured_messages(program_name: str, current_location: str, task: str, screenshot=None) -> tuple:
+    """Короткий запит інструкцій для JSON режиму: (повідомлення, додаткові поля кроку)"""
+    content, fields = screen_context(screenshot, JSON_STEP_FIELDS) if screenshot else ([], ())
+    prompt = (f"{program_name}, {current_location}. {task}\n"
+              f"Steps: imperative, one UI action each; labels: exact UI names used.")
+    return [{"role": "user", "content": content + [{"type": "text", "text": prompt}]}], fields
+
+
+def structured_completion(messages: list, name: str, fields: tuple, should_stop=None,
+                          max_tokens: int = OPENAI_MAX_TOKENS, result: dict = None):
+    """Отримує відповідь за схемою name і декодує її один раз; None, якщо запит скасовано"""
+    result = {} if result is None else result
+    text = "\n".join(completion_lines(messages, should_stop, max_tokens, result,
+                                      response_format=response_format(name, fields)))
+    if should_stop and should_stop():
+        return None
+    return structured_reply(text, name, fields, max_tokens, result.get("finish_reason"))
+
+
+def instructions_messages(program_name: str, current_location: str,
+                          action: str, screenshot=None) -> list:
+    """Будує повідомлення для запиту інструкцій (зі скріншотом або без)"""
+    if screenshot:
+        content, rule = screen_context(screenshot)
         prompt = f"""You are a UI expert analyzing {program_name}.
         Current location: {current_location}
         Required action: {action}
@@ -82,6 +312,7 @@ def generate_instructions(program_name: str, current_location: str,
         - Imperative form (Click, Type, Select, etc.)
         - NO explanations, numbers, or extra text
         - EVERY button must be in double quotes ""
+        {rule}
 
         Example:
         Click "File" menu
@@ -89,57 +320,337 @@ def generate_instructions(program_name: str, current_location: str,
         Type "document_name" in the "filename" field
         Click "Save" button"""
 
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{b64_img}"}
-                    },
-                    {"type": "text", "text": prompt}
-                ]
-            }],
-            max_tokens=OPENAI_MAX_TOKENS
-        )
+        return [{
+            "role": "user",
+            "content": content + [{"type": "text", "text": prompt}]
+        }]
 
-        text = response.choices[0].message.content.strip()
-    else:
-        prompt = f"""Generate step-by-step instructions for:
-        Program: {program_name}
-        Location: {current_location}
-        Action: {action}
+    prompt = f"""Generate step-by-step instructions for:
+    Program: {program_name}
+    Location: {current_location}
+    Action: {action}
 
-        Format:
-        - ONLY exact button names in DOUBLE QUOTES ("")
-        - One action per line
-        - Imperative form (Click, Type, Select)
-        - NO explanations or numbers"""
+    Format:
+    - ONLY exact button names in DOUBLE QUOTES ("")
+    - One action per line
+    - Imperative form (Click, Type, Select)
+    - NO explanations or numbers"""
+
+    return [{"role": "user", "content": prompt}]
+
+
+def completion_lines(messages: list, should_stop=None, max_tokens: int = OPENAI_MAX_TOKENS,
+                     result: dict = None, **options):
+    """Повертає рядки відповіді моделі по мірі їх надходження; finish_reason - у result"""
+    result = {} if result is None else result
+    output = "json" if "response_format" in options else "text"
+    if not OPENAI_STREAM:
+        with tracing.span("api", format=output) as item:
+            response = client.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                **options
+            )
+            item.add_usage(response.usage)
+        result["finish_reason"] = response.choices[0].finish_reason
+        yield from response.choices[0].message.content.strip().splitlines()
+        return
+
+    stream = client.stream(
+        should_stop=should_stop,
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream_options={"include_usage": True},
+        **options
+    )
+
+    buffer = ""
+    usage = None
+    waited = 0.0
+    first_token = None
+    try:
+        started = time.perf_counter()
+        for chunk in stream:
+            waited += time.perf_counter() - started
+            if first_token is None:
+                first_token = waited
+            if should_stop and should_stop():
+                return
+            usage = chunk.usage or usage
+            if chunk.choices:
+                buffer += chunk.choices[0].delta.content or ""
+                result["finish_reason"] = chunk.choices[0].finish_reason or result.get("finish_reason")
+            while "\n" in buffer:
+                line, buffer = buffer.split("\n", 1)
+                yield line
+            started = time.perf_counter()
+    finally:
+        stream.close()
+        tracing.record("api", waited, usage=usage, format=output,
+                       first_token_ms=round((first_token or 0) * 1000, 1))
+
+    if buffer:
+        yield buffer
+
+
+def parse_step(line: str, screenshot=None) -> dict:
+    """Розбирає один рядок інструкції та шукає його кнопку на скріншоті"""
+    step = line.strip("- 0123456789.").strip()
+    element_ids = [int(number) for number in re.findall(r"\[(\d+)\]", step)]
+    step = re.sub(r"\s*\[\d+\]", "", step).strip()
+    hint = re.search(r"@\(\s*(\d+)\s*,\s*(\d+)\s*\)", step)
+    step = re.sub(r"\s*@\(\s*\d+\s*,\s*\d+\s*\)", "", step).strip()
+    if not step:
+        return None
+    hint = (int(hint.group(1)), int(hint.group(2))) if hint else None
+    return build_step(step, extract_quoted_text(step), element_ids, hint, screenshot)
+
+
+def json_step(item: dict, screenshot=None) -> dict:
+    """Перетворює крок JSON відповіді на step_data: назви - з поля labels, без розбору тексту"""
+    action = item["action"].strip()
+    if not action:
+        return None
+    point = item.get("point")
+    element_ids = [item["element"]] if item.get("element") is not None else []
+    hint = (point["x"], point["y"]) if point else None
+    return build_step(action, item["labels"] or extract_quoted_text(action), element_ids, hint, screenshot)
+
+
+def build_step(action: str, quoted_text: list, element_ids: list, hint: tuple = None,
+               screenshot=None) -> dict:
+    """Збирає step_data та шукає елемент: карта елементів, іконка/OCR, підказка моделі"""
+    step_data = {
+        "action": action,
+        "quoted_text": quoted_text,
+        "element_ids": element_ids,
+        "coordinates": None
+    }
+    if screenshot:
+        found = locate_elements(element_ids, screenshot) or locate_step(step_data, screenshot)
+        hinted = locate_hint(step_data, hint, screenshot, found)
+        step_data["coordinates"] = found or hinted
+    return step_data
+
+
+def icon_label(step_data: dict) -> str:
+    """Назва елемента кроку для бібліотеки іконок: перший текст у лапках або сам крок"""
+    return step_data["quoted_text"][0] if step_data["quoted_text"] else step_data["action"]
 
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=OPENAI_MAX_TOKENS
-        )
 
-        text = response.choices[0].message.content.strip()
+def locate_step(step_data: dict, screenshot) -> dict:
+    """Шукає елемент кроку: спершу текст через OCR, потім збережену іконку"""
+    coordinates = locate_labels(step_data["quoted_text"], screenshot)
+    if coordinates or not ICON_LOCATOR:
+        return coordinates
+    try:
+        with tracing.span("icon_find"):
+            box = find_icon(screenshot, getattr(screenshot, "program", None), icon_label(step_data))
+    except Exception as e:
+        print(f"❌ Пошук іконки: {e}")
+        return None
+    if box:
+        print(f"✅ Іконка: '{icon_label(step_data)}' на ({box[0]}, {box[1]})")
+        return to_coordinates(*box)
+    return None
 
-    steps = [line.strip("- 0123456789.").strip()
-             for line in text.splitlines() if line.strip()]
 
-    result = []
-    for step in steps:
-        quoted_texts = extract_quoted_text(step)
-        coordinates = None
+def locate_hint(step_data: dict, hint, screenshot, found: dict = None) -> dict:
+    """Переводить підказку @(x,y) у кадр; іконку запам'ятовує, лише якщо її підтвердив OCR (found) чи інший кадр"""
+    transform = getattr(screenshot, "upload_transform", None)
+    if not ICON_LOCATOR or hint is None or transform is None:
+        return None
 
-        if screenshot_path and quoted_texts:
-            coordinates = find_text_on_screen(screenshot_path, quoted_texts[0])
+    x, y = transform.apply(*hint)
+    x, y = int(x - screenshot.left), int(y - screenshot.top)
+    if not (0 <= x < screenshot.width and 0 <= y < screenshot.height):
+        return None
+
+    box = (x - ICON_CROP_SIZE // 2, y - ICON_CROP_SIZE // 2, ICON_CROP_SIZE, ICON_CROP_SIZE)
+    program, label = getattr(screenshot, "program", None), icon_label(step_data)
+    try:
+        if found is None:
+            propose_icon(screenshot, program, label, box)
+        elif (abs(found["x"] - x) <= found["width"] // 2 + ICON_CROP_SIZE // 2
+              and abs(found["y"] - y) <= found["height"] // 2 + ICON_CROP_SIZE // 2):
+            remember_icon(screenshot, program, label, box)
+    except Exception as e:
+        print(f"❌ Збереження іконки: {e}")
+    return to_coordinates(*box)
+
+
+def locate_elements(element_ids: list, screenshot) -> dict:
+    """Повертає точні координати першого елемента карти, на який посилається модель"""
+    if not element_ids:
+        return None
+    try:
+        index = get_ocr_index(screenshot)
+    except Exception as e:
+        print(f"❌ OCR помилка: {e}")
+        return None
+    for element_id in element_ids:
+        element = index.element(element_id)
+        if element:
+            return element.coordinates
+    return None
+
+
+def locate_labels(quoted_texts: list, screenshot) -> dict:
+    """Повертає координати першої знайденої на скріншоті назви"""
+    for label in quoted_texts:
+        coordinates = find_text_on_screen(screenshot, label)
+        if coordinates:
+            return coordinates
+    return None
+
+
+def stream_instructions(program_name: str, current_location: str,
+                        action: str, screenshot=None, should_stop=None, result: dict = None):
+    """Генерує кроки інструкції по одному, щойно модель завершує рядок; finish_reason - у result"""
+    if RESPONSE_FORMAT == "json":
+        messages, fields = structured_messages(program_name, current_location, f"Steps to: {action}.",
+                                               screenshot)
+        reply = structured_completion(messages, "instructions", fields, should_stop, result=result)
+        for item in reply["steps"] if reply else []:
+            step = json_step(item, screenshot)
+            if step:
+                yield step
+        return
+
+    messages = instructions_messages(program_name, current_location, action, screenshot)
+    for line in completion_lines(messages, should_stop, result=result):
+        step = parse_step(line, screenshot)
+        if step:
+            yield step
+
+
+def recall_instructions(program_name: str, current_location: str,
+                        action: str, screenshot=None):
+    """Повертає кроки з бази знань, заново знайдені OCR на поточному скріншоті, або None"""
+    steps = knowledge_base.lookup(program_name, current_location, action)
+    if steps is None:
+        return None
+    with tracing.span("recall", steps=len(steps)):
+        for step in steps:
+            step["element_ids"] = []
+            step["coordinates"] = locate_step(step, screenshot) if screenshot else None
+    print(f"📚 База знань: {action} ({len(steps)} кроків)")
+    return steps
+
+
+def generate_instructions(program_name: str, current_location: str,
+                          action: str, screenshot=None) -> list:
+    return list(stream_instructions(program_name, current_location, action, screenshot))
+
+
+def all_instructions_messages(program_name: str, current_location: str,
+                              actions: list, screenshot) -> list:
+    """Будує один запит інструкцій одразу для всіх запропонованих дій"""
+    content, rule = screen_context(screenshot)
+    action_list = "\n".join(f'- "{action}"' for action in actions)
+    prompt = f"""You are a UI expert analyzing {program_name}.
+    Current location: {current_location}
+
+    For EACH action below provide step-by-step instructions.
+    Start every block with a line: Action: "action name"
+    Then the steps, one per line:
+    - ONLY exact button/menu/field names in DOUBLE QUOTES ("")
+    - Imperative form (Click, Type, Select, etc.)
+    - NO explanations, numbers, or extra text
+    {rule}
+
+    Actions:
+{action_list}"""
+
+    return [{
+        "role": "user",
+        "content": content + [{"type": "text", "text": prompt}]
+    }]
+
+
+def requested_action(name: str, actions: list):
+    """Запитана дія, якій відповідає назва блоку моделі, або None (блок не зберігаємо)"""
+    key = normalize_key(name)
+    return next((action for action in actions if normalize_key(action) == key), None)
+
+
+def stream_all_instructions(program_name: str, current_location: str, actions: list,
+                            screenshot, should_stop=None, max_tokens: int = OPENAI_MAX_TOKENS):
+    """Генерує (action, step) для всіх дій одним потоковим запитом; (action, None) - блок дійшов повністю"""
+    if RESPONSE_FORMAT == "json":
+        action_list = "\n".join(f'- "{action}"' for action in actions)
+        messages, fields = structured_messages(program_name, current_location,
+                                               f"Steps for EACH action:\n{action_list}", screenshot)
+        reply = structured_completion(messages, "all_instructions", fields, should_stop, max_tokens)
+        done = set()
+        for block in reply["instructions"] if reply else []:
+            name = requested_action(block["action"], actions)
+            if name is None or name in done:
+                continue
+            done.add(name)
+            for item in block["steps"]:
+                step = json_step(item, screenshot)
+                if step:
+                    yield name, step
+            yield name, None
+        return
+
+    messages = all_instructions_messages(program_name, current_location, actions, screenshot)
+    result = {}
+    current = None
+    done = set()
+
+    for line in completion_lines(messages, should_stop, max_tokens, result):
+        header = re.match(r'\s*(?:#+\s*)?Action:\s*"([^"]+)"', line)
+        if header:
+            if current is not None:
+                yield current, None
+            current = requested_action(header.group(1), actions)
+            if current in done:
+                current = None
+            elif current:
+                done.add(current)
+            continue
+        if current is None:
+            continue
+        step = parse_step(line, screenshot)
+        if step:
+            yield current, step
+
+    if current is not None and result.get("finish_reason") != "length" and not (
+            should_stop and should_stop()):
+        yield current, None
+
+
+async def agenerate_instructions(program_name: str, current_location: str,
+                                 action: str, screenshot=None) -> list:
+    """Асинхронна версія generate_instructions (без потокового режиму)"""
+    if RESPONSE_FORMAT == "json":
+        messages, fields = await asyncio.to_thread(structured_messages, program_name, current_location,
+                                                   f"Steps to: {action}.", screenshot)
+        options = {"response_format": response_format("instructions", fields)}
+    else:
+        messages = await asyncio.to_thread(instructions_messages, program_name,
+                                           current_location, action, screenshot)
+        options = {}
+    started = time.perf_counter()
+    response = await client.acreate(
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=OPENAI_MAX_TOKENS,
+        **options
+    )
+    tracing.record("api", time.perf_counter() - started, usage=response.usage, format=RESPONSE_FORMAT)
 
-        result.append({
-            "action": step,
-            "quoted_text": quoted_texts,
-            "coordinates": coordinates
-        })
+    text = response.choices[0].message.content.strip()
+    if RESPONSE_FORMAT == "json":
+        items = (await asyncio.to_thread(structured_reply, text, "instructions", fields, OPENAI_MAX_TOKENS,
+                                         response.choices[0].finish_reason))["steps"]
+        steps = await asyncio.to_thread(lambda: [json_step(item, screenshot) for item in items])
+        return [step for step in steps if step]
 
-    return result
\ No newline at end of file
+    lines = text.splitlines()
+    steps = await asyncio.to_thread(lambda: [parse_step(line, screenshot) for line in lines])
+    return [step for step in steps if step]
@@ -0,0 +1,241 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import openai
+from openai import AsyncOpenAI
+from config import (OPENAI_TIMEOUT, OPENAI_MAX_RETRIES, OPENAI_HEDGE_PERCENTILE,
+                    OPENAI_MAX_CONNECTIONS, getenv, require_api_key)
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ApiError(Exception):
+    """Зрозуміла користувачу помилка запиту до OpenAI"""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def describe_error(error: Exception, timeout: float) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return f"OpenAI не відповів за {timeout:.0f} с"
+    if isinstance(error, openai.RateLimitError):
+        return "OpenAI: перевищено ліміт запитів (429)"
+    if isinstance(error, openai.AuthenticationError):
+        return "OpenAI: невірний API ключ"
+    if isinstance(error, openai.APIStatusError):
+        return f"OpenAI: помилка сервера ({error.status_code})"
+    if isinstance(error, openai.APIConnectionError):
+        return "OpenAI: немає з'єднання"
+    return str(error)
+
+
+def retry_delay(number: int, error: Exception) -> float:
+    """Затримка перед повтором number: Retry-After сервера або експоненційна з джитером до 30 с"""
+    retry_after = None
+    if isinstance(error, openai.APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+    try:
+        if retry_after:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return min(30.0, 0.5 * 2 ** number) * (0.5 + random.random())
+
+
+class ApiClient:
+    """Клієнт OpenAI на фоновому event loop: спільний пул з'єднань, дедлайни, повтори, хеджування"""
+
+    def __init__(self, api_key: str = None, base_url: str = None,
+                 timeout: float = OPENAI_TIMEOUT, max_retries: int = OPENAI_MAX_RETRIES,
+                 hedge_percentile: float = OPENAI_HEDGE_PERCENTILE,
+                 max_connections: int = OPENAI_MAX_CONNECTIONS):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.max_connections = max_connections
+        self._latencies = deque(maxlen=200)
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                api_key = self.api_key or require_api_key()
+                base_url = self.base_url or getenv("OPENAI_BASE_URL")
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._client = AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                               timeout=self.timeout, max_retries=0)
+                    self._semaphore = asyncio.Semaphore(self.max_connections)
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="openai-loop", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _loop_for(self, coro) -> asyncio.AbstractEventLoop:
+        try:
+            return self._ensure_loop()
+        except Exception:
+            coro.close()
+            raise
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop_for(coro)).result()
+
+    def create(self, **kwargs):
+        """Синхронний chat.completions.create"""
+        return self._run(self._create(**kwargs))
+
+    async def acreate(self, **kwargs):
+        """Асинхронний chat.completions.create для будь-якого event loop"""
+        coro = self._create(**kwargs)
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop_for(coro))
+        return await asyncio.wrap_future(future)
+
+    def stream(self, should_stop=None, **kwargs):
+        """Синхронний генератор фрагментів потокової відповіді; should_stop() перериває і повтори"""
+        agen = self._stream(should_stop, **kwargs)
+        try:
+            while True:
+                try:
+                    yield self._run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(agen.aclose())
+
+    async def astream(self, should_stop=None, **kwargs):
+        """Асинхронний генератор фрагментів потокової відповіді"""
+        loop = self._ensure_loop()
+        agen = self._stream(should_stop, **kwargs)
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop)
+                try:
+                    yield await asyncio.wrap_future(future)
+                except StopAsyncIteration:
+                    return
+        finally:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(agen.aclose(), loop))
+
+    def warm_up(self):
+        """Встановлює з'єднання з API заздалегідь"""
+        try:
+            self._run(self._warm_up())
+        except Exception as e:
+            print(f"⚠️ Прогрів API: {describe_error(e, self.timeout)}")
+
+    async def _warm_up(self):
+        await asyncio.wait_for(self._client.models.list(), self.timeout)
+
+    def hedge_delay(self):
+        """Затримка перед дублюючим запитом: перцентиль останніх затримок"""
+        if not self.hedge_percentile or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    async def _attempt(self, kwargs: dict):
+        async with self._semaphore:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(
+                self._client.chat.completions.create(**kwargs), self.timeout)
+            self._latencies.append(time.perf_counter() - started)
+            return response
+
+    async def _hedged(self, kwargs: dict):
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._attempt(kwargs))
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        print(f"⏱ Хеджування: дублюючий запит після {delay:.1f} с")
+        hedge = asyncio.ensure_future(self._attempt(kwargs))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _with_retries(self, attempt, should_stop=None):
+        """Повторює attempt; повертає None, якщо should_stop() спрацював до або під час затримки"""
+        for number in range(self.max_retries + 1):
+            if should_stop and should_stop():
+                return None
+            try:
+                return await attempt()
+            except Exception as e:
+                if number == self.max_retries or not is_retryable(e):
+                    raise ApiError(describe_error(e, self.timeout)) from e
+                if not await self._backoff(retry_delay(number, e), should_stop):
+                    return None
+
+    async def _backoff(self, delay: float, should_stop=None) -> bool:
+        """Чекає delay секунд, перевіряючи should_stop(); False - якщо запит скасовано"""
+        deadline = time.monotonic() + delay
+        while True:
+            if should_stop and should_stop():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(remaining, 0.1) if should_stop else remaining)
+
+    async def _create(self, **kwargs):
+        return await self._with_retries(lambda: self._hedged(kwargs))
+
+    async def _stream(self, should_stop=None, **kwargs):
+        kwargs["stream"] = True
+
+        async def open_stream():
+            async with self._semaphore:
+                return await asyncio.wait_for(
+                    self._client.chat.completions.create(**kwargs), self.timeout)
+
+        stream = await self._with_retries(open_stream, should_stop)
+        if stream is None:
+            return
+        iterator = stream.__aiter__()
+        try:
+            while True:
+                if should_stop and should_stop():
+                    return
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    raise ApiError(describe_error(e, self.timeout)) from e
+                yield chunk
+        finally:
+            await stream.close()
@@ -0,0 +1,181 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import ai_client
+import ocr_engine
+from ai_client import define_program, generate_instructions
+from api_client import ApiClient, ApiError, is_retryable, retry_delay
+from ocr_utils import prefetch_ocr_index
+from screenshot import Frame
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+
+
+class RateLimiter:
+    """Рівномірно розподіляє запити: не більше rpm на хвилину"""
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def with_retries(fn, retries: int):
+    """Викликає fn, повторюючи лише тимчасові помилки API (Retry-After або експоненційна затримка)"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except ApiError as e:
+            cause = e.__cause__
+            if attempt == retries or cause is None or not is_retryable(cause):
+                raise
+            delay = retry_delay(attempt, cause)
+            print(f"⚠️ {e} - повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+
+def iter_images(inputs: list):
+    """Лінива ітерація по файлах зображень з директорій, glob-шаблонів та файлів"""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in files:
+                    if Path(name).suffix.lower() in IMAGE_EXTENSIONS:
+                        yield os.path.join(root, name)
+        elif os.path.isfile(item):
+            yield item
+        else:
+            for path in glob.iglob(item, recursive=True):
+                if Path(path).suffix.lower() in IMAGE_EXTENSIONS:
+                    yield path
+
+
+def load_done(output: str) -> set:
+    """Повертає шляхи, вже успішно оброблені в попередньому запуску"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["path"])
+    return done
+
+
+def analyze_image(path: str, args, limiter: RateLimiter) -> dict:
+    """Визначає програму та генерує інструкції з OCR координатами для одного скріншоту"""
+    started = time.perf_counter()
+    frame = Frame.open(path)
+    prefetch_ocr_index(frame)
+
+    def call(fn, *fn_args):
+        def attempt():
+            limiter.acquire()
+            return fn(*fn_args)
+        return with_retries(attempt, args.retries)
+
+    program_info = call(define_program, frame)
+    actions = args.action or program_info.get("Actions", [])[:args.actions]
+
+    instructions = {}
+    for action in actions:
+        instructions[action] = call(generate_instructions, program_info.get("Name"),
+                                    program_info.get("Location"), action, frame)
+
+    return {
+        "path": path,
+        "status": "ok",
+        "program": program_info,
+        "instructions": instructions,
+        "elapsed": round(time.perf_counter() - started, 3)
+    }
+
+
+def run(args):
+    # Повтори робить лише with_retries: кожна спроба проходить через ліміт запитів
+    ai_client.client = ApiClient(max_retries=0)
+    done = load_done(args.output) if args.resume else set()
+    limiter = RateLimiter(args.rpm)
+    processed = failed = skipped = 0
+
+    mode = "a" if args.resume else "w"
+    with open(args.output, mode, encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        pending = {}
+
+        def collect(block: bool):
+            nonlocal processed, failed
+            if not pending:
+                return
+            finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                try:
+                    record = future.result()
+                    processed += 1
+                except Exception as e:
+                    record = {"path": path, "status": "error", "error": str(e)}
+                    failed += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                print(f"{'✅' if record['status'] == 'ok' else '❌'} {path}")
+
+        for path in iter_images(args.inputs):
+            if path in done:
+                skipped += 1
+                continue
+            while len(pending) >= args.concurrency:
+                collect(block=True)
+            pending[executor.submit(analyze_image, path, args, limiter)] = path
+            collect(block=False)
+
+        while pending:
+            collect(block=True)
+
+    print(f"Готово: {processed} оброблено, {failed} з помилкою, {skipped} пропущено")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KOI: пакетний аналіз директорії скріншотів")
+    parser.add_argument("inputs", nargs="+", help="директорії, файли або glob-шаблони")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="файл результатів JSONL")
+    parser.add_argument("--action", action="append",
+                        help="дія для інструкцій (можна кілька); за замовчуванням - дії з define_program")
+    parser.add_argument("--actions", type=int, default=5, help="скільки запропонованих дій обробляти")
+    parser.add_argument("--concurrency", type=int, default=4, help="скільки скріншотів обробляти паралельно")
+    parser.add_argument("--rpm", type=float, default=60, help="ліміт запитів до API на хвилину")
+    parser.add_argument("--retries", type=int, default=3, help="кількість повторів при помилці")
+    parser.add_argument("--resume", action="store_true", help="продовжити, пропускаючи вже оброблені")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        run(args)
+    finally:
+        ocr_engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
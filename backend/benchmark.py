@@ -0,0 +1,525 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from fake_openai import FakeOpenAIServer
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "cache" / "bench_fixtures"
+BASELINE_PATH = Path(__file__).resolve().parent / "benchmark_baseline.json"
+STAGES = ["capture", "encode", "upload", "parse", "ocr_index", "ocr_step", "render"]
+STARTUP_STAGES = ["import", "window", "warm_up"]
+PREPROCESS_STAGES = ["prep", "coverage", "ocr_raw", "ocr_prep", "hits_raw", "hits_prep",
+                     "icon_frame", "icon_step", "hits_icon"]
+RATIOS = ("coverage", "hits_raw", "hits_prep", "hits_icon")
+FORMATS = ("text", "json")
+FORMAT_STAGES = [f"{kind}_{output}" for kind in ("in", "out", "parse") for output in FORMATS]
+TOKENS = tuple(stage for stage in FORMAT_STAGES if not stage.startswith("parse_"))
+
+STARTUP_SCRIPTS = {
+    "import": "import program",
+    "window": ("import tkinter as tk\n"
+               "from program import AIAssistantOverlay\n"
+               "root = tk.Tk()\n"
+               "AIAssistantOverlay(root)\n"
+               "root.update()"),
+    "warm_up": "import warmup\nwarmup.warm_up()",
+}
+
+MENU_LABELS = ["File", "Edit", "View", "Insert", "Format", "Tools", "Help"]
+DIALOG_LABELS = ["File name", "Save as type", "Save", "Cancel"]
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+THEMES = {
+    "light": {"bg": (240, 240, 240), "bar": (250, 250, 250), "text": (0, 0, 0), "muted": (90, 90, 90),
+              "panel": (255, 255, 255), "border": (120, 120, 120), "button": (225, 225, 225)},
+    "dark": {"bg": (20, 23, 27), "bar": (26, 29, 34), "text": (242, 245, 247), "muted": (150, 155, 160),
+             "panel": (28, 31, 34), "border": (70, 75, 80), "button": (45, 51, 56)},
+}
+
+
+def draw_fixture(width: int, height: int, theme: str = "light") -> tuple:
+    """Малює синтетичне вікно редактора з меню та діалогом збереження: (зображення, [(назва, рамка)])"""
+    colors = THEMES[theme]
+    scale = height / 720
+    img = Image.new("RGB", (width, height), colors["bg"])
+    draw = ImageDraw.Draw(img)
+    font = _font(int(14 * scale))
+    labels = []
+
+    def label(position, text, fill=colors["text"]):
+        draw.text(position, text, fill=fill, font=font)
+        labels.append((text, draw.textbbox(position, text, font=font)))
+
+    bar = int(28 * scale)
+    draw.rectangle((0, 0, width, bar), fill=colors["bar"])
+    x = int(10 * scale)
+    for text in MENU_LABELS:
+        label((x, int(6 * scale)), text)
+        x += int(70 * scale)
+
+    for row in range(int(60 * scale), height - bar, int(22 * scale)):
+        draw.text((int(20 * scale), row), "Lorem ipsum dolor sit amet, consectetur adipiscing elit",
+                  fill=colors["muted"], font=font)
+
+    left, top = width // 3, height // 3
+    right, bottom = left + int(420 * scale), top + int(180 * scale)
+    draw.rectangle((left, top, right, bottom), fill=colors["panel"], outline=colors["border"])
+    label((left + int(12 * scale), top + int(12 * scale)), "Save As")
+    for number, text in enumerate(DIALOG_LABELS[:2]):
+        y = top + int((50 + 34 * number) * scale)
+        label((left + int(12 * scale), y), text)
+        draw.rectangle((left + int(130 * scale), y - 4, right - int(12 * scale), y + int(20 * scale)),
+                       outline=colors["border"])
+    for number, text in enumerate(DIALOG_LABELS[2:]):
+        x = right - int((180 - 90 * number) * scale)
+        y = bottom - int(40 * scale)
+        draw.rectangle((x, y, x + int(80 * scale), y + int(28 * scale)), fill=colors["button"])
+        label((x + int(14 * scale), y + int(6 * scale)), text)
+    return img, labels
+
+
+def fixture_paths(resolutions: list, theme: str = "light") -> list:
+    """Повертає шляхи фікстур, створюючи відсутні (поруч - JSON з рамками підписів)"""
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for width, height in resolutions:
+        path = FIXTURES_DIR / f"editor_{theme}_{width}x{height}.png"
+        if not path.exists() or not path.with_suffix(".json").exists():
+            img, labels = draw_fixture(width, height, theme)
+            img.save(path)
+            path.with_suffix(".json").write_text(json.dumps(labels), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def fixture_labels(path: Path) -> list:
+    return json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+
+
+def ocr_available() -> bool:
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def render_target():
+    """Створює Tk поле інструкцій, як в оверлеї; None, якщо дисплея немає"""
+    try:
+        import tkinter as tk
+        from tkinter import scrolledtext
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    text = scrolledtext.ScrolledText(root, height=12, state=tk.DISABLED)
+    text.pack()
+    return root, text
+
+
+def render_steps(target, steps: list):
+    import tkinter as tk
+    root, text = target
+    text.config(state=tk.NORMAL)
+    text.delete(1.0, tk.END)
+    text.config(state=tk.DISABLED)
+    for step in steps:
+        text.config(state=tk.NORMAL)
+        text.insert(tk.END, f"{step['action']}\n")
+        text.config(state=tk.DISABLED)
+        root.update_idletasks()
+
+
+def capture_source(path: Path, live: bool):
+    """Повертає функцію захоплення: реальний екран або фікстура через той самий BGRA шлях"""
+    from screenshot import Frame, capture_frame
+
+    if live:
+        return lambda: capture_frame(save=False)
+
+    img = Image.open(path).convert("RGB")
+    raw = img.convert("RGBA").tobytes("raw", "BGRA")
+
+    def capture():
+        frame = Frame(bytes(raw), img.size, name=path.stem)
+        frame.to_image()
+        return frame
+    return capture
+
+
+def run_once(capture, args, render) -> dict:
+    """Проганяє повний цикл для одного кадру та повертає час кожного етапу, с"""
+    import ai_client
+    from image_prep import prepare_upload
+    from ocr_utils import get_ocr_index, find_text_on_screen
+
+    timings = {}
+
+    started = time.perf_counter()
+    frame = capture()
+    timings["capture"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    upload = prepare_upload(frame)
+    frame.upload_transform = upload.transform
+    timings["encode"] = time.perf_counter() - started
+
+    content = {"type": "image_url", "image_url": {"url": upload.data_url, "detail": "auto"}}
+    started = time.perf_counter()
+    response = ai_client.client.create(
+        model=ai_client.OPENAI_MODEL,
+        messages=[{"role": "user", "content": [
+            content, {"type": "text", "text": 'Response EXACTLY: Name: "program_name"'}]}],
+        max_tokens=ai_client.OPENAI_MAX_TOKENS
+    )
+    timings["upload"] = max(0.0, time.perf_counter() - started - args.latency)
+
+    started = time.perf_counter()
+    program_info = ai_client.parse_program_message(response.choices[0].message.content)
+    lines = list(ai_client.completion_lines(ai_client.instructions_messages(
+        program_info["Name"], program_info["Location"], program_info["Actions"][0])))
+    parse_started = time.perf_counter()
+    steps = [ai_client.parse_step(line) for line in lines]
+    steps = [step for step in steps if step]
+    timings["parse"] = time.perf_counter() - parse_started
+    timings["stream"] = parse_started - started
+
+    if args.ocr:
+        started = time.perf_counter()
+        get_ocr_index(frame)
+        timings["ocr_index"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for step in steps:
+            for label in step["quoted_text"]:
+                if find_text_on_screen(frame, label):
+                    break
+        timings["ocr_step"] = (time.perf_counter() - started) / max(1, len(steps))
+
+    if render:
+        started = time.perf_counter()
+        render_steps(render, steps)
+        timings["render"] = time.perf_counter() - started
+
+    return timings
+
+
+def bench_resolution(path: Path, args, render) -> dict:
+    capture = capture_source(path, args.live_capture)
+    runs = []
+    tracemalloc.start()
+    for _ in range(args.repeat):
+        runs.append(run_once(capture, args, render))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {stage: statistics.median(run[stage] for run in runs) for stage in runs[0]}
+    result["py_peak_mb"] = peak / 2 ** 20
+    return result
+
+
+def label_hits(words: list, labels: list) -> float:
+    """Частка підписів фікстури, знайдених OCR всередині їхніх рамок"""
+    from ocr_utils import OcrIndex, OcrWord
+    index = OcrIndex([OcrWord(text, x, y, w, h, conf, line) for text, x, y, w, h, conf, line in words])
+    hits = 0
+    for text, (left, top, right, bottom) in labels:
+        coords = index.find(text)
+        if coords and left - 4 <= coords["x"] <= right + 4 and top - 4 <= coords["y"] <= bottom + 4:
+            hits += 1
+    return hits / len(labels) if labels else 0.0
+
+
+def bench_preprocess(path: Path, args) -> dict:
+    """Порівнює OCR всього кадру та OCR лише областей тексту після препроцесингу"""
+    import ocr_engine
+    import ocr_preprocess
+
+    img = Image.open(path).convert("RGB")
+    settings = ocr_preprocess.profile_for()
+    result = {}
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        prepared, regions = ocr_preprocess.prepare(img, settings)
+        timings.append(time.perf_counter() - started)
+    result["prep"] = statistics.median(timings)
+    covered = sum(r[2] * r[3] for r in regions or [(0, 0, img.width, img.height)])
+    result["coverage"] = covered / (img.width * img.height)
+
+    result.update(bench_icons(img, args))
+
+    if args.ocr:
+        labels = fixture_labels(path)
+        for name, stage_settings in (("raw", dict(settings, enabled=False)), ("prep", settings)):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                words = ocr_preprocess.recognize(img, ocr_engine.recognize, stage_settings)
+                timings.append(time.perf_counter() - started)
+            result[f"ocr_{name}"] = statistics.median(timings)
+            result[f"hits_{name}"] = label_hits(words, labels)
+        if result["ocr_prep"] >= result["ocr_raw"]:
+            print(f"⚠️ {path.stem}: OCR з препроцесингом не швидший за OCR всього кадру "
+                  f"({result['ocr_prep'] * 1000:.0f} мс проти {result['ocr_raw'] * 1000:.0f} мс)")
+    return result
+
+
+def draw_icons(img: Image.Image, count: int = 12) -> list:
+    """Малює панель простих різних іконок під меню, повертає їх рамки"""
+    draw = ImageDraw.Draw(img)
+    size = max(16, int(24 * img.height / 720))
+    top = int(34 * img.height / 720)
+    boxes = []
+    for number in range(count):
+        left = int(10 * img.height / 720) + number * (size + size // 2)
+        color = ((number * 67) % 256, (number * 131) % 256, 255 - (number * 29) % 256)
+        draw.rectangle((left, top, left + size, top + size), outline=(128, 128, 128))
+        draw.line((left + 3, top + 3 + number % 5, left + size - 3, top + size - 3 - number % 7),
+                  fill=color, width=2)
+        radius = 2 + number % (size // 3)
+        draw.ellipse((left + size // 2 - radius, top + size // 3, left + size // 2 + radius,
+                      top + size // 3 + 2 * radius), fill=color)
+        boxes.append((left - 2, top - 2, left + size + 3, top + size + 3))
+    return boxes
+
+
+def bench_icons(img: Image.Image, args) -> dict:
+    """Шукає іконки панелі на зсунутому кадрі: спектр кадру, пошук на крок і частка влучань"""
+    import numpy as np
+    from icon_locator import FrameSpectrum, IconTemplate, match_template
+
+    img = img.copy()
+    boxes = draw_icons(img)
+    templates = [IconTemplate(np.asarray(img.crop(box).convert("L"), dtype=np.float32)) for box in boxes]
+    shifted = Image.new("RGB", img.size, img.getpixel((0, 0)))
+    shifted.paste(img, (7, 5))
+
+    frame_timings, step_timings = [], []
+    hits = 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        spectrum = FrameSpectrum(shifted)
+        frame_timings.append(time.perf_counter() - started)
+        for template in templates:
+            match_template(spectrum, template)
+
+        started = time.perf_counter()
+        found = [match_template(spectrum, template) for template in templates]
+        step_timings.append((time.perf_counter() - started) / len(templates))
+        hits = sum(1 for box, match in zip(boxes, found)
+                   if match and abs(match[0] - box[0] - 7) <= 2 and abs(match[1] - box[1] - 5) <= 2)
+    return {"icon_frame": statistics.median(frame_timings), "icon_step": statistics.median(step_timings),
+            "hits_icon": hits / len(templates)}
+
+
+def bench_formats(path: Path, args) -> dict:
+    """Порівнює токени запитів define_program + інструкцій і час розбору: текст проти JSON схеми"""
+    import ai_client
+    from structured_output import decode, response_format
+
+    capture = capture_source(path, False)
+    result = {}
+    for output in FORMATS:
+        frame = capture()
+        program = ai_client.client.create(**ai_client.program_request(frame, output))
+        if output == "json":
+            messages, fields = ai_client.structured_messages("Text Editor", "Main window",
+                                                             "Steps to: Save As.", frame)
+            options = {"response_format": response_format("instructions", fields)}
+        else:
+            messages = ai_client.instructions_messages("Text Editor", "Main window", "Save As", frame)
+            options = {}
+        steps = ai_client.client.create(model=ai_client.OPENAI_MODEL, messages=messages,
+                                        max_tokens=ai_client.OPENAI_MAX_TOKENS, **options)
+
+        program_text = program.choices[0].message.content
+        steps_text = steps.choices[0].message.content
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            if output == "json":
+                ai_client.program_from_json(decode(program_text, "program"))
+                [ai_client.json_step(item) for item in decode(steps_text, "instructions", fields)["steps"]]
+            else:
+                ai_client.parse_program_message(program_text)
+                [ai_client.parse_step(line) for line in steps_text.splitlines()]
+        result[f"parse_{output}"] = (time.perf_counter() - started) / args.repeat
+        result[f"in_{output}"] = program.usage.prompt_tokens + steps.usage.prompt_tokens
+        result[f"out_{output}"] = program.usage.completion_tokens + steps.usage.completion_tokens
+    return result
+
+
+def time_script(code: str) -> float:
+    """Час виконання коду в новому інтерпретаторі (з урахуванням імпортів), с"""
+    timed = f"import time\n_started = time.perf_counter()\n{code}\nprint(time.perf_counter() - _started)"
+    result = subprocess.run([sys.executable, "-c", timed], cwd=Path(__file__).resolve().parent,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "error")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(args) -> dict:
+    """Вимірює холодний старт: імпорт оверлею, перше вікно та фоновий прогрів"""
+    result = {}
+    for stage in STARTUP_STAGES:
+        try:
+            result[stage] = statistics.median(time_script(STARTUP_SCRIPTS[stage])
+                                              for _ in range(args.repeat))
+        except Exception as e:
+            print(f"⚠️ Старт ({stage}) пропущено: {e}")
+    return result
+
+
+def peak_rss_mb() -> float:
+    """Піковий RSS процесу (Linux повертає КБ, macOS - байти)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Повертає етапи, що повільніші за базову лінію більше ніж на tolerance"""
+    regressions = []
+    for resolution, stages in results.items():
+        for stage, value in stages.items():
+            expected = baseline.get(resolution, {}).get(stage)
+            if not expected or stage == "coverage":
+                continue
+            if stage.startswith("hits_"):
+                if value < expected * (1 - tolerance):
+                    regressions.append((resolution, stage, expected, value))
+            elif value > expected * (1 + tolerance) and value - expected > 0.001:
+                regressions.append((resolution, stage, expected, value))
+    return regressions
+
+
+def print_table(results: dict, baseline: dict, columns: list):
+    columns = [s for s in columns if any(s in stages for stages in results.values())]
+    if not columns:
+        return
+    print(f"{'resolution':>12} " + " ".join(f"{c:>14}" for c in columns))
+    for resolution, stages in results.items():
+        if not any(column in stages for column in columns):
+            continue
+        cells = []
+        for column in columns:
+            value = stages.get(column)
+            if value is None:
+                cells.append(f"{'-':>14}")
+                continue
+            if column in RATIOS:
+                cell = f"{value:.0%}"
+            elif column in TOKENS:
+                cell = f"{value:.0f}tok"
+            elif column.endswith("_mb"):
+                cell = f"{value:.1f}MB"
+            else:
+                cell = f"{value * 1000:.1f}ms"
+            expected = baseline.get(resolution, {}).get(column)
+            if expected:
+                cell += f" {(value - expected) / expected:+.0%}"
+            cells.append(f"{cell:>14}")
+        print(f"{resolution:>12} " + " ".join(cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KOI: офлайн бенчмарк повного циклу з фейковим OpenAI")
+    parser.add_argument("--resolutions", nargs="+",
+                        default=[f"{w}x{h}" for w, h in RESOLUTIONS], help="наприклад 1920x1080")
+    parser.add_argument("--repeat", type=int, default=3, help="повторів на роздільність (медіана)")
+    parser.add_argument("--latency", type=float, default=0.2, help="затримка фейкового API, с")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="затримка між токенами, с")
+    parser.add_argument("--live-capture", action="store_true", help="захоплювати реальний екран")
+    parser.add_argument("--no-ocr", dest="ocr", action="store_false", help="пропустити OCR етапи")
+    parser.add_argument("--no-render", dest="render", action="store_false", help="пропустити Tk етап")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="файл базової лінії JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="записати результати як базову лінію")
+    parser.add_argument("--startup-only", action="store_true", help="лише бенчмарк запуску")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустиме уповільнення (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions]
+
+    server = FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay).start()
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    import ocr_engine
+    if args.ocr and not ocr_available():
+        print("⚠️ tesseract не знайдено - OCR етапи пропущено")
+        args.ocr = False
+    render = render_target() if args.render else None
+    if args.render and render is None:
+        print("⚠️ Дисплей недоступний - етап render пропущено")
+
+    results = {}
+    try:
+        print("⏱ startup...")
+        results["startup"] = bench_startup(args)
+        if not args.startup_only:
+            print("⏱ формати відповіді...")
+            results["formats"] = bench_formats(fixture_paths(resolutions[:1])[0], args)
+        for path, (width, height) in zip(fixture_paths(resolutions), resolutions):
+            if args.startup_only:
+                break
+            print(f"⏱ {width}x{height}...")
+            results[f"{width}x{height}"] = bench_resolution(path, args, render)
+        for theme in THEMES:
+            for path, (width, height) in zip(fixture_paths(resolutions, theme), resolutions):
+                if args.startup_only:
+                    break
+                print(f"⏱ OCR {theme} {width}x{height}...")
+                results[f"{theme}:{width}x{height}"] = bench_preprocess(path, args)
+    finally:
+        ocr_engine.shutdown()
+        server.stop()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline, STAGES + ["stream", "py_peak_mb"])
+    print_table(results, baseline, STARTUP_STAGES)
+    print_table(results, baseline, PREPROCESS_STAGES)
+    print_table(results, baseline, FORMAT_STAGES)
+    print(f"Піковий RSS: {peak_rss_mb():.0f} MB, запитів до API: {server.requests}, "
+          f"надіслано {server.bytes_received // 1024} KB")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Базову лінію збережено: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for resolution, stage, expected, value in regressions:
+        print(f"❌ {resolution} {stage}: {expected:.4g} -> {value:.4g}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
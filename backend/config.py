@@ -1,21 +1,160 @@
 import os
+import shutil
 from pathlib import Path
-from dotenv import load_dotenv
-
-load_dotenv()
 
 BASE_DIR = Path(__file__).parent.parent
 SCREENSHOTS_DIR = BASE_DIR / "screenshots"
-SCREENSHOTS_DIR.mkdir(exist_ok=True)
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY не встановлено в .env")
+_env_loaded = False
+
+
+def getenv(name: str, default: str = None) -> str:
+    """Читає змінну оточення, завантажуючи .env лише при першому зверненні"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv(name, default)
+
+
+def require_api_key() -> str:
+    """Повертає OPENAI_API_KEY; помилка виникає при першому запиті, а не при імпорті"""
+    api_key = getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY не встановлено в .env")
+    return api_key
+
+
+def find_tesseract(default: str = r"D:\Dev\Tesseract\tesseract.exe") -> str:
+    """Шлях до tesseract: TESSERACT_PATH з оточення, шлях за замовчуванням або tesseract з PATH (None, якщо немає)"""
+    for path in (os.environ.get("TESSERACT_PATH"), default):
+        if path and os.path.isfile(path):
+            return path
+    return shutil.which("tesseract")
+
 
 OPENAI_MODEL = "gpt-4o-mini"
 OPENAI_MAX_TOKENS = 1500
+OPENAI_STREAM = True
+OPENAI_TIMEOUT = 60
+OPENAI_MAX_RETRIES = 3
+OPENAI_HEDGE_PERCENTILE = None
+OPENAI_MAX_CONNECTIONS = 8
+
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 85
+SAVE_SCREENSHOTS = True
+SCREENSHOT_STORE_FORMAT = "WEBP"
+SCREENSHOT_STORE_MAX_COUNT = 200
+SCREENSHOT_STORE_MAX_BYTES = 500 * 1024 * 1024
+SCREENSHOT_STORE_MAX_AGE = 7 * 24 * 3600
+CAPTURE_MODE = "monitor"
+CAPTURE_MONITOR = 1
+
+UPLOAD_MAX_EDGE = 1568
+UPLOAD_GRAYSCALE = False
+UPLOAD_REGION = None
+UPLOAD_DETAIL = "auto"
+
+LOCAL_IDENTIFY = True
+LOCAL_PROGRAMS = {
+    "OpusApp": {"name": "Microsoft Word", "title": "Word",
+                "actions": ["Save As", "Export PDF", "Insert table", "Track changes", "Print"]},
+    "XLMAIN": {"name": "Microsoft Excel", "title": "Excel",
+               "actions": ["Save As", "Export PDF", "Insert chart", "Sort data", "Freeze panes"]},
+    "libreoffice-writer": {"name": "LibreOffice Writer",
+                           "actions": ["Save As", "Export PDF", "Insert table", "Track changes", "Print"]},
+    "libreoffice-calc": {"name": "LibreOffice Calc",
+                         "actions": ["Save As", "Export PDF", "Insert chart", "Sort data", "Freeze panes"]},
+    "code": {"name": "Visual Studio Code"},
+    "firefox": {"name": "Mozilla Firefox"},
+    "google-chrome": {"name": "Google Chrome"},
+    "gnome-terminal-server": {"name": "Terminal"},
+}
+
+CACHE_DIR = BASE_DIR / "cache"
+PHASH_SIZE = 16
+PHASH_THRESHOLD = 12
+PROGRAM_CACHE_SIZE = 64
+PROGRAM_CACHE_DISK_ENTRIES = 500
+PROGRAM_CACHE_MAX_AGE = 7 * 24 * 3600
+KNOWLEDGE_BASE_ENABLED = True
+KNOWLEDGE_BASE_PATH = CACHE_DIR / "knowledge.sqlite3"
+KNOWLEDGE_BASE_MAX_ENTRIES = 5000
+KNOWLEDGE_BASE_MAX_AGE = 30 * 24 * 3600
+
+TASK_WORKERS = 1
+TASK_LANES = {"prefetch": 1}  # канали з власними потоками: справжній клік не чекає в черзі за ними
+PREFETCH_INSTRUCTIONS = True
+PREFETCH_MAX_TOKENS = 1200
+PREFETCH_MAX_TOKENS_JSON = 2400  # JSON блоки приблизно вдвічі довші за текстові рядки
+PREFETCH_MIN_INTERVAL = 10.0
+UI_QUEUE_INTERVAL_MS = 30
+
+TESSERACT_PATH = find_tesseract()
+OCR_MIN_CONFIDENCE = 0
+OCR_FUZZY_CUTOFF = 0.75
+OCR_INDEX_CACHE_SIZE = 4
+OCR_PREFETCH_WORKERS = 1
+OCR_REGION_PADDING = 8
+OCR_LANGUAGE = "eng"
+OCR_BACKEND = "pool"  # pool - теплі процеси; модель лишається завантаженою лише з tesserocr, інакше pytesseract на кожну плитку
+OCR_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+OCR_TILE_SIZE = 1024
+OCR_TILE_OVERLAP = 64
+OCR_PREPROCESS = {
+    "enabled": True,
+    "invert": "auto",
+    "contrast": True,
+    "regions": True,
+    "cell": 8,
+    "edge_threshold": 40,
+    "min_density": 0.06,
+    "padding": 4,
+    "max_coverage": 0.6,
+}
+OCR_PREPROCESS_PROFILES = {
+    "Visual Studio Code": {"invert": True},
+    "Terminal": {"invert": "auto", "regions": False},
+}
+OCR_ELEMENT_GAP = 1.2
+OCR_ELEMENT_LIMIT = 300
+INSTRUCTIONS_INPUT = "image"
+RESPONSE_FORMAT = "text"  # text - рядки Name:/Action:, json - строга JSON схема та короткі промпти
+
+ICON_LOCATOR = True
+ICON_DIR = CACHE_DIR / "icons"
+ICON_CROP_SIZE = 32
+ICON_STORE_MAX_COUNT = 500
+ICON_STORE_MAX_BYTES = 20 * 1024 * 1024
+ICON_LEARNED_MAX_AGE = 3 * 24 * 3600  # іконка лише з підказок моделі (без OCR) живе стільки від останнього підтвердження
+ICON_MATCH_MAX_EDGE = 960
+ICON_MATCH_SCALES = (0.8, 1.0, 1.25)
+ICON_MATCH_THRESHOLD = 0.8
+
+WATCH_INTERVAL = 1.0
+WATCH_TILE_SIZE = 64
+WATCH_REDEFINE_FRACTION = 0.5
+
+DAEMON_MODE = "auto"  # auto - запускати за потреби, connect - лише під'єднуватись, off - без демона
+DAEMON_SOCKET = BASE_DIR / "run" / "analysis.sock"
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 47821
+DAEMON_TIMEOUT = 2 * OPENAI_TIMEOUT
+DAEMON_START_TIMEOUT = 15.0
+DAEMON_FRAMES = 8
+DAEMON_TOKEN_FILE = BASE_DIR / "run" / "analysis.token"  # ключ доступу, лише для власника (0600)
+DAEMON_IDLE_TIMEOUT = 10 * 60  # демон завершується, якщо стільки часу немає клієнтів
+DAEMON_PROTOCOL = 2
 
-TESSERACT_PATH = r"D:\Dev\Tesseract\tesseract.exe"
+TRACE_ENABLED = True
+TRACE_FILE = BASE_DIR / "logs" / "spans.jsonl"
+TRACE_FILE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_FILE_BACKUPS = 3
+TRACE_STATUS_BREAKDOWN = False
+METRICS_PORT = None
+DAEMON_METRICS_PORT = METRICS_PORT + 1 if METRICS_PORT else None  # окремий порт, щоб не конфліктувати з оверлеєм
 
 UI_THEME = {
     "bg_primary": "#14171B",
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import tracing
+from config import (DAEMON_FRAMES, DAEMON_METRICS_PORT, DAEMON_TOKEN_FILE, DAEMON_IDLE_TIMEOUT,
+                    DAEMON_PROTOCOL)
+from service import LocalService, check_token, daemon_address, frame_meta, write_token
+
+STREAMING = {"instructions", "prefetch_instructions"}
+
+
+class FrameRegistry:
+    """Кадри, видані клієнтам, за хешем вмісту (LRU)"""
+
+    def __init__(self, max_frames: int = DAEMON_FRAMES):
+        self.max_frames = max_frames
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, frame) -> dict:
+        with self._lock:
+            self._frames[frame.digest] = frame
+            self._frames.move_to_end(frame.digest)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame_meta(frame)
+
+    def get(self, digest: str, program: str = None):
+        if digest is None:
+            return None
+        with self._lock:
+            frame = self._frames.get(digest)
+            if frame is None:
+                raise KeyError(f"невідомий кадр {digest}")
+            self._frames.move_to_end(digest)
+        if program:
+            frame.program = program
+        return frame
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Одне з'єднання клієнта: кожен запит виконується в окремому потоці"""
+
+    def setup(self):
+        super().setup()
+        self._write_lock = threading.Lock()
+        self._cancelled = {}
+        self.server.connected(1)
+
+    def _hello(self) -> bool:
+        """Перший рядок з'єднання має бути hello з ключем доступу; інакше з'єднання закривається"""
+        self.connection.settimeout(5)
+        try:
+            request = json.loads(self.rfile.readline(4096))
+            params = request.get("params") or {}
+        except (OSError, ValueError, AttributeError):
+            return False
+        finally:
+            self.connection.settimeout(None)
+        if request.get("method") != "hello" or not check_token(params.get("token"), self.server.token):
+            self._send({"id": request.get("id"), "error": "доступ заборонено"})
+            return False
+        self._send({"id": request.get("id"), "result": {"protocol": DAEMON_PROTOCOL, "pid": os.getpid()}})
+        return True
+
+    def handle(self):
+        if not self._hello():
+            return
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            params = request.get("params") or {}
+            if request.get("method") == "cancel":
+                event = self._cancelled.get(params.get("request"))
+                if event is not None:
+                    event.set()
+                continue
+            cancelled = self._cancelled[request.get("id")] = threading.Event()
+            threading.Thread(target=self._serve, args=(request, cancelled), daemon=True).start()
+
+    def finish(self):
+        for event in list(self._cancelled.values()):
+            event.set()
+        self.server.connected(-1)
+        super().finish()
+
+    def _send(self, message: dict):
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._write_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError:
+                pass
+
+    def _serve(self, request: dict, cancelled: threading.Event):
+        request_id, method = request.get("id"), request.get("method")
+        try:
+            with tracing.trace(f"daemon_{method}") as root:
+                if method in STREAMING:
+                    result = {}
+                    for item in self.server.stream(method, request.get("params") or {},
+                                                   cancelled.is_set, result):
+                        if cancelled.is_set():
+                            break
+                        self._send({"id": request_id, "item": item})
+                else:
+                    result = self.server.call(method, request.get("params") or {})
+            self._send({"id": request_id, "result": result, **root.timings()})
+        except Exception as e:
+            self._send({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            self._cancelled.pop(request_id, None)
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.BaseServer):
+    """Спільний сервіс аналізу: захоплення, OCR, кеші та з'єднання з API для всіх клієнтів"""
+    daemon_threads = True
+
+    def __init__(self, address=None, service: LocalService = None, token_file=DAEMON_TOKEN_FILE):
+        self.address = address or daemon_address()
+        self.service = service or LocalService()
+        self.frames = FrameRegistry()
+        self.started = time.time()
+        self.socket = self._listen()
+        self.token_file = Path(token_file)
+        self.token = write_token(self.token_file)
+        self.connections = 0
+        self.last_active = time.monotonic()
+        self._connections_lock = threading.Lock()
+        super().__init__(self.address, DaemonHandler)
+
+    def connected(self, delta: int):
+        with self._connections_lock:
+            self.connections += delta
+            self.last_active = time.monotonic()
+
+    def idle_for(self) -> float:
+        """Скільки секунд немає жодного клієнта (0, поки хтось під'єднаний)"""
+        with self._connections_lock:
+            return 0.0 if self.connections else time.monotonic() - self.last_active
+
+    def serve_until_idle(self, idle_timeout: float = DAEMON_IDLE_TIMEOUT):
+        """Обслуговує клієнтів, поки idle_timeout секунд поспіль немає жодного з'єднання"""
+        threading.Thread(target=self.serve_forever, name="daemon-accept", daemon=True).start()
+        try:
+            while not idle_timeout or self.idle_for() < idle_timeout:
+                time.sleep(1.0)
+            print(f"💤 Немає клієнтів {idle_timeout:.0f} с - демон завершується")
+        finally:
+            self.shutdown()
+
+    def _listen(self) -> socket.socket:
+        if isinstance(self.address, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(self.address)
+        else:
+            path = Path(self.address)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(path))
+                raise OSError(f"демон уже працює: {path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                path.unlink(missing_ok=True)
+            finally:
+                probe.close()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(str(path))
+            os.chmod(path, 0o600)
+        sock.listen(16)
+        return sock
+
+    def fileno(self) -> int:
+        return self.socket.fileno()
+
+    def get_request(self):
+        return self.socket.accept()
+
+    def shutdown_request(self, request):
+        try:
+            request.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        request.close()
+
+    def server_close(self):
+        self.socket.close()
+        if not isinstance(self.address, tuple):
+            Path(self.address).unlink(missing_ok=True)
+        self.token_file.unlink(missing_ok=True)
+
+    def call(self, method: str, params: dict):
+        service, frames = self.service, self.frames
+        if method == "ping":
+            return {"pid": os.getpid(), "protocol": DAEMON_PROTOCOL, "frames": len(frames),
+                    "uptime": time.time() - self.started}
+        if method == "capture":
+            own_pids = (params["client_pid"],) if params.get("client_pid") else ()
+            return frames.add(service.capture(own_pids))
+        if method == "open":
+            return frames.add(service.open(params["path"]))
+        if method == "cache_stats":
+            return service.cache_stats()
+
+        frame = frames.get(params["frame"], params.get("program"))
+        if method == "identify":
+            return service.identify(frame)
+        if method == "prefetch":
+            return service.prefetch(frame)
+        if method == "define_program":
+            return service.define_program(frame)
+        if method == "locate_steps":
+            return service.locate_steps(frame, params["steps"])
+        if method == "watch":
+            event, frame = service.watch(frame, [tuple(mask) for mask in params.get("masks") or ()])
+            return {"event": event, "frame": frames.add(frame) if event else None}
+        raise ValueError(f"невідомий метод {method}")
+
+    def stream(self, method: str, params: dict, should_stop, result: dict):
+        frame = self.frames.get(params["frame"], params.get("program"))
+        if method == "instructions":
+            return self.service.instructions(frame, params["program_name"], params["current_location"],
+                                             params["action"], params.get("refresh", False),
+                                             should_stop, result)
+        return self.service.prefetch_instructions(frame, params["program_name"],
+                                                  params["current_location"], params["actions"],
+                                                  should_stop, params.get("max_tokens"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Демон аналізу екрану для оверлея та скриптів")
+    parser.add_argument("--no-warm-up", action="store_true", help="не прогрівати модулі та з'єднання")
+    parser.add_argument("--idle-timeout", type=float, default=DAEMON_IDLE_TIMEOUT,
+                        help="завершитись після стількох секунд без клієнтів (0 - ніколи)")
+    args = parser.parse_args()
+
+    server = DaemonServer()
+    tracing.start_metrics_server(DAEMON_METRICS_PORT)
+    if not args.no_warm_up:
+        import warmup
+        warmup.start(connect=False)
+    print(f"🛰 Демон аналізу: {server.address}")
+    try:
+        server.serve_until_idle(args.idle_timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        import ocr_engine
+        ocr_engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
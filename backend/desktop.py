@@ -0,0 +1,149 @@
+import os
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class WindowInfo:
+    title: str
+    wm_class: str
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def region(self) -> dict:
+        return {"left": self.left, "top": self.top, "width": self.width, "height": self.height}
+
+
+def cursor_position() -> tuple:
+    """Повертає (x, y) курсора в координатах екрану або None"""
+    try:
+        if sys.platform == "win32":
+            return _win_cursor_position()
+        return _x11_cursor_position()
+    except Exception as e:
+        print(f"❌ Не вдалося визначити курсор: {e}")
+        return None
+
+
+def active_window(skip_own: bool = True, own_pids: tuple = ()) -> WindowInfo:
+    """Повертає активне вікно іншої програми (заголовок, клас, межі) або None; own_pids - інші власні процеси"""
+    own = {os.getpid(), *own_pids} if skip_own else set()
+    try:
+        if sys.platform == "win32":
+            return _win_active_window(own)
+        return _x11_active_window(own)
+    except Exception as e:
+        print(f"❌ Не вдалося визначити активне вікно: {e}")
+        return None
+
+
+def _x11_cursor_position() -> tuple:
+    from Xlib import display
+
+    disp = display.Display()
+    try:
+        pointer = disp.screen().root.query_pointer()
+        return (pointer.root_x, pointer.root_y)
+    finally:
+        disp.close()
+
+
+def _x11_property(disp, window, name: str):
+    from Xlib import X
+
+    prop = window.get_full_property(disp.intern_atom(name), X.AnyPropertyType)
+    return prop.value if prop and len(prop.value) else None
+
+
+def _x11_active_window(own: set) -> WindowInfo:
+    from Xlib import display
+
+    disp = display.Display()
+    try:
+        root = disp.screen().root
+        active = _x11_property(disp, root, "_NET_ACTIVE_WINDOW")
+        candidates = [active[0]] if active is not None and active[0] else []
+        if own:
+            stacking = _x11_property(disp, root, "_NET_CLIENT_LIST_STACKING")
+            candidates += list(reversed(stacking)) if stacking is not None else []
+
+        window = None
+        for window_id in candidates:
+            candidate = disp.create_resource_object("window", window_id)
+            pid = _x11_property(disp, candidate, "_NET_WM_PID")
+            if pid is None or pid[0] not in own:
+                window = candidate
+                break
+        if window is None:
+            return None
+
+        geometry = window.get_geometry()
+        position = window.translate_coords(root, 0, 0)
+
+        name = window.get_full_property(disp.intern_atom("_NET_WM_NAME"),
+                                        disp.intern_atom("UTF8_STRING"))
+        if name and name.value:
+            title = name.value.decode("utf-8", "replace") if isinstance(name.value, bytes) else str(name.value)
+        else:
+            title = window.get_wm_name() or ""
+
+        wm_class = window.get_wm_class() or ("", "")
+
+        return WindowInfo(
+            title=title,
+            wm_class=wm_class[-1],
+            left=-position.x,
+            top=-position.y,
+            width=geometry.width,
+            height=geometry.height
+        )
+    finally:
+        disp.close()
+
+
+def _win_cursor_position() -> tuple:
+    import ctypes
+    from ctypes import wintypes
+
+    point = wintypes.POINT()
+    ctypes.windll.user32.GetCursorPos(ctypes.byref(point))
+    return (point.x, point.y)
+
+
+def _win_active_window(own: set) -> WindowInfo:
+    import ctypes
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    user32.GetForegroundWindow.restype = wintypes.HWND
+    user32.GetWindow.restype = wintypes.HWND
+    hwnd = user32.GetForegroundWindow()
+    pid = wintypes.DWORD()
+    while hwnd and own:
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if (pid.value not in own and user32.IsWindowVisible(hwnd)
+                and not user32.IsIconic(hwnd) and user32.GetWindowTextLengthW(hwnd)):
+            break
+        hwnd = user32.GetWindow(hwnd, 2)
+    if not hwnd:
+        return None
+
+    rect = wintypes.RECT()
+    user32.GetWindowRect(hwnd, ctypes.byref(rect))
+
+    title = ctypes.create_unicode_buffer(512)
+    user32.GetWindowTextW(hwnd, title, 512)
+    class_name = ctypes.create_unicode_buffer(256)
+    user32.GetClassNameW(hwnd, class_name, 256)
+
+    return WindowInfo(
+        title=title.value,
+        wm_class=class_name.value,
+        left=rect.left,
+        top=rect.top,
+        width=rect.right - rect.left,
+        height=rect.bottom - rect.top
+    )
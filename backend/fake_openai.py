@@ -0,0 +1,203 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PROGRAM_REPLY = '''Name: "Text Editor"
+Location: "Main window"
+Action: "Save As"
+Action: "Open File"
+Action: "Find and Replace"
+Action: "Export PDF"
+Action: "Print"'''
+
+INSTRUCTIONS_REPLY = '''Click "File" menu
+Click "Save As"
+Type "document_name" in the "File name" field
+Click "Save" button'''
+
+PROGRAM_JSON = {
+    "name": "Text Editor",
+    "location": "Main window",
+    "actions": re.findall(r'Action: "([^"]+)"', PROGRAM_REPLY)
+}
+
+INSTRUCTIONS_JSON = [{"action": line, "labels": re.findall(r'"([^"]+)"', line)}
+                     for line in INSTRUCTIONS_REPLY.splitlines()]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Відповідає як /v1/chat/completions OpenAI з налаштовуваною затримкою"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests += 1
+        self.server.bytes_received += length
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, status=404)
+            return
+
+        reply = self.server.reply_for(request)
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(reply) > max_tokens * 4:
+            reply, finish_reason = reply[:max_tokens * 4], "length"
+        time.sleep(self.server.latency)
+
+        if request.get("stream"):
+            self._send_stream(reply, request, finish_reason)
+        else:
+            self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": finish_reason
+                }],
+                "usage": self.server.usage(length, reply)
+            })
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, request: dict, delta: dict, finish_reason):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_stream(self, reply: str, request: dict, finish_reason: str = "stop"):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        tokens = reply.replace("\n", " \n ").split(" ")
+        for number, token in enumerate(tokens):
+            text = token if token == "\n" or number == 0 or tokens[number - 1] == "\n" else " " + token
+            try:
+                self._send_event(request, {"content": text}, None)
+            except (BrokenPipeError, ConnectionResetError):
+                return  # клієнт скасував запит і закрив відповідь
+            time.sleep(self.server.token_delay)
+        self._send_event(request, {}, finish_reason)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "gpt-4o-mini"), "choices": [],
+                     "usage": self.server.usage(int(self.headers.get("Content-Length", 0)), reply)}
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Локальна заміна OpenAI API для бенчмарків і роботи офлайн"""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.5, token_delay: float = 0.01):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests = 0
+        self.bytes_received = 0
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def reply_for(self, request: dict) -> str:
+        text = json.dumps(request.get("messages", []), ensure_ascii=False)
+        schema = (request.get("response_format") or {}).get("json_schema")
+        if schema:
+            return json.dumps(self.structured_reply(schema, text))
+        if "For EACH action" in text:
+            actions = re.findall(r'- \\"([^"\\]+)\\"', text)
+            return "\n".join(f'Action: "{action}"\n{INSTRUCTIONS_REPLY}' for action in actions)
+        if "Name:" in text:
+            return PROGRAM_REPLY
+        if "action_1" in text:
+            return "\n".join(line for line in PROGRAM_REPLY.splitlines() if line.startswith("Action:"))
+        return INSTRUCTIONS_REPLY
+
+    def structured_reply(self, schema: dict, text: str) -> dict:
+        """Відповідь за JSON схемою запиту (режим RESPONSE_FORMAT = "json")"""
+        if schema["name"] == "program":
+            return PROGRAM_JSON
+        if schema["name"] == "actions":
+            return {"actions": PROGRAM_JSON["actions"]}
+
+        fields = json.dumps(schema["schema"])
+        steps = [dict(step, **{field: None for field in ("element", "point") if f'"{field}"' in fields})
+                 for step in INSTRUCTIONS_JSON]
+        if schema["name"] == "all_instructions":
+            actions = re.findall(r'- \\"([^"\\]+)\\"', text)
+            return {"instructions": [{"action": action, "steps": steps} for action in actions]}
+        return {"steps": steps}
+
+    def usage(self, request_bytes: int, reply: str) -> dict:
+        prompt_tokens = request_bytes // 4
+        completion_tokens = len(reply) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальний фейковий OpenAI chat-completions сервер")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="затримка перед відповіддю, с")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="затримка між токенами стріму, с")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=args.token_delay)
+    print(f"🧪 Fake OpenAI: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
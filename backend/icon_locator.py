@@ -0,0 +1,402 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageFilter
+from config import (ICON_DIR, ICON_STORE_MAX_COUNT, ICON_STORE_MAX_BYTES, ICON_LEARNED_MAX_AGE,
+                    ICON_MATCH_MAX_EDGE, ICON_MATCH_SCALES, ICON_MATCH_THRESHOLD)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MEMORY_TEMPLATES = 16
+SMALL_BLUR = 1.0
+CANDIDATE_MAX_DIFF = 12.0
+
+
+def icon_key(program_name: str, label: str) -> str:
+    """Ключ іконки: програма та нормалізована назва елемента"""
+    from ocr_utils import normalize_text
+    return f"{normalize_text(program_name or '')}|{normalize_text(label)}"
+
+
+class IconLibrary:
+    """Обмежене сховище вирізок іконок за програмою та назвою з LRU витісненням"""
+
+    def __init__(self, root, max_count: int = ICON_STORE_MAX_COUNT,
+                 max_bytes: int = ICON_STORE_MAX_BYTES, learned_max_age: float = ICON_LEARNED_MAX_AGE):
+        self.root = Path(root)
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.learned_max_age = learned_max_age
+        self.index_path = self.root / "index.json"
+        self._entries = None
+        self._templates = OrderedDict()
+        self._candidates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, program_name: str, label: str, img: Image.Image, learned: bool = False):
+        """Зберігає вирізку елемента (замінює попередню); learned - лише з підказок моделі, має строк"""
+        key = icon_key(program_name, label)
+        file = f"{hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()}.png"
+        path = self.root / file
+        self.root.mkdir(parents=True, exist_ok=True)
+        img.convert("L").save(path, format="PNG")
+
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entries[key] = {"file": file, "bytes": path.stat().st_size, "created": now, "used": now,
+                            "learned": learned, "confirmed": now}
+            entries.move_to_end(key)
+            self._templates.pop(key, None)
+            self._evict(keep=key)
+            self._save()
+
+    def propose(self, program_name: str, label: str, img: Image.Image, source: str) -> bool:
+        """Непідтверджена вирізка: зберігається (зі строком), лише коли інший кадр (source) дає схожу; True - збережено"""
+        key = icon_key(program_name, label)
+        pixels = np.asarray(img.convert("L"), dtype=np.float32)
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is not None:
+            return self._recheck(key, entry, pixels)
+        with self._lock:
+            previous = self._candidates.pop(key, None)
+            self._candidates[key] = (source, pixels)
+            while len(self._candidates) > MEMORY_TEMPLATES:
+                self._candidates.popitem(last=False)
+        if previous is None or previous[0] == source or previous[1].shape != pixels.shape:
+            return False
+        if np.abs(previous[1] - pixels).mean() > CANDIDATE_MAX_DIFF:
+            return False
+        with self._lock:
+            self._candidates.pop(key, None)
+        self.put(program_name, label, img, learned=True)
+        return True
+
+    def _recheck(self, key: str, entry: dict, pixels: "np.ndarray") -> bool:
+        """Нова підказка для збереженої іконки: схожа продовжує строк вивченої, інша - вивчену видаляє"""
+        if not entry.get("learned", True):
+            return False  # підтверджену OCR іконку підказки не змінюють
+        try:
+            with Image.open(self.root / entry["file"]) as img:
+                stored = np.asarray(img.convert("L"), dtype=np.float32)
+        except OSError:
+            stored = None
+        agrees = (stored is not None and stored.shape == pixels.shape
+                  and np.abs(stored - pixels).mean() <= CANDIDATE_MAX_DIFF)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return False
+            if agrees:
+                entry["confirmed"] = time.time()
+            else:
+                print(f"🗑 Іконка '{key}' суперечить новій підказці - видалено")
+                self._remove(key)
+            self._save()
+        return agrees
+
+    def template(self, program_name: str, label: str):
+        """Повертає шаблон іконки або None"""
+        key = icon_key(program_name, label)
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                self._remove(key)
+                self._save()
+                return None
+            if key not in self._templates:
+                try:
+                    with Image.open(self.root / entry["file"]) as img:
+                        pixels = np.asarray(img.convert("L"), dtype=np.float32)
+                except OSError:
+                    self._entries.pop(key)
+                    return None
+                self._templates[key] = IconTemplate(pixels)
+                while len(self._templates) > MEMORY_TEMPLATES:
+                    self._templates.popitem(last=False)
+            entry["used"] = time.time()
+            self._entries.move_to_end(key)
+            self._templates.move_to_end(key)
+            return self._templates[key]
+
+    def has_program(self, program_name: str) -> bool:
+        prefix = icon_key(program_name, "")
+        with self._lock:
+            return any(key.startswith(prefix) for key in self._load())
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._load()
+            return {"count": len(entries), "bytes": sum(e["bytes"] for e in entries.values())}
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+            self._entries = OrderedDict(sorted(entries.items(), key=lambda item: item[1]["used"]))
+            if self._evict():
+                self._save()
+        return self._entries
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        """Вивчена лише з підказок іконка, яку давно ніщо не підтверджувало"""
+        return entry.get("learned", True) and now - entry.get("confirmed", entry["created"]) > self.learned_max_age
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._templates.pop(key, None)
+        try:
+            os.remove(self.root / entry["file"])
+        except OSError:
+            pass
+
+    def _evict(self, keep: str = None) -> int:
+        """Видаляє прострочені вивчені іконки, потім найдавніше використані, поки сховище перевищує ліміти"""
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if key != keep and self._expired(entry, now)]
+        for key in expired:
+            self._remove(key)
+        removed = len(expired)
+        total = sum(e["bytes"] for e in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_count and total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]["bytes"]
+            self._remove(key)
+            removed += 1
+        return removed
+
+    def _save(self):
+        tmp_path = self.index_path.with_name("index.json.tmp")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"❌ Помилка збереження бібліотеки іконок: {e}")
+
+
+def _fast_len(n: int) -> int:
+    """Найменша довжина >= n з множниками 2, 3, 5 (швидке FFT)"""
+    while True:
+        m = n
+        for factor in (2, 3, 5):
+            while m % factor == 0:
+                m //= factor
+        if m == 1:
+            return n
+        n += 1
+
+
+class FrameSpectrum:
+    """Зменшений сірий кадр, його спектр та інтегральні зображення для NCC"""
+
+    def __init__(self, img: Image.Image, max_edge: int = ICON_MATCH_MAX_EDGE):
+        small = img.convert("L")
+        self.full = np.asarray(small, dtype=np.float32)
+        self.scale = min(1.0, max_edge / max(img.size))
+        if self.scale < 1.0:
+            small = small.resize((max(1, round(img.width * self.scale)),
+                                  max(1, round(img.height * self.scale))), Image.BOX)
+            small = small.filter(ImageFilter.GaussianBlur(SMALL_BLUR))
+        self.gray = np.asarray(small, dtype=np.float64)
+        height, width = self.gray.shape
+        self.shape = (_fast_len(height), _fast_len(width))
+        self.spectrum = np.fft.rfft2(self.gray, self.shape)
+        self.sum1 = np.pad(self.gray.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        self.sum2 = np.pad((self.gray ** 2).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        self._deviations = {}
+
+    def _deviation(self, h: int, w: int):
+        """Стандартне відхилення * sqrt(n) кожного вікна h x w (inf для однотонних)"""
+        if (h, w) not in self._deviations:
+            s1, s2 = self.sum1, self.sum2
+            sums = s1[h:, w:] - s1[:-h, w:]
+            sums -= s1[h:, :-w]
+            sums += s1[:-h, :-w]
+            variance = s2[h:, w:] - s2[:-h, w:]
+            variance -= s2[h:, :-w]
+            variance += s2[:-h, :-w]
+            sums *= sums
+            sums /= h * w
+            variance -= sums
+            variance[variance < 1.0] = np.inf
+            self._deviations[(h, w)] = np.sqrt(variance, out=variance)
+        return self._deviations[(h, w)]
+
+    def correlate(self, kernel, h: int, w: int, norm: float, count: int = 8) -> list:
+        """NCC шаблону (спряжений спектр kernel) з кадром: до count найкращих [(оцінка, x, y)]"""
+        rows, columns = self.gray.shape
+        product = np.fft.irfft2(self.spectrum * kernel, self.shape)
+        scores = product[:rows - h + 1, :columns - w + 1] / self._deviation(h, w)
+
+        peaks = []
+        for _ in range(count):
+            y, x = np.unravel_index(np.argmax(scores), scores.shape)
+            peaks.append((float(scores[y, x]) / norm, int(x), int(y)))
+            scores[max(0, y - h):y + h, max(0, x - w):x + w] = -1.0
+        return peaks
+
+    def refine(self, centered, norm: float, x: int, y: int, radius: int) -> tuple:
+        """Точна NCC у повному розмірі біля (x, y): (оцінка, x, y)"""
+        h, w = centered.shape
+        rows, columns = self.full.shape
+        left, top = max(0, x - radius), max(0, y - radius)
+        right, bottom = min(columns - w, x + radius), min(rows - h, y + radius)
+        if right < left or bottom < top:
+            return -1.0, x, y
+
+        patch = self.full[top:bottom + h, left:right + w].astype(np.float64)
+        windows = np.lib.stride_tricks.sliding_window_view(patch, (h, w))
+        numerator = np.einsum("ijkl,kl->ij", windows, centered)
+
+        sums = np.pad(patch.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        squares = np.pad((patch * patch).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        window_sums = sums[h:, w:] - sums[:-h, w:] - sums[h:, :-w] + sums[:-h, :-w]
+        variance = squares[h:, w:] - squares[:-h, w:] - squares[h:, :-w] + squares[:-h, :-w]
+        variance -= window_sums * window_sums / (h * w)
+        scores = numerator / (np.sqrt(np.maximum(variance, 1.0)) * norm)
+
+        dy, dx = np.unravel_index(np.argmax(scores), scores.shape)
+        return float(scores[dy, dx]), left + int(dx), top + int(dy)
+
+
+class IconTemplate:
+    """Шаблон іконки; масштабовані копії та їх спектри готуються один раз під розмір кадру"""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self._geometry = None
+        self._variants = []
+
+    def variants(self, spectrum: FrameSpectrum, scales=ICON_MATCH_SCALES) -> list:
+        """[(центрований шаблон, його норма, спряжений спектр зменшеного, h, w, норма)] для кожного масштабу"""
+        geometry = (spectrum.scale, spectrum.shape, tuple(scales))
+        if geometry == self._geometry:
+            return self._variants
+
+        variants = []
+        rows, columns = spectrum.gray.shape
+        for scale in scales:
+            size = (max(1, round(self.pixels.shape[1] * scale)), max(1, round(self.pixels.shape[0] * scale)))
+            scaled = self.pixels if scale == 1.0 else np.asarray(
+                Image.fromarray(self.pixels).resize(size, Image.BILINEAR), dtype=np.float32)
+            small_size = (max(1, round(size[0] * spectrum.scale)), max(1, round(size[1] * spectrum.scale)))
+            small = Image.fromarray(scaled.astype(np.uint8)).resize(small_size, Image.BOX)
+            if spectrum.scale < 1.0:
+                small = small.filter(ImageFilter.GaussianBlur(SMALL_BLUR))
+            small = np.asarray(small, dtype=np.float64)
+
+            h, w = small.shape
+            centered = small - small.mean()
+            norm = float(np.sqrt((centered ** 2).sum()))
+            if h > rows or w > columns or h * w < 16 or norm < 1e-6:
+                continue
+            kernel = np.conj(np.fft.rfft2(centered, spectrum.shape)).astype(np.complex64)
+            full = scaled.astype(np.float64) - scaled.mean()
+            variants.append((full, float(np.sqrt((full ** 2).sum())), kernel, h, w, norm))
+
+        self._geometry, self._variants = geometry, variants
+        return variants
+
+
+def match_template(spectrum: FrameSpectrum, template: IconTemplate,
+                   threshold: float = ICON_MATCH_THRESHOLD) -> tuple:
+    """Багатомасштабний пошук шаблону: (left, top, width, height) у пікселях кадру або None"""
+    best = None
+    radius = int(round(1 / spectrum.scale)) + 1
+    for full, full_norm, kernel, h, w, norm in template.variants(spectrum):
+        if full_norm < 1e-6:
+            continue
+        for _, x, y in spectrum.correlate(kernel, h, w, norm):
+            score, left, top = spectrum.refine(full, full_norm, int(round(x / spectrum.scale)),
+                                               int(round(y / spectrum.scale)), radius)
+            if best is None or score > best[0]:
+                best = (score, left, top, full.shape[1], full.shape[0])
+
+    if best is None or best[0] < threshold:
+        return None
+    return best[1:]
+
+
+icon_library = IconLibrary(ICON_DIR)
+
+_spectrum_cache = OrderedDict()
+_spectrum_lock = threading.Lock()
+_spectrum_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="icons")
+
+
+def _build_spectrum(screenshot) -> FrameSpectrum:
+    from screenshot import load_image
+    return FrameSpectrum(load_image(screenshot))
+
+
+def prefetch_spectrum(screenshot) -> Future:
+    """Рахує спектр кадру у фоні (один раз на кадр, для всіх кроків), повертає Future"""
+    key = getattr(screenshot, "digest", None) or str(screenshot)
+    with _spectrum_lock:
+        if key in _spectrum_cache:
+            _spectrum_cache.move_to_end(key)
+            return _spectrum_cache[key]
+        future = _spectrum_executor.submit(_build_spectrum, screenshot)
+        _spectrum_cache[key] = future
+        while len(_spectrum_cache) > 2:
+            _spectrum_cache.popitem(last=False)
+    return future
+
+
+def prefetch_icons(screenshot, program_name: str):
+    """Готує кадр до пошуку іконок, якщо для програми вже є збережені іконки"""
+    if np is not None and icon_library.has_program(program_name):
+        prefetch_spectrum(screenshot)
+
+
+def find_icon(screenshot, program_name: str, label: str) -> tuple:
+    """Шукає збережену іконку на кадрі: (left, top, width, height) або None"""
+    if np is None:
+        return None
+    template = icon_library.template(program_name, label)
+    if template is None:
+        return None
+    return match_template(prefetch_spectrum(screenshot).result(), template)
+
+
+def _crop(screenshot, box: tuple) -> Image.Image:
+    from screenshot import load_image
+
+    left, top, width, height = box
+    img = load_image(screenshot)
+    crop = img.crop((max(0, left), max(0, top), min(img.width, left + width), min(img.height, top + height)))
+    return crop if crop.width * crop.height >= 64 else None
+
+
+def remember_icon(screenshot, program_name: str, label: str, box: tuple):
+    """Зберігає підтверджену вирізку (left, top, width, height) кадру як шаблон іконки"""
+    crop = _crop(screenshot, box)
+    if crop is not None:
+        icon_library.put(program_name, label, crop)
+
+
+def propose_icon(screenshot, program_name: str, label: str, box: tuple) -> bool:
+    """Пропонує непідтверджену вирізку; шаблоном вона стає, лише якщо інший кадр дав схожу"""
+    crop = _crop(screenshot, box)
+    if crop is None or np is None:
+        return False
+    return icon_library.propose(program_name, label, crop, getattr(screenshot, "digest", None) or str(screenshot))
@@ -0,0 +1,72 @@
+import base64
+import io
+from dataclasses import dataclass
+
+from PIL import Image
+from config import (IMAGE_FORMAT, IMAGE_QUALITY, UPLOAD_MAX_EDGE, UPLOAD_GRAYSCALE,
+                    UPLOAD_REGION)
+from screenshot import Frame, Transform, MIME_TYPES
+
+
+@dataclass
+class Upload:
+    data_url: str
+    size: tuple
+    transform: Transform
+    sent_bytes: int
+    raw_bytes: int
+
+    @property
+    def savings(self) -> float:
+        """Частка заощаджених байтів відносно повного кадру без стиснення"""
+        return 1 - self.sent_bytes / self.raw_bytes if self.raw_bytes else 0.0
+
+
+def resolve_region(frame: Frame, region) -> tuple:
+    """Обрізає область (left, top, width, height) у пікселях кадру до меж кадру"""
+    if not region:
+        return (0, 0, frame.width, frame.height)
+
+    left, top, width, height = region
+    left = max(0, min(int(left), frame.width - 1))
+    top = max(0, min(int(top), frame.height - 1))
+    width = max(1, min(int(width), frame.width - left))
+    height = max(1, min(int(height), frame.height - top))
+    return (left, top, width, height)
+
+
+def prepare_upload(frame: Frame, max_edge: int = UPLOAD_MAX_EDGE,
+                   grayscale: bool = UPLOAD_GRAYSCALE, region=UPLOAD_REGION,
+                   fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> Upload:
+    """Зменшує, обрізає та кодує кадр для відправки моделі, зберігаючи перетворення координат"""
+    left, top, width, height = resolve_region(frame, region)
+
+    img = frame.to_image()
+    if (left, top, width, height) != (0, 0, frame.width, frame.height):
+        img = img.crop((left, top, left + width, top + height))
+
+    scale = min(1.0, max_edge / max(width, height)) if max_edge else 1.0
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    if grayscale:
+        img = img.convert("L")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=quality)
+    b64_img = base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+    to_frame = Transform(
+        scale_x=width / img.width,
+        scale_y=height / img.height,
+        offset_x=left,
+        offset_y=top
+    )
+    return Upload(
+        data_url=f"data:{MIME_TYPES[fmt]};base64,{b64_img}",
+        size=img.size,
+        transform=to_frame.then(frame.transform),
+        sent_bytes=len(b64_img),
+        raw_bytes=frame.width * frame.height * 3
+    )
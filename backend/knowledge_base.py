@@ -0,0 +1,186 @@
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from config import KNOWLEDGE_BASE_PATH, KNOWLEDGE_BASE_MAX_ENTRIES, KNOWLEDGE_BASE_MAX_AGE
+
+STEP_FIELDS = ("action", "quoted_text")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instructions (
+    program TEXT NOT NULL,
+    location TEXT NOT NULL,
+    action TEXT NOT NULL,
+    steps TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (program, location, action)
+);
+CREATE INDEX IF NOT EXISTS instructions_used ON instructions (used);
+"""
+
+
+def normalize_key(text: str) -> str:
+    """Нормалізує частину ключа: нижній регістр, без пунктуації та зайвих пробілів"""
+    return " ".join(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+
+
+def key_for(program_name: str, current_location: str, action: str) -> tuple:
+    return normalize_key(program_name), normalize_key(current_location), normalize_key(action)
+
+
+class KnowledgeBase:
+    """Локальна база інструкцій за (програма, розташування, дія) з LRU та TTL"""
+
+    def __init__(self, path, max_entries: int = KNOWLEDGE_BASE_MAX_ENTRIES,
+                 max_age: float = KNOWLEDGE_BASE_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._lock = threading.Lock()
+
+    def lookup(self, program_name: str, current_location: str, action: str):
+        """Повертає збережені кроки (без координат) або None"""
+        key = key_for(program_name, current_location, action)
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT steps, created FROM instructions "
+                             "WHERE program = ? AND location = ? AND action = ?", key).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with db:
+                db.execute("UPDATE instructions SET used = ?, hits = hits + 1 "
+                           "WHERE program = ? AND location = ? AND action = ?", (time.time(),) + key)
+        return json.loads(row[0])
+
+    def store(self, program_name: str, current_location: str, action: str, steps: list):
+        """Зберігає кроки інструкції, замінюючи попередню відповідь"""
+        steps = [{field: step.get(field) for field in STEP_FIELDS} for step in steps]
+        if not steps or not all(key_for(program_name, current_location, action)):
+            return
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("INSERT OR REPLACE INTO instructions VALUES (?, ?, ?, ?, ?, ?, 0)",
+                           key_for(program_name, current_location, action)
+                           + (json.dumps(steps, ensure_ascii=False), now, now))
+                self._evict(db)
+
+    def forget(self, program_name: str, current_location: str, action: str):
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM instructions WHERE program = ? AND location = ? AND action = ?",
+                           key_for(program_name, current_location, action))
+
+    def known(self, program_name: str, current_location: str, actions: list) -> set:
+        """Повертає дії, для яких уже є свіжі інструкції"""
+        program, location = normalize_key(program_name), normalize_key(current_location)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT action FROM instructions WHERE program = ? AND location = ? AND created >= ?",
+                (program, location, time.time() - self.max_age)).fetchall()
+        stored = {row[0] for row in rows}
+        return {action for action in actions if normalize_key(action) in stored}
+
+    def export_file(self, path) -> int:
+        """Записує всі свіжі записи в JSON файл, повертає їх кількість"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT program, location, action, steps, created FROM instructions "
+                "WHERE created >= ? ORDER BY used DESC", (time.time() - self.max_age,)).fetchall()
+        entries = [{"program": program, "location": location, "action": action,
+                    "steps": json.loads(steps), "created": created}
+                   for program, location, action, steps, created in rows]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        return len(entries)
+
+    def import_file(self, path) -> int:
+        """Додає записи з JSON файлу; новіші відповіді перемагають, повертає кількість оновлених"""
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+
+        now = time.time()
+        imported = 0
+        with self._lock:
+            db = self._connect()
+            with db:
+                for entry in entries:
+                    key = key_for(entry["program"], entry["location"], entry["action"])
+                    created = float(entry.get("created", now))
+                    if not all(key) or not entry.get("steps") or now - created > self.max_age:
+                        continue
+                    steps = [{field: step.get(field) for field in STEP_FIELDS} for step in entry["steps"]]
+                    cursor = db.execute(
+                        "INSERT INTO instructions VALUES (?, ?, ?, ?, ?, ?, 0) "
+                        "ON CONFLICT (program, location, action) DO UPDATE SET "
+                        "steps = excluded.steps, created = excluded.created "
+                        "WHERE excluded.created > instructions.created",
+                        key + (json.dumps(steps, ensure_ascii=False), created, now))
+                    imported += cursor.rowcount
+                self._evict(db)
+        return imported
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, = self._connect().execute("SELECT COUNT(*) FROM instructions").fetchone()
+        return {"count": count, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM instructions")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+            with self._db:
+                self._evict(self._db)
+        return self._db
+
+    def _evict(self, db: sqlite3.Connection):
+        """Видаляє прострочені записи та найдавніше використані понад ліміт"""
+        db.execute("DELETE FROM instructions WHERE created < ?", (time.time() - self.max_age,))
+        db.execute("DELETE FROM instructions WHERE rowid IN (SELECT rowid FROM instructions "
+                   "ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+
+knowledge_base = KnowledgeBase(KNOWLEDGE_BASE_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальна база інструкцій")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export").add_argument("path")
+    commands.add_parser("import").add_argument("path")
+    commands.add_parser("stats")
+    commands.add_parser("clear")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"📤 Експортовано: {knowledge_base.export_file(args.path)}")
+    elif args.command == "import":
+        print(f"📥 Імпортовано: {knowledge_base.import_file(args.path)}")
+    elif args.command == "stats":
+        print(f"📚 Записів: {knowledge_base.stats()['count']}")
+    else:
+        knowledge_base.clear()
+        print("🗑 Базу очищено")
+
+
+if __name__ == "__main__":
+    main()
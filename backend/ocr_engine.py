@@ -0,0 +1,206 @@
+import importlib.util
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+import pytesseract
+from config import (TESSERACT_PATH, OCR_BACKEND, OCR_WORKERS, OCR_TILE_SIZE, OCR_TILE_OVERLAP,
+                    OCR_LANGUAGE)
+
+if TESSERACT_PATH:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+
+_api = None
+_pool = None
+_pool_lock = threading.Lock()
+_slow_path_reported = False
+
+
+def _init_worker(tesseract_path: str, language: str):
+    """Готує процес-обробник: шлях до tesseract і тепла модель tesserocr, якщо вона є"""
+    global _api
+    if tesseract_path:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    try:
+        import tesserocr
+        _api = tesserocr.PyTessBaseAPI(lang=language)
+    except Exception:
+        _api = None
+
+
+def _parse_tsv(tsv: str) -> list:
+    rows = []
+    for line in tsv.splitlines():
+        fields = line.split("\t")
+        if len(fields) < 12 or not fields[0].isdigit():
+            continue
+        rows.append(fields)
+    return rows
+
+
+def _recognize_image(img: Image.Image) -> list:
+    """Розпізнає слова: [(text, left, top, width, height, conf, (block, par, line))]"""
+    if _api is not None:
+        _api.SetImage(img)
+        rows = _parse_tsv(_api.GetTSVText(0))
+        words = [(f[11], int(f[6]), int(f[7]), int(f[8]), int(f[9]), float(f[10]),
+                  (int(f[2]), int(f[3]), int(f[4]))) for f in rows]
+    else:
+        data = pytesseract.image_to_data(img, lang=OCR_LANGUAGE, output_type=pytesseract.Output.DICT)
+        words = [(data['text'][i], data['left'][i], data['top'][i], data['width'][i],
+                  data['height'][i], float(data['conf'][i]),
+                  (data['block_num'][i], data['par_num'][i], data['line_num'][i]))
+                 for i in range(len(data['text']))]
+    return [w for w in words if w[0].strip()]
+
+
+def _recognize_tile(mode: str, size: tuple, pixels: bytes) -> list:
+    """Розпізнає плитку в процесі пулу; помилки віддає як RuntimeError, що гарантовано серіалізується"""
+    try:
+        return _recognize_image(Image.frombytes(mode, size, pixels))
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _axis_tiles(length: int, tile_size: int, overlap: int) -> list:
+    """Плитки вздовж осі: [(start, end, core_start, core_end)]; межа ядер - середина перекриття"""
+    if length <= tile_size:
+        return [(0, length, 0, length)]
+
+    starts = list(range(0, length - tile_size, tile_size - overlap)) + [length - tile_size]
+    ends = [start + tile_size for start in starts]
+    tiles = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        core_start = (start + ends[i - 1]) // 2 if i > 0 else 0
+        core_end = (end + starts[i + 1]) // 2 if i + 1 < len(starts) else length
+        tiles.append((start, end, core_start, core_end))
+    return tiles
+
+
+def tile_boxes(width: int, height: int, tile_size: int = OCR_TILE_SIZE,
+               overlap: int = OCR_TILE_OVERLAP) -> list:
+    """Ділить кадр на плитки з перекриттям: [((left, top, right, bottom), core)]"""
+    return [((x0, y0, x1, y1), (cx0, cy0, cx1, cy1))
+            for y0, y1, cy0, cy1 in _axis_tiles(height, tile_size, overlap)
+            for x0, x1, cx0, cx1 in _axis_tiles(width, tile_size, overlap)]
+
+
+def _join_lines(words: list) -> list:
+    """Зшиває рядки, розрізані межами плиток, в один ключ рядка"""
+    lines = {}
+    for word in words:
+        lines.setdefault(word[6], []).append(word)
+
+    parent = {key: key for key in lines}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    spans = {key: (min(w[1] for w in ws), min(w[2] for w in ws),
+                   max(w[1] + w[3] for w in ws), max(w[2] + w[4] for w in ws))
+             for key, ws in lines.items()}
+    keys = sorted(spans, key=lambda k: spans[k][0])
+    for i, a in enumerate(keys):
+        a_left, a_top, a_right, a_bottom = spans[a]
+        for b in keys[i + 1:]:
+            b_left, b_top, b_right, b_bottom = spans[b]
+            if b_left > a_right + 2 * (a_bottom - a_top):
+                break
+            if a[0] == b[0]:
+                continue
+            overlap = min(a_bottom, b_bottom) - max(a_top, b_top)
+            if overlap > 0.5 * min(a_bottom - a_top, b_bottom - b_top):
+                parent[find(b)] = find(a)
+
+    return [w[:6] + (find(w[6]),) for w in words]
+
+
+def _report_slow_path():
+    """Один раз повідомляє, що без tesserocr кожне розпізнавання запускає процес tesseract"""
+    global _slow_path_reported
+    if _slow_path_reported or importlib.util.find_spec("tesserocr") is not None:
+        return
+    _slow_path_reported = True
+    print("🐢 tesserocr не встановлено - кожна плитка OCR запускає tesseract окремим процесом "
+          "(pip install tesserocr, щоб модель лишалась завантаженою в обробниках)")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _report_slow_path()
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_worker,
+                                        initargs=(TESSERACT_PATH, OCR_LANGUAGE))
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """Відкидає зламаний пул, щоб наступний виклик створив новий"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up():
+    """Запускає процеси пулу та завантажує в них модель заздалегідь"""
+    if OCR_BACKEND != "pool":
+        return
+    pool = _get_pool()
+    blank = Image.new("L", (32, 32), 255)
+    try:
+        futures = [pool.submit(_recognize_tile, blank.mode, blank.size, blank.tobytes())
+                   for _ in range(OCR_WORKERS)]
+        for future in futures:
+            future.result()
+    except BrokenProcessPool:
+        _reset_pool(pool)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def recognize(img: Image.Image) -> list:
+    """Розпізнає слова всього зображення: [(text, left, top, width, height, conf, line)]"""
+    if OCR_BACKEND != "pool":
+        _report_slow_path()
+        return _recognize_image(img)
+
+    tiles = tile_boxes(img.width, img.height)
+    crops = [img.crop(box) if len(tiles) > 1 else img for box, _ in tiles]
+    results = None
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            futures = [pool.submit(_recognize_tile, tile.mode, tile.size, tile.tobytes())
+                       for tile in crops]
+            results = [future.result() for future in futures]
+            break
+        except BrokenProcessPool:
+            print("⚠️ Пул OCR зламано - перезапуск")
+            _reset_pool(pool)
+    if results is None:
+        print("⚠️ Пул OCR недоступний - розпізнавання в цьому процесі")
+        results = [_recognize_image(tile) for tile in crops]
+
+    words = []
+    for number, ((box, core), tile_words) in enumerate(zip(tiles, results)):
+        core_left, core_top, core_right, core_bottom = core
+        for text, left, top, width, height, conf, line in tile_words:
+            left, top = left + box[0], top + box[1]
+            center_x, center_y = left + width / 2, top + height / 2
+            if core_left <= center_x < core_right and core_top <= center_y < core_bottom:
+                words.append((text, left, top, width, height, conf, (number,) + line))
+
+    return _join_lines(words) if len(tiles) > 1 else words
@@ -0,0 +1,192 @@
+from PIL import Image
+from config import OCR_PREPROCESS, OCR_PREPROCESS_PROFILES, OCR_TILE_SIZE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ATLAS_GAP = 24
+
+
+def profile_for(screenshot=None, program_name: str = None) -> dict:
+    """Налаштування препроцесингу для програми: базові + профіль за назвою/вікном"""
+    settings = dict(OCR_PREPROCESS)
+    window = getattr(screenshot, "window", None)
+    names = [program_name or getattr(screenshot, "program", None),
+             getattr(window, "wm_class", None), getattr(window, "title", None)]
+    names = [name.lower() for name in names if name]
+
+    for key, overrides in OCR_PREPROCESS_PROFILES.items():
+        if any(key.lower() in name for name in names):
+            settings.update(overrides)
+            break
+    return settings
+
+
+def to_gray(img: Image.Image) -> "np.ndarray":
+    """Яскравість (ITU-R 601) як масив uint8 (перетворення робить PIL у C)"""
+    return np.asarray(img if img.mode == "L" else img.convert("L"))
+
+
+def _percentile(histogram: "np.ndarray", fraction: float) -> int:
+    """Рівень яскравості, нижче якого лежить fraction пікселів гістограми"""
+    cumulative = np.cumsum(histogram)
+    return int(np.searchsorted(cumulative, fraction * cumulative[-1]))
+
+
+def normalize(gray: "np.ndarray", invert="auto", contrast: bool = True) -> "np.ndarray":
+    """Темна тема -> темний текст на світлому фоні; розтягує контраст між 2 і 98 перцентилями"""
+    histogram = np.bincount(gray[::4, ::4].ravel(), minlength=256)
+    if invert == "auto":
+        invert = _percentile(histogram, 0.5) < 110
+    levels = np.arange(256, dtype=np.float32)
+    changed = bool(invert)
+    if invert:
+        levels = 255 - levels
+        histogram = histogram[::-1]
+
+    if contrast:
+        low, high = _percentile(histogram, 0.02), _percentile(histogram, 0.98)
+        if high - low >= 16:
+            levels = (levels - low) * (255.0 / (high - low))
+            changed = True
+    if not changed:
+        return gray
+    # Одна таблиця на 256 рівнів замість арифметики над кожним пікселем; таблицю застосовує PIL у C
+    lut = np.clip(levels, 0, 255).astype(np.uint8).tolist()
+    return np.asarray(Image.fromarray(gray).point(lut))
+
+
+def text_regions(gray: "np.ndarray", cell: int = 8, edge_threshold: int = 40,
+                 min_density: float = 0.06, padding: int = 4) -> list:
+    """Знаходить ймовірні області тексту за щільністю вертикальних контурів у клітинках сітки"""
+    height, width = gray.shape
+    rows, columns = height // cell, width // cell
+    if not rows or not columns:
+        return [(0, 0, width, height)]
+
+    # |різниця| сусідніх пікселів без переходу в int16; 0/1 у uint8, щоб сумувати без копій
+    area = gray[:rows * cell, :columns * cell]
+    left, right = area[:, :-1], area[:, 1:]
+    edges = np.zeros(area.shape, dtype=np.uint8)
+    np.greater(np.maximum(left, right) - np.minimum(left, right), edge_threshold,
+               out=edges[:, :-1].view(bool))
+    counts = edges[0::cell].copy()
+    for offset in range(1, cell):
+        counts += edges[offset::cell]
+    density = counts.reshape(rows, columns, cell).sum(axis=2) / (cell * cell)
+
+    mask = density >= min_density
+    mask[:, 1:] |= mask[:, :-1].copy()
+    mask[:, :-1] |= mask[:, 1:].copy()
+
+    regions = []
+    for top, left, bottom, right in _components(mask):
+        x0 = max(0, left * cell - padding)
+        y0 = max(0, top * cell - padding)
+        x1 = min(width, (right + 1) * cell + padding)
+        y1 = min(height, (bottom + 1) * cell + padding)
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+    return regions
+
+
+def _components(mask: "np.ndarray") -> list:
+    """Рамки (top, left, bottom, right) 4-зв'язних компонент маски: відрізки рядків NumPy + union-find"""
+    edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_rows, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1]
+    count = len(starts)
+    parent = list(range(count))
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    # Відрізки сусідніх рядків з'єднані, якщо перекриваються по стовпцях
+    row_bounds = np.searchsorted(run_rows, np.arange(mask.shape[0] + 1))
+    run_rows, starts, ends = run_rows.tolist(), starts.tolist(), ends.tolist()
+    for row in range(mask.shape[0] - 1):
+        above, above_end = row_bounds[row], row_bounds[row + 1]
+        below, below_end = above_end, row_bounds[row + 2]
+        while above < above_end and below < below_end:
+            if starts[above] < ends[below] and starts[below] < ends[above]:
+                a, b = find(above), find(below)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+            if ends[above] < ends[below]:
+                above += 1
+            else:
+                below += 1
+
+    boxes = {}
+    for run in range(count):
+        root = find(run)
+        row, start, end = run_rows[run], starts[run], ends[run] - 1
+        if root not in boxes:
+            boxes[root] = [row, start, row, end]
+        else:
+            box = boxes[root]
+            box[1], box[2], box[3] = min(box[1], start), row, max(box[3], end)
+    return [tuple(box) for _, box in sorted(boxes.items())]
+
+
+def pack_regions(regions: list, max_width: int, gap: int = ATLAS_GAP) -> tuple:
+    """Розкладає області по полицях атласу: ([(region, (x, y))], (width, height))"""
+    order = sorted(regions, key=lambda r: r[3], reverse=True)
+    width = max([max_width] + [r[2] + 2 * gap for r in regions])
+    placements = []
+    x = y = gap
+    shelf = 0
+    for region in order:
+        if x + region[2] + gap > width:
+            x, y = gap, y + shelf + gap
+            shelf = 0
+        placements.append((region, (x, y)))
+        x += region[2] + gap
+        shelf = max(shelf, region[3])
+    return placements, (width, y + shelf + gap)
+
+
+def prepare(img: Image.Image, settings: dict) -> tuple:
+    """Повертає (підготовлене L зображення, області тексту або None - весь кадр)"""
+    gray = normalize(to_gray(img), settings.get("invert", "auto"), settings.get("contrast", True))
+    if not settings.get("regions", True):
+        return Image.fromarray(gray), None
+    regions = text_regions(gray, settings.get("cell", 8), settings.get("edge_threshold", 40),
+                           settings.get("min_density", 0.06), settings.get("padding", 4))
+    return Image.fromarray(gray), regions
+
+
+def recognize(img: Image.Image, recognize_fn, settings: dict = None) -> list:
+    """Розпізнає слова лише в областях тексту, склавши їх в один атлас для одного проходу OCR"""
+    settings = settings or profile_for()
+    if np is None or not settings.get("enabled", True):
+        return recognize_fn(img)
+
+    prepared, regions = prepare(img, settings)
+    if regions is None:
+        return recognize_fn(prepared)
+    if not regions:
+        return []
+
+    covered = sum(r[2] * r[3] for r in regions)
+    if covered >= settings.get("max_coverage", 0.6) * img.width * img.height:
+        return recognize_fn(prepared)
+
+    placements, size = pack_regions(regions, OCR_TILE_SIZE)
+    atlas = Image.new("L", size, 255)
+    for (left, top, width, height), position in placements:
+        atlas.paste(prepared.crop((left, top, left + width, top + height)), position)
+
+    words = []
+    for text, x, y, width, height, conf, line in recognize_fn(atlas):
+        center_x, center_y = x + width / 2, y + height / 2
+        for number, ((left, top, region_width, region_height), (ax, ay)) in enumerate(placements):
+            if ax <= center_x < ax + region_width and ay <= center_y < ay + region_height:
+                words.append((text, x - ax + left, y - ay + top, width, height, conf,
+                              (number,) + tuple(line)))
+                break
+    return words
@@ -1,38 +1,281 @@
+import itertools
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
 from PIL import Image
-import pytesseract
-from config import TESSERACT_PATH
+import ocr_engine
+import ocr_preprocess
+import tracing
+from screenshot import load_image
+from config import (OCR_MIN_CONFIDENCE, OCR_FUZZY_CUTOFF, OCR_INDEX_CACHE_SIZE,
+                    OCR_PREFETCH_WORKERS, OCR_REGION_PADDING, OCR_ELEMENT_GAP, OCR_ELEMENT_LIMIT)
 
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+_region_ids = itertools.count(1)
 
 
-def find_text_on_screen(screenshot_path: str, search_text: str) -> dict:
-    try:
-        img = Image.open(screenshot_path)
-        data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-
-        for i, text in enumerate(data['text']):
-            if text.strip() and search_text.lower() in text.lower():
-                x = data['left'][i]
-                y = data['top'][i]
-                w = data['width'][i]
-                h = data['height'][i]
-
-                center_x = x + w // 2
-                center_y = y + h // 2
-
-                print(f"✅ OCR: '{search_text}' на ({center_x}, {center_y})")
-
-                return {
-                    "x": center_x,
-                    "y": center_y,
-                    "width": w,
-                    "height": h,
-                    "radius": max(w, h) // 2 + 10
-                }
-
-        print(f"❌ OCR: '{search_text}' не знайдено")
+@dataclass
+class OcrWord:
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+    conf: float
+    line: tuple
+
+
+@dataclass
+class OcrElement:
+    """Текстовий елемент екрану (слова рядка без великих проміжків) з номером для моделі"""
+    id: int
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def coordinates(self) -> dict:
+        return to_coordinates(self.left, self.top, self.width, self.height)
+
+    def describe(self) -> str:
+        return f"[{self.id}] {self.text} @{self.left},{self.top},{self.width}x{self.height}"
+
+
+def normalize_text(text: str) -> str:
+    """Нормалізує текст для порівняння: нижній регістр, без пунктуації"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def to_coordinates(left: int, top: int, width: int, height: int) -> dict:
+    """Перетворює рамку на словник координат для підсвічування"""
+    return {
+        "x": left + width // 2,
+        "y": top + height // 2,
+        "width": width,
+        "height": height,
+        "radius": max(width, height) // 2 + 10
+    }
+
+
+def recognize_words(img: Image.Image, left: int = 0, top: int = 0, line_prefix: tuple = (),
+                    settings: dict = None) -> list:
+    """Розпізнає слова зображення; координати зсуваються на (left, top)"""
+    return [
+        OcrWord(text=text.strip(), left=x + left, top=y + top, width=width, height=height,
+                conf=conf, line=line_prefix + line)
+        for text, x, y, width, height, conf, line in ocr_preprocess.recognize(
+            img, ocr_engine.recognize, settings)
+        if conf >= OCR_MIN_CONFIDENCE
+    ]
+
+
+def _intersects(word: OcrWord, region: tuple) -> bool:
+    left, top, width, height = region
+    return (word.left < left + width and left < word.left + word.width
+            and word.top < top + height and top < word.top + word.height)
+
+
+class OcrIndex:
+    """Індекс слів і рядків одного скріншоту"""
+
+    def __init__(self, words: list):
+        self.words = words
+        self.lines = OrderedDict()
+        for word in sorted(words, key=lambda w: (w.line, w.left)):
+            self.lines.setdefault(word.line, []).append(word)
+        self._normalized = {key: [normalize_text(w.text) for w in line]
+                            for key, line in self.lines.items()}
+        self._elements = None
+
+    @classmethod
+    def from_image(cls, img: Image.Image, settings: dict = None) -> "OcrIndex":
+        return cls(recognize_words(img, settings=settings))
+
+    def replace_regions(self, img: Image.Image, regions: list, settings: dict = None) -> "OcrIndex":
+        """Повертає новий індекс, де слова в regions (left, top, width, height) розпізнані заново"""
+        words = [w for w in self.words if not any(_intersects(w, r) for r in regions)]
+
+        for left, top, width, height in regions:
+            pad = OCR_REGION_PADDING
+            crop_left, crop_top = max(0, left - pad), max(0, top - pad)
+            crop = img.crop((crop_left, crop_top,
+                             min(img.width, left + width + pad), min(img.height, top + height + pad)))
+
+            for word in recognize_words(crop, crop_left, crop_top, (-next(_region_ids),), settings):
+                if _intersects(word, (left, top, width, height)):
+                    words.append(word)
+        return OcrIndex(words)
+
+    def elements(self, limit: int = OCR_ELEMENT_LIMIT) -> list:
+        """Ділить рядки на елементи за проміжками між словами, нумерує в порядку читання"""
+        if self._elements is None:
+            groups = []
+            for line in self.lines.values():
+                group = [line[0]]
+                for word in line[1:]:
+                    previous = group[-1]
+                    gap = word.left - (previous.left + previous.width)
+                    if gap > OCR_ELEMENT_GAP * max(previous.height, word.height):
+                        groups.append(group)
+                        group = [word]
+                    else:
+                        group.append(word)
+                groups.append(group)
+
+            boxes = []
+            for group in groups:
+                left = min(w.left for w in group)
+                top = min(w.top for w in group)
+                right = max(w.left + w.width for w in group)
+                bottom = max(w.top + w.height for w in group)
+                boxes.append((top, left, " ".join(w.text for w in group), right - left, bottom - top))
+            boxes.sort()
+            self._elements = [OcrElement(number, text, left, top, width, height)
+                              for number, (top, left, text, width, height) in enumerate(boxes, 1)]
+        return self._elements[:limit] if limit else self._elements
+
+    def element(self, element_id: int) -> OcrElement:
+        elements = self.elements(limit=None)
+        if 1 <= element_id <= len(elements):
+            return elements[element_id - 1]
         return None
 
+    def element_map(self, limit: int = OCR_ELEMENT_LIMIT) -> str:
+        """Компактний список елементів для моделі: '[id] текст @left,top,wxh' по рядку"""
+        return "\n".join(element.describe() for element in self.elements(limit))
+
+    def search(self, search_text: str, limit: int = 5) -> list:
+        """Повертає до limit кандидатів [(score, coordinates)], найкращі першими"""
+        query = normalize_text(search_text)
+        if not query:
+            return []
+        size = len(query.split())
+
+        candidates = []
+        for key, line in self.lines.items():
+            normalized = self._normalized[key]
+            for start in range(max(len(line) - size + 1, 0)):
+                window = line[start:start + size]
+                text = " ".join(normalized[start:start + size])
+                score = self._score(query, text)
+                if score is None:
+                    continue
+                conf = sum(w.conf for w in window) / len(window)
+                candidates.append((score, conf, window))
+
+        candidates.sort(key=lambda c: (c[0], c[1]), reverse=True)
+        return [(score, self._window_coordinates(window))
+                for score, _, window in candidates[:limit]]
+
+    def find(self, search_text: str) -> dict:
+        """Повертає координати найкращого збігу або None"""
+        matches = self.search(search_text, limit=1)
+        return matches[0][1] if matches else None
+
+    @staticmethod
+    def _score(query: str, text: str):
+        if not text:
+            return None
+        if query == text:
+            return 1.0
+        if query in text:
+            return 0.9
+
+        matcher = SequenceMatcher(None, query, text)
+        if matcher.real_quick_ratio() < OCR_FUZZY_CUTOFF or matcher.quick_ratio() < OCR_FUZZY_CUTOFF:
+            return None
+        ratio = matcher.ratio()
+        return ratio * 0.85 if ratio >= OCR_FUZZY_CUTOFF else None
+
+    @staticmethod
+    def _window_coordinates(window: list) -> dict:
+        left = min(w.left for w in window)
+        top = min(w.top for w in window)
+        right = max(w.left + w.width for w in window)
+        bottom = max(w.top + w.height for w in window)
+        return to_coordinates(left, top, right - left, bottom - top)
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_PREFETCH_WORKERS, thread_name_prefix="ocr")
+
+
+def _build_index(screenshot, settings: dict) -> OcrIndex:
+    with tracing.span("ocr_index") as item:
+        index = OcrIndex.from_image(load_image(screenshot), settings)
+        item.attrs["words"] = len(index.words)
+        return index
+
+
+def _index_key(screenshot) -> tuple:
+    """(ключ кешу, налаштування): той самий кадр з іншим профілем програми - інший індекс"""
+    settings = ocr_preprocess.profile_for(screenshot)
+    digest = getattr(screenshot, "digest", None) or str(screenshot)
+    return (digest, tuple(sorted(settings.items()))), settings
+
+
+def prefetch_ocr_index(screenshot) -> Future:
+    """Запускає OCR скріншоту у фоні, повертає Future з індексом"""
+    key, settings = _index_key(screenshot)
+    with _index_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+        future = _ocr_executor.submit(tracing.run_in_context(_build_index), screenshot, settings)
+        _index_cache[key] = future
+        while len(_index_cache) > OCR_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+
+    future.add_done_callback(lambda f: _forget_failed(key, f))
+    return future
+
+
+def _forget_failed(key: tuple, future: Future):
+    if future.exception() is None:
+        return
+    with _index_lock:
+        if _index_cache.get(key) is future:
+            del _index_cache[key]
+
+
+def get_ocr_index(screenshot) -> OcrIndex:
+    """Повертає OCR індекс скріншоту, будує його лише один раз"""
+    return prefetch_ocr_index(screenshot).result()
+
+
+def update_ocr_index(previous, screenshot, regions: list) -> OcrIndex:
+    """Будує індекс нового кадру з індексу попереднього, розпізнаючи лише змінені області"""
+    key, settings = _index_key(screenshot)
+    with tracing.span("ocr_update", regions=len(regions)):
+        index = get_ocr_index(previous).replace_regions(load_image(screenshot), regions, settings)
+
+    future = Future()
+    future.set_result(index)
+    with _index_lock:
+        _index_cache[key] = future
+        while len(_index_cache) > OCR_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def find_text_on_screen(screenshot, search_text: str) -> dict:
+    try:
+        with tracing.span("ocr_find"):
+            coordinates = get_ocr_index(screenshot).find(search_text)
+
+        if coordinates:
+            print(f"✅ OCR: '{search_text}' на ({coordinates['x']}, {coordinates['y']})")
+        else:
+            print(f"❌ OCR: '{search_text}' не знайдено")
+        return coordinates
+
     except Exception as e:
         print(f"❌ OCR помилка: {e}")
-        return None
\ No newline at end of file
+        return None
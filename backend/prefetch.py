@@ -0,0 +1,104 @@
+import threading
+import time
+
+import tracing
+from config import (PREFETCH_INSTRUCTIONS, PREFETCH_MAX_TOKENS, PREFETCH_MAX_TOKENS_JSON,
+                    PREFETCH_MIN_INTERVAL, RESPONSE_FORMAT)
+from tasks import Task, TaskScheduler, UiQueue
+
+
+class InstructionPrefetcher:
+    """Спекулятивно генерує інструкції для всіх запропонованих дій одним потоковим запитом"""
+
+    def __init__(self, tasks: TaskScheduler, ui: UiQueue, enabled: bool = PREFETCH_INSTRUCTIONS,
+                 max_tokens: int = None, min_interval: float = PREFETCH_MIN_INTERVAL):
+        self.tasks = tasks
+        self.ui = ui
+        self.enabled = enabled
+        self.max_tokens = max_tokens or (PREFETCH_MAX_TOKENS_JSON if RESPONSE_FORMAT == "json"
+                                         else PREFETCH_MAX_TOKENS)
+        self.min_interval = min_interval
+        self._steps = {}
+        self._complete = set()
+        self._streaming = None
+        self._follow = None
+        self._last_start = None
+        self._lock = threading.Lock()
+
+    def start(self, program_name: str, current_location: str, actions: list, frame):
+        """Починає спекуляцію для нового кадру (не частіше за min_interval)"""
+        self.discard()
+        if not self.enabled or not actions or frame is None:
+            return
+        now = time.monotonic()
+        if self._last_start is not None and now - self._last_start < self.min_interval:
+            return
+        self._last_start = now
+        self.tasks.submit("prefetch", self._run, program_name, current_location, list(actions), frame)
+
+    def take(self, action: str, task: Task, on_step, on_done, on_missing):
+        """Повертає (кроки, завершено) для дії або None; незавершені кроки дійдуть через on_step"""
+        with self._lock:
+            if action in self._complete:
+                return [dict(step) for step in self._steps.get(action, [])], True
+            if action == self._streaming:
+                self._follow = (action, task, on_step, on_done, on_missing)
+                return [dict(step) for step in self._steps.get(action, [])], False
+        return None
+
+    def cancel(self):
+        """Перериває спекулятивний запит (справжній клік має пріоритет)"""
+        self.tasks.cancel("prefetch")
+        with self._lock:
+            self._streaming = None
+            self._follow = None
+
+    def discard(self):
+        """Скасовує запит і забуває результати попереднього кадру"""
+        self.cancel()
+        with self._lock:
+            self._steps = {}
+            self._complete = set()
+
+    def _run(self, task: Task, program_name: str, current_location: str, actions: list, frame):
+        from service import get_service
+
+        try:
+            with tracing.trace("prefetch"):
+                for action, step in get_service().prefetch_instructions(
+                        frame, program_name, current_location, actions,
+                        should_stop=lambda: task.cancelled, max_tokens=self.max_tokens):
+                    self._accept(task, action, step)
+        except Exception as e:
+            print(f"⚠️ Попередня генерація інструкцій: {e}")
+
+        with self._lock:
+            if task.cancelled:
+                return
+            follow, self._follow, self._streaming = self._follow, None, None
+            complete = len(self._complete)
+        if follow:
+            _, follow_task, _, _, on_missing = follow
+            self.ui.post_for(follow_task, on_missing)
+        print(f"⚡ Інструкції заздалегідь: {complete}/{len(actions)} дій")
+
+    def _accept(self, task: Task, action: str, step):
+        with self._lock:
+            if task.cancelled:
+                return
+            follow = self._follow if self._follow and self._follow[0] == action else None
+            if step is None:
+                self._complete.add(action)
+                self._streaming = None
+                if follow:
+                    self._follow = None
+            else:
+                self._steps.setdefault(action, []).append(step)
+                self._streaming = action
+
+        if follow:
+            _, follow_task, on_step, on_done, _ = follow
+            if step is None:
+                self.ui.post_for(follow_task, on_done)
+            else:
+                self.ui.post_for(follow_task, on_step, dict(step))
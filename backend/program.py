@@ -1,15 +1,11 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
-import threading
-import mss
-from PIL import Image
-import os
 
-from config import UI_THEME
-from screenshot import capture_screen, get_screenshot_dimensions
-from ai_client import define_program as ai_define_program, generate_instructions as ai_generate_instructions
-
-os.makedirs("./screenshots", exist_ok=True)
+import tracing
+import warmup
+from config import UI_THEME, TRACE_STATUS_BREAKDOWN
+from tasks import Task, TaskScheduler, UiQueue
+from prefetch import InstructionPrefetcher
 
 class AIAssistantOverlay:
     def __init__(self, root):
@@ -24,15 +20,37 @@ class AIAssistantOverlay:
         self.current_program = None
         self.current_location = None
         self.available_actions = []
+        self.last_action = None
         self.last_screenshot = None
         self.current_instructions = []
         self.highlight_window = None
+        self.highlight_canvas = None
+        self.highlight_oval = None
+        self.highlight_geometry = None
+        self.highlight_visible = False
+        self.hovered_line = None
+        self.coordinate_transform = None
+        self.watch_masks = ()
         self.expanded = False
 
+        self.tasks = TaskScheduler()
+        self.ui = UiQueue(self.root)
+        self.prefetch = InstructionPrefetcher(self.tasks, self.ui)
+        self.watcher = None
+
         self.main_frame = tk.Frame(self.root, bg=UI_THEME["bg_primary"])
         self.main_frame.pack(fill=tk.BOTH, expand=True)
 
         self.setup_ui()
+        self.root.bind("<Configure>", lambda event: self.update_watch_masks(), add="+")
+        tracing.start_metrics_server()
+        self.root.after_idle(warmup.start)
+
+    @property
+    def service(self):
+        """Сервіс аналізу: спільний демон або аналіз у цьому процесі"""
+        from service import get_service
+        return get_service()
 
     def setup_ui(self):
         """Ініціалізує UI компоненти"""
@@ -62,6 +80,14 @@ class AIAssistantOverlay:
                                     cursor="hand2", width=3)
         self.expand_btn.pack(side=tk.LEFT, padx=2)
 
+        self.watch_btn = tk.Button(btn_frame, text="👁",
+                                   command=self.toggle_watch,
+                                   bg=UI_THEME["bg_tertiary"], fg=UI_THEME["text_primary"],
+                                   font=('Helvetica', 9),
+                                   padx=5, pady=2, relief=tk.FLAT,
+                                   cursor="hand2", width=3)
+        self.watch_btn.pack(side=tk.LEFT, padx=2)
+
         self.status_label = tk.Label(self.main_frame, text="Ready",
                                      bg=UI_THEME["bg_primary"], 
                                      fg=UI_THEME["text_primary"], 
@@ -166,48 +192,145 @@ class AIAssistantOverlay:
         self.instructions_text.bind("<Motion>", self.on_instruction_hover)
         self.instructions_text.bind("<Leave>", self.on_instruction_leave)
 
-        copy_btn = tk.Button(self.expanded_frame, text="📋 Copy",
+        buttons_frame = tk.Frame(self.expanded_frame, bg=UI_THEME["bg_tertiary"])
+        buttons_frame.pack(pady=3)
+
+        copy_btn = tk.Button(buttons_frame, text="📋 Copy",
                             command=self.copy_instructions,
                             bg=UI_THEME["accent"], fg="#0F2029", 
                             font=('Helvetica', 8),
                             relief=tk.FLAT, cursor="hand2")
-        copy_btn.pack(pady=3)
+        copy_btn.pack(side=tk.LEFT, padx=3)
+
+        refresh_btn = tk.Button(buttons_frame, text="🔄 Refresh",
+                                command=self.refresh_instructions,
+                                bg=UI_THEME["bg_secondary"], fg=UI_THEME["text_primary"],
+                                font=('Helvetica', 8),
+                                relief=tk.FLAT, cursor="hand2")
+        refresh_btn.pack(side=tk.LEFT, padx=3)
 
     def take_screenshot_threaded(self):
-        """Захоплює екран в окремому потоці"""
-        thread = threading.Thread(target=self.take_screenshot, daemon=True)
-        thread.start()
+        """Захоплює екран у фоновому завданні"""
+        self.tasks.cancel("instructions")
+        self.prefetch.discard()
+        self.tasks.submit("screenshot", self.take_screenshot)
 
-    def take_screenshot(self):
+    def take_screenshot(self, task):
         """Захоплює екран та аналізує його"""
         try:
-            self.status_label.config(text="📸 Capturing...")
-            self.root.update()
-
-            self.last_screenshot = capture_screen()
-            self.status_label.config(text="🔄 Analyzing...")
-            self.root.update()
+            self.ui.post_for(task, self.set_status, "📸 Capturing...")
 
-            program_info = ai_define_program(self.last_screenshot)
+            with tracing.trace("screenshot"):
+                frame = self.service.capture()
+                self.analyze_frame(task, frame)
 
-            if program_info:
-                self.current_program = program_info.get("Name", "Unknown")
-                self.current_location = program_info.get("Location", "Unknown")
-                self.available_actions = program_info.get("Actions", [])
-
-                self.status_label.config(text="✅ Done")
+        except Exception as e:
+            self.ui.post_for(task, self.show_error, "❌ Error", f"Screenshot error: {str(e)}")
 
-                if self.expanded:
-                    self.show_expanded_content()
-                else:
-                    self.toggle_expand()
-            else:
-                self.status_label.config(text="❌ Failed")
-                messagebox.showerror("Error", "Could not analyze screenshot")
+    def analyze_frame(self, task, frame):
+        """Запускає OCR кадру у фоні та визначає програму"""
+        try:
+            service = self.service
+            identity = service.identify(frame)
+            # Назву попередньої програми не беремо: профіль OCR нового вікна був би чужим
+            frame.program = (identity and identity["Name"]) or frame.program
+            with tracing.trace("screenshot") as trace:
+                service.prefetch(frame)
+                self.ui.post_for(task, self.set_status,
+                                 f"🔄 {identity['Name']}..." if identity else "🔄 Analyzing...")
+
+                program_info = service.define_program(frame)
+                if program_info and program_info.get("Name"):
+                    frame.program = program_info["Name"]
+                stats = service.cache_stats()
+            self.ui.post_for(task, self.show_program_info, frame, program_info, trace, stats)
 
         except Exception as e:
-            self.status_label.config(text="❌ Error")
-            messagebox.showerror("Error", f"Screenshot error: {str(e)}")
+            self.ui.post_for(task, self.show_error, "❌ Error", f"Screenshot error: {str(e)}")
+
+    def show_program_info(self, frame, program_info, trace=None, stats=None):
+        """Відображає результат аналізу скріншоту"""
+        with tracing.span("render", parent=trace):
+            self.render_program_info(frame, program_info, stats)
+        if program_info and TRACE_STATUS_BREAKDOWN and trace:
+            self.set_status(f"✅ {trace.breakdown_text()}")
+
+    def render_program_info(self, frame, program_info, stats=None):
+        self.last_screenshot = frame
+        self.update_coordinate_mapping(frame)
+        if self.watcher and self.watcher.running:
+            self.watcher.reset(frame)
+
+        if program_info:
+            self.current_program = program_info.get("Name", "Unknown")
+            self.current_location = program_info.get("Location", "Unknown")
+            self.available_actions = program_info.get("Actions", [])
+
+            self.set_status(f"✅ Done · {stats}" if stats else "✅ Done")
+
+            if self.expanded:
+                self.show_expanded_content()
+            else:
+                self.toggle_expand()
+            self.prefetch.start(self.current_program, self.current_location,
+                                self.available_actions, frame)
+        else:
+            self.show_error("❌ Failed", "Could not analyze screenshot")
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    def show_error(self, status, message):
+        self.set_status(status)
+        messagebox.showerror("Error", message)
+
+    def toggle_watch(self):
+        """Вмикає/вимикає стеження за змінами екрану"""
+        if self.watcher and self.watcher.running:
+            self.watcher.stop()
+            self.watch_btn.config(bg=UI_THEME["bg_tertiary"])
+            self.set_status("👁 Watch off")
+        elif self.last_screenshot:
+            if self.watcher is None:
+                from watcher import ScreenWatcher
+                self.watcher = ScreenWatcher(on_update=self.on_screen_changed,
+                                             on_redefine=self.on_screen_redefined,
+                                             should_watch=lambda: bool(self.current_instructions),
+                                             masks=lambda: self.watch_masks)
+            self.update_watch_masks()
+            self.watcher.start(self.last_screenshot)
+            self.watch_btn.config(bg=UI_THEME["accent"])
+            self.set_status("👁 Watching...")
+        else:
+            self.set_status("📸 Take a screenshot first")
+
+    def on_screen_changed(self, frame):
+        """Оновлює координати кроків після часткової зміни екрану (потік спостереження)"""
+        steps = list(self.current_instructions)
+        coordinates = self.service.locate_steps(frame, steps)
+        self.ui.post(self.apply_step_coordinates, frame, steps, coordinates)
+
+    def on_screen_redefined(self, frame):
+        """Аналізує екран заново, коли змінилась більша його частина"""
+        self.prefetch.discard()
+        self.tasks.submit("screenshot", self.analyze_frame, frame)
+
+    def apply_step_coordinates(self, frame, steps, coordinates):
+        if len(steps) != len(self.current_instructions) or any(
+                a is not b for a, b in zip(steps, self.current_instructions)):
+            return
+
+        self.last_screenshot = frame
+        self.update_coordinate_mapping(frame)
+        for step_data, coords in zip(steps, coordinates):
+            step_data["coordinates"] = coords
+            step_data["screen_coordinates"] = self.scale_coordinates(coords)
+
+        hovered = self.hovered_line
+        if hovered is not None and hovered < len(steps) and steps[hovered].get("screen_coordinates"):
+            self.show_highlight(steps[hovered]["screen_coordinates"])
+        else:
+            self.hide_highlight()
 
     def on_action_selected(self, event):
         """Обробляє вибір дії зі списку"""
@@ -224,45 +347,95 @@ class AIAssistantOverlay:
             self.custom_action_entry.delete(0, tk.END)
 
     def generate_instructions_threaded(self, action):
-        """Генерує інструкції в окремому потоці"""
-        thread = threading.Thread(
-            target=self.generate_instructions, 
-            args=(action, self.last_screenshot), 
-            daemon=True
-        )
-        thread.start()
-
-    def generate_instructions(self, action, screenshot_path=None):
-        """Генерує покрокові інструкції"""
+        """Показує заздалегідь згенеровані інструкції або запитує їх, перериваючи спекуляцію"""
+        self.last_action = action
+        self.tasks.cancel("instructions")
+        task = Task(self.tasks, "instructions", self.tasks.generation("instructions"))
+        prefetched = self.prefetch.take(action, task, self.append_instruction,
+                                        self.finish_instructions,
+                                        lambda: self.request_instructions(action))
+        if prefetched is None:
+            self.prefetch.cancel()
+            self.request_instructions(action)
+            return
+
+        steps, complete = prefetched
+        self.show_instructions_message("⏳ Generating...")
+        for step_data in steps:
+            self.append_instruction(step_data)
+        if complete:
+            self.finish_instructions()
+        self.set_status("⚡ Prefetched")
+
+    def refresh_instructions(self):
+        """Запитує інструкції для останньої дії у моделі, оминаючи базу знань"""
+        if self.last_action:
+            self.prefetch.cancel()
+            self.request_instructions(self.last_action, refresh=True)
+
+    def request_instructions(self, action, refresh=False):
+        """Генерує інструкції у фоновому завданні, скасовуючи попередній запит"""
+        self.show_instructions_message("⏳ Generating...")
+        self.tasks.submit("instructions", self.generate_instructions, action,
+                          self.current_program, self.current_location, self.last_screenshot, refresh)
+
+    def generate_instructions(self, task, action, program_name, current_location, screenshot=None,
+                              refresh=False):
+        """Генерує покрокові інструкції (з бази знань, якщо дія вже відома)"""
         try:
-            self.instructions_text.config(state=tk.NORMAL)
-            self.instructions_text.delete(1.0, tk.END)
-            self.instructions_text.insert(tk.END, "⏳ Generating...")
-            self.instructions_text.config(state=tk.DISABLED)
-            self.root.update()
+            result = {}
+            with tracing.trace("instructions") as trace:
+                steps = self.service.instructions(screenshot, program_name, current_location, action,
+                                                  refresh=refresh, should_stop=lambda: task.cancelled,
+                                                  result=result)
+                for step_data in steps:
+                    task.check()
+                    self.ui.post_for(task, self.append_instruction, step_data, trace)
+
+            self.ui.post_for(task, self.finish_instructions, trace)
+            if result.get("recalled"):
+                self.ui.post_for(task, self.set_status, "📚 From knowledge base")
+
+        except Exception as e:
+            self.ui.post_for(task, self.show_instructions_message, f"Error: {str(e)}")
 
-            instructions_with_coords = ai_generate_instructions(
-                program_name=self.current_program,
-                current_location=self.current_location,
-                action=action,
-                screenshot_path=screenshot_path
-            )
+    def show_instructions_message(self, message):
+        """Замінює інструкції повідомленням"""
+        self.current_instructions = []
+        self.hovered_line = None
+        self.hide_highlight()
+        self.instructions_text.config(state=tk.NORMAL)
+        self.instructions_text.delete(1.0, tk.END)
+        self.instructions_text.insert(tk.END, message)
+        self.instructions_text.config(state=tk.DISABLED)
 
-            self.current_instructions = instructions_with_coords
+    def clear_instructions(self):
+        """Очищає поле інструкцій"""
+        self.instructions_text.config(state=tk.NORMAL)
+        self.instructions_text.delete(1.0, tk.END)
+        self.instructions_text.config(state=tk.DISABLED)
 
-            self.instructions_text.config(state=tk.NORMAL)
-            self.instructions_text.delete(1.0, tk.END)
+    def append_instruction(self, step_data, trace=None):
+        """Додає крок інструкції, щойно він надійшов"""
+        with tracing.span("render", parent=trace):
+            self.render_instruction(step_data)
 
-            for step_data in instructions_with_coords:
-                self.instructions_text.insert(tk.END, f"{step_data['action']}\n")
+    def render_instruction(self, step_data):
+        if not self.current_instructions:
+            self.clear_instructions()
+        step_data["screen_coordinates"] = self.scale_coordinates(step_data.get("coordinates"))
+        self.current_instructions.append(step_data)
+        self.hovered_line = None
 
-            self.instructions_text.config(state=tk.DISABLED)
+        self.instructions_text.config(state=tk.NORMAL)
+        self.instructions_text.insert(tk.END, f"{step_data['action']}\n")
+        self.instructions_text.config(state=tk.DISABLED)
 
-        except Exception as e:
-            self.instructions_text.config(state=tk.NORMAL)
-            self.instructions_text.delete(1.0, tk.END)
-            self.instructions_text.insert(tk.END, f"Error: {str(e)}")
-            self.instructions_text.config(state=tk.DISABLED)
+    def finish_instructions(self, trace=None):
+        if not self.current_instructions:
+            self.clear_instructions()
+        elif TRACE_STATUS_BREAKDOWN and trace:
+            self.set_status(f"📋 {trace.breakdown_text()}")
 
     def copy_instructions(self):
         """Копіює інструкції в буфер обміну"""
@@ -280,13 +453,15 @@ class AIAssistantOverlay:
             index = self.instructions_text.index(f"@{event.x},{event.y}")
             line_num = int(index.split('.')[0]) - 1
 
+            if line_num == self.hovered_line:
+                return
+            self.hovered_line = line_num
+
             if line_num < len(self.current_instructions):
-                step_data = self.current_instructions[line_num]
-                coords = step_data.get("coordinates")
+                coords = self.current_instructions[line_num].get("screen_coordinates")
 
-                if coords and coords.get("x") is not None and coords.get("y") is not None:
-                    scaled_coords = self.scale_coordinates(coords)
-                    self.show_highlight(scaled_coords)
+                if coords:
+                    self.show_highlight(coords)
                 else:
                     self.hide_highlight()
             else:
@@ -296,75 +471,108 @@ class AIAssistantOverlay:
 
     def on_instruction_leave(self, event):
         """Приховує підсвічування при виході миші"""
+        self.hovered_line = None
         self.hide_highlight()
 
+    def update_coordinate_mapping(self, frame):
+        """Рахує перетворення кадр -> координати Tk один раз на скріншот"""
+        from screenshot import Transform
+        scale_x = scale_y = 1.0
+        if frame.primary_size:
+            scale_x = self.root.winfo_screenwidth() / frame.primary_size[0]
+            scale_y = self.root.winfo_screenheight() / frame.primary_size[1]
+
+        self.coordinate_transform = frame.transform.then(
+            Transform(scale_x=scale_x, scale_y=scale_y)
+        )
+        self.update_watch_masks()
+
+    def update_watch_masks(self):
+        """Запам'ятовує області оверлею та підсвічування в пікселях екрану, щоб спостерігач їх ігнорував"""
+        scale_x = scale_y = 1.0
+        if self.coordinate_transform:
+            scale_x, scale_y = self.coordinate_transform.scale_x, self.coordinate_transform.scale_y
+
+        windows = [self.root]
+        if self.highlight_window and self.highlight_visible:
+            windows.append(self.highlight_window)
+        masks = []
+        for window in windows:
+            try:
+                left, top = window.winfo_rootx(), window.winfo_rooty()
+                width, height = window.winfo_width(), window.winfo_height()
+            except tk.TclError:
+                continue
+            masks.append((int(left / scale_x), int(top / scale_y),
+                          int(width / scale_x) + 1, int(height / scale_y) + 1))
+        self.watch_masks = tuple(masks)
+
     def scale_coordinates(self, coords):
         """Масштабує координати з розміру скріншоту на монітор"""
         try:
-            if self.last_screenshot and os.path.exists(self.last_screenshot):
-                img = Image.open(self.last_screenshot)
-                screenshot_width, screenshot_height = img.size
-
-                with mss.mss() as sct:
-                    monitor = sct.monitors[1]
-                    monitor_width = monitor['width']
-                    monitor_height = monitor['height']
-
-                scaled = {
-                    "x": int(coords.get("x", 0)),
-                    "y": int(coords.get("y", 0)),
-                    "radius": int(coords.get("radius", 40) * 1.5)
-                }
+            if not coords or coords.get("x") is None or coords.get("y") is None:
+                return None
 
-                print(f"📍 Координати: x={scaled['x']}, y={scaled['y']}, radius={scaled['radius']}")
-                return scaled
-
-            return coords
+            scaled = self.coordinate_transform.map_coordinates(coords)
+            scaled["radius"] = int(scaled.get("radius", 40) * 1.5)
+            return scaled
 
         except Exception as e:
             print(f"❌ Помилка масштабування: {e}")
             return coords
 
+    def create_highlight_window(self):
+        """Створює вікно підсвічування один раз, далі воно лише переміщується"""
+        highlight = tk.Toplevel(self.root)
+        highlight.withdraw()
+        highlight.attributes('-topmost', True)
+        highlight.attributes('-alpha', 0.6)
+        highlight.overrideredirect(True)
+
+        self.highlight_canvas = tk.Canvas(highlight, bg=UI_THEME["accent"], highlightthickness=0)
+        self.highlight_canvas.pack(fill=tk.BOTH, expand=True)
+
+        self.highlight_oval = self.highlight_canvas.create_oval(
+            5, 5, 5, 5,
+            outline=UI_THEME["accent"],
+            width=4,
+            fill=''
+        )
+
+        self.highlight_window = highlight
+
     def show_highlight(self, coords):
         """Показує круглий оверлей на координатах"""
         try:
-            if self.highlight_window:
-                self.highlight_window.destroy()
+            if not self.highlight_window:
+                self.create_highlight_window()
 
             x = coords.get("x", 0)
             y = coords.get("y", 0)
             radius = coords.get("radius", 40)
 
-            print(f"🎯 Highlight: x={x}, y={y}, radius={radius}")
-
-            highlight = tk.Toplevel(self.root)
-            highlight.attributes('-topmost', True)
-            highlight.attributes('-alpha', 0.6)
-            highlight.overrideredirect(True)
-
-            size = radius * 2 + 20
-            highlight.geometry(f"{int(size)}x{int(size)}+{int(x - radius - 10)}+{int(y - radius - 10)}")
-
-            canvas = tk.Canvas(highlight, bg=UI_THEME["accent"], highlightthickness=0)
-            canvas.pack(fill=tk.BOTH, expand=True)
+            size = int(radius * 2 + 20)
+            geometry = f"{size}x{size}+{int(x - radius - 10)}+{int(y - radius - 10)}"
 
-            canvas.create_oval(
-                5, 5,
-                size - 5, size - 5,
-                outline=UI_THEME["accent"],
-                width=4,
-                fill=''
-            )
+            if geometry != self.highlight_geometry:
+                self.highlight_window.geometry(geometry)
+                self.highlight_canvas.coords(self.highlight_oval, 5, 5, size - 5, size - 5)
+                self.highlight_geometry = geometry
 
-            self.highlight_window = highlight
+            if not self.highlight_visible:
+                self.highlight_window.deiconify()
+                self.highlight_visible = True
+            self.highlight_window.update_idletasks()
+            self.update_watch_masks()
 
         except Exception as e:
             print(f"❌ Помилка при відображенні: {e}")
 
     def hide_highlight(self):
-        if self.highlight_window:
+        if self.highlight_window and self.highlight_visible:
             try:
-                self.highlight_window.destroy()
-                self.highlight_window = None
+                self.highlight_window.withdraw()
+                self.highlight_visible = False
+                self.update_watch_masks()
             except:
-                pass
\ No newline at end of file
+                pass
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from config import (CACHE_DIR, PHASH_SIZE, PHASH_THRESHOLD, PROGRAM_CACHE_SIZE,
+                    PROGRAM_CACHE_DISK_ENTRIES, PROGRAM_CACHE_MAX_AGE)
+
+
+def perceptual_hash(img: Image.Image, size: int = PHASH_SIZE) -> int:
+    """Рахує difference hash + average hash зображення (2 * size * size біт)"""
+    pixels = np.asarray(img.convert("L").resize((size + 1, size), Image.BOX))
+    bits = np.concatenate([(pixels[:, :-1] > pixels[:, 1:]).ravel(),
+                           (pixels[:, :-1] > pixels.mean()).ravel()])
+    # packbits доповнює біти нулями до цілого байта; зсув прибирає доповнення
+    return int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-len(bits) % 8)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ProgramCache:
+    """LRU кеш результатів define_program за перцептивним хешем з копією на диску"""
+
+    def __init__(self, path, memory_size: int = PROGRAM_CACHE_SIZE,
+                 disk_entries: int = PROGRAM_CACHE_DISK_ENTRIES,
+                 max_age: float = PROGRAM_CACHE_MAX_AGE, threshold: int = PHASH_THRESHOLD):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_entries = disk_entries
+        self.max_age = max_age
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.last_hit = False
+        self._memory = OrderedDict()
+        self._disk = None
+        self._lock = threading.Lock()
+
+    def lookup(self, phash: int):
+        """Повертає збережений результат для схожого екрану або None"""
+        with self._lock:
+            entry = self._find(self._memory, phash)
+            if entry is None:
+                entry = self._find(self._load_disk(), phash)
+
+            self.last_hit = entry is not None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry["used"] = time.time()
+            self._remember(entry)
+            return dict(entry["result"])
+
+    def store(self, phash: int, result: dict, screenshot: str = None):
+        """Зберігає результат; screenshot - хеш кадру у сховищі скріншотів"""
+        now = time.time()
+        entry = {"hash": format(phash, "x"), "result": result, "created": now, "used": now,
+                 "screenshot": screenshot}
+        with self._lock:
+            self._remember(entry)
+            self._load_disk()[entry["hash"]] = entry
+            self._save_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk = {}
+            self._save_disk()
+
+    def stats_text(self) -> str:
+        total = self.hits + self.misses
+        prefix = "⚡ " if self.last_hit else ""
+        return f"{prefix}cache {self.hits}/{total}"
+
+    def _find(self, entries: dict, phash: int):
+        self._expire(entries)
+        key = format(phash, "x")
+        if key in entries:
+            return entries[key]
+
+        best, best_distance = None, self.threshold + 1
+        for entry in entries.values():
+            distance = hamming_distance(phash, int(entry["hash"], 16))
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        return best
+
+    def _expire(self, entries: dict):
+        """Видаляє записи, старші за max_age (і точні, і схожі збіги)"""
+        now = time.time()
+        for key in [key for key, entry in entries.items() if now - entry["created"] > self.max_age]:
+            del entries[key]
+
+    def _remember(self, entry: dict):
+        self._memory[entry["hash"]] = entry
+        self._memory.move_to_end(entry["hash"])
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _load_disk(self) -> dict:
+        if self._disk is None:
+            self._disk = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for entry in json.load(f):
+                        self._disk[entry["hash"]] = entry
+            except (OSError, ValueError, KeyError):
+                pass
+        return self._disk
+
+    def _save_disk(self):
+        now = time.time()
+        entries = [e for e in self._disk.values() if now - e["created"] <= self.max_age]
+        entries.sort(key=lambda e: e["used"], reverse=True)
+        entries = entries[:self.disk_entries]
+        self._disk = {e["hash"]: e for e in entries}
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"❌ Помилка збереження кешу: {e}")
+
+
+define_program_cache = ProgramCache(CACHE_DIR / "define_program.json")
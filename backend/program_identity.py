@@ -0,0 +1,41 @@
+import re
+
+from config import LOCAL_PROGRAMS
+
+TITLE_SEPARATOR = re.compile(r"\s+[-–—|]\s+")
+
+
+def _title_names(profile: dict) -> set:
+    return {profile["name"].lower(), profile.get("title", profile["name"]).lower()}
+
+
+def _profile(window) -> dict:
+    suffix = TITLE_SEPARATOR.split(window.title or "")[-1].lower()
+    wm_class = (window.wm_class or "").lower()
+    for key, profile in LOCAL_PROGRAMS.items():
+        if key.lower() == wm_class or suffix in _title_names(profile):
+            return profile
+    return None
+
+
+def identify_program(window) -> dict:
+    """Визначає програму та ймовірне розташування за класом і заголовком вікна, або None"""
+    if window is None:
+        return None
+
+    segments = [s for s in TITLE_SEPARATOR.split((window.title or "").strip()) if s]
+    profile = _profile(window)
+    if profile:
+        name = profile["name"]
+        if segments and segments[-1].lower() in _title_names(profile):
+            segments = segments[:-1]
+    elif len(segments) > 1:
+        name = segments.pop()
+    else:
+        return None
+
+    return {
+        "Name": name,
+        "Location": " - ".join(segments) or "Main window",
+        "Actions": list(profile.get("actions", [])) if profile else []
+    }
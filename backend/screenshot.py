@@ -1,31 +1,252 @@
+import base64
+import hashlib
+import io
+import itertools
+import threading
+from dataclasses import dataclass
+from pathlib import Path
 import mss
 from PIL import Image
 from datetime import datetime
-from config import SCREENSHOTS_DIR
+from config import (IMAGE_FORMAT, IMAGE_QUALITY, SAVE_SCREENSHOTS, CAPTURE_MODE,
+                    CAPTURE_MONITOR, LOCAL_IDENTIFY)
+from desktop import active_window, cursor_position
+from screenshot_store import screenshot_store
+import tracing
 
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
 
-def capture_screen(output_filename: str = None) -> str:
+_frame_counter = itertools.count(1)
 
-    if not output_filename:
-        output_filename = datetime.now().strftime("screenshot_%Y%m%d_%H%M%S")
 
-    with mss.mss() as sct:
-        monitor = sct.monitors[1]
-        screenshot = sct.grab(monitor)
-        img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
+@dataclass
+class Transform:
+    """Переводить координати зображення в пікселі екрану: screen = offset + point * scale"""
+    scale_x: float = 1.0
+    scale_y: float = 1.0
+    offset_x: float = 0.0
+    offset_y: float = 0.0
 
-        filepath = SCREENSHOTS_DIR / f"{output_filename}.png"
-        img.save(filepath)
+    def apply(self, x: float, y: float) -> tuple:
+        return (self.offset_x + x * self.scale_x, self.offset_y + y * self.scale_y)
 
-        print(f"✅ Скріншот: {filepath}")
-        return str(filepath)
+    def then(self, other: "Transform") -> "Transform":
+        """Повертає перетворення, що застосовує спочатку self, потім other"""
+        return Transform(
+            scale_x=self.scale_x * other.scale_x,
+            scale_y=self.scale_y * other.scale_y,
+            offset_x=other.offset_x + self.offset_x * other.scale_x,
+            offset_y=other.offset_y + self.offset_y * other.scale_y
+        )
 
+    def map_coordinates(self, coords: dict) -> dict:
+        """Переводить словник координат (x, y, width, height, radius)"""
+        x, y = self.apply(coords.get("x", 0), coords.get("y", 0))
+        scale = max(self.scale_x, self.scale_y)
+        mapped = dict(coords, x=int(round(x)), y=int(round(y)))
+        if "width" in coords:
+            mapped["width"] = int(round(coords["width"] * self.scale_x))
+        if "height" in coords:
+            mapped["height"] = int(round(coords["height"] * self.scale_y))
+        if "radius" in coords:
+            mapped["radius"] = int(round(coords["radius"] * scale))
+        return mapped
 
-def get_screenshot_dimensions(screenshot_path: str) -> tuple:
+
+class Frame:
+    """Кадр екрану в пам'яті: сирий BGRA буфер mss та його метадані"""
+
+    def __init__(self, raw: bytes, size: tuple, left: int = 0, top: int = 0,
+                 name: str = None, image: Image.Image = None):
+        self.raw = raw
+        self.size = tuple(size)
+        self.left = left
+        self.top = top
+        self.name = name or datetime.now().strftime("screenshot_%Y%m%d_%H%M%S")
+        self.key = f"{self.name}_{next(_frame_counter)}"
+        self.path = None
+        self.upload_transform = None
+        self.primary_size = None
+        self.mode = None
+        self.window = None
+        self.program = None
+        self._image = image
+        self._digest = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, img: Image.Image, name: str = None) -> "Frame":
+        img = img.convert("RGB")
+        return cls(None, img.size, name=name, image=img)
+
+    @classmethod
+    def open(cls, path) -> "Frame":
+        """Відкриває скріншот з диску як кадр (ключ кадру - шлях до файлу)"""
+        frame = cls.from_image(Image.open(path), name=Path(path).stem)
+        frame.key = str(path)
+        frame.path = str(path)
+        return frame
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @property
+    def region(self) -> dict:
+        return {"left": self.left, "top": self.top, "width": self.width, "height": self.height}
+
+    @property
+    def digest(self) -> str:
+        """Хеш вмісту кадру: однакові пікселі - однаковий хеш (ключ сховища та кешів)"""
+        if self._digest is None:
+            data = self.raw if self.raw is not None else self.to_image().tobytes()
+            hasher = hashlib.blake2b(digest_size=16)
+            hasher.update(f"{self.size[0]}x{self.size[1]}:".encode())
+            hasher.update(data)
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    @digest.setter
+    def digest(self, value: str):
+        self._digest = value
+
+    @property
+    def transform(self) -> Transform:
+        """Перетворення з пікселів кадру в пікселі екрану"""
+        return Transform(offset_x=self.left, offset_y=self.top)
+
+    def to_image(self) -> Image.Image:
+        """Повертає PIL зображення кадру, декодує буфер лише один раз"""
+        with self._lock:
+            if self._image is None:
+                self._image = Image.frombuffer("RGB", self.size, self.raw, "raw", "BGRX", 0, 1)
+            return self._image
+
+    def encode(self, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> bytes:
+        """Кодує кадр у JPEG/WebP/PNG в пам'яті"""
+        with tracing.span("encode", format=fmt):
+            buffer = io.BytesIO()
+            self.to_image().save(buffer, format=fmt, quality=quality)
+            return buffer.getvalue()
+
+    def to_base64(self, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> str:
+        return base64.b64encode(self.encode(fmt, quality)).decode("utf-8")
+
+    def data_url(self, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> str:
+        return f"data:{MIME_TYPES[fmt]};base64,{self.to_base64(fmt, quality)}"
+
+    def save(self) -> str:
+        """Зберігає кадр у сховище скріншотів (без дублікатів)"""
+        with tracing.span("save"):
+            self.path = screenshot_store.put(self)
+
+        print(f"✅ Скріншот: {self.path}")
+        return self.path
+
+    def save_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=tracing.run_in_context(self.save), daemon=True)
+        thread.start()
+        return thread
+
+    def __str__(self) -> str:
+        return self.path or self.key
+
+
+def monitor_at(monitors: list, x: int, y: int) -> dict:
+    """Повертає монітор, що містить точку (x, y)"""
+    for monitor in monitors[1:]:
+        if (monitor["left"] <= x < monitor["left"] + monitor["width"]
+                and monitor["top"] <= y < monitor["top"] + monitor["height"]):
+            return monitor
+    return None
+
+
+def clip_region(region: dict, bounds: dict) -> dict:
+    """Обрізає область до меж віртуального екрану"""
+    left = max(region["left"], bounds["left"])
+    top = max(region["top"], bounds["top"])
+    right = min(region["left"] + region["width"], bounds["left"] + bounds["width"])
+    bottom = min(region["top"] + region["height"], bounds["top"] + bounds["height"])
+    if right <= left or bottom <= top:
+        return None
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+
+def capture_region(sct, mode: str, monitor_index: int, own_pids: tuple = ()):
+    """Визначає область захоплення для режиму: monitor, all, cursor або window"""
+    monitors = sct.monitors
+    default = monitors[monitor_index] if 0 < monitor_index < len(monitors) else monitors[1]
+
+    if mode == "all":
+        return monitors[0], None
+
+    if mode == "cursor":
+        position = cursor_position()
+        monitor = monitor_at(monitors, *position) if position else None
+        return monitor or default, None
+
+    if mode == "window":
+        window = active_window(own_pids=own_pids)
+        region = clip_region(window.region, monitors[0]) if window else None
+        return region or default, window
+
+    return default, None
+
+
+def capture_frame(save: bool = SAVE_SCREENSHOTS, mode: str = CAPTURE_MODE,
+                  monitor: int = CAPTURE_MONITOR, region: dict = None, own_pids: tuple = ()) -> Frame:
+    """Захоплює екран у кадр в пам'яті, збереження на диск - у фоні; вікна own_pids (клієнтів демона) пропускає"""
+    with tracing.span("capture", mode=mode), mss.mss() as sct:
+        window = None
+        if region is None:
+            region, window = capture_region(sct, mode, monitor, own_pids)
+            if window is None and LOCAL_IDENTIFY:
+                window = active_window(own_pids=own_pids)
+        screenshot = sct.grab(region)
+        primary = sct.monitors[1]
+
+    frame = Frame(screenshot.raw, screenshot.size, region["left"], region["top"])
+    frame.primary_size = (primary["width"], primary["height"])
+    frame.mode = mode
+    frame.window = window
+    if save:
+        frame.save_in_background()
+    return frame
+
+
+def capture_screen() -> str:
+    return capture_frame(save=False).save()
+
+
+def as_frame(screenshot) -> Frame:
+    """Повертає кадр для кадру в пам'яті або шляху до скріншоту"""
+    if isinstance(screenshot, Frame):
+        return screenshot
+    return Frame.open(screenshot)
+
+
+def load_image(screenshot) -> Image.Image:
+    """Повертає PIL зображення кадру в пам'яті або файлу скріншоту"""
+    if isinstance(screenshot, Frame):
+        return screenshot.to_image()
+    return Image.open(screenshot)
+
+
+def get_screenshot_dimensions(screenshot) -> tuple:
     """Повертає (ширина, висота) скріншоту"""
     try:
-        img = Image.open(screenshot_path)
+        if isinstance(screenshot, Frame):
+            return screenshot.size
+        img = Image.open(screenshot)
         return img.size
     except Exception as e:
         print(f"❌ Помилка отримання розмірів: {e}")
-        return (1920, 1080)
\ No newline at end of file
+        return (1920, 1080)
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import features
+from config import (SCREENSHOTS_DIR, SCREENSHOT_STORE_FORMAT, SCREENSHOT_STORE_MAX_COUNT,
+                    SCREENSHOT_STORE_MAX_BYTES, SCREENSHOT_STORE_MAX_AGE)
+
+EXTENSIONS = {"WEBP": ".webp", "PNG": ".png"}
+
+
+class ScreenshotStore:
+    """Сховище кадрів за хешем вмісту: без дублікатів, з лімітами кількості, розміру та віку"""
+
+    def __init__(self, root, fmt: str = SCREENSHOT_STORE_FORMAT,
+                 max_count: int = SCREENSHOT_STORE_MAX_COUNT,
+                 max_bytes: int = SCREENSHOT_STORE_MAX_BYTES,
+                 max_age: float = SCREENSHOT_STORE_MAX_AGE):
+        self.root = Path(root)
+        self.fmt = fmt if fmt != "WEBP" or features.check("webp") else "PNG"
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = self.root / "index.json"
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def put(self, frame) -> str:
+        """Зберігає кадр (якщо такого вмісту ще немає) і повертає шлях до файлу"""
+        digest = frame.digest
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(digest)
+            if entry is not None and (self.root / entry["file"]).exists():
+                entry["used"] = time.time()
+                entries.move_to_end(digest)
+                self._save()
+                return str(self.root / entry["file"])
+
+        file = f"{digest[:2]}/{digest}{EXTENSIONS[self.fmt]}"
+        path = self.root / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        frame.to_image().save(tmp_path, format=self.fmt, lossless=True, method=1)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entries[digest] = {"file": file, "name": frame.name, "size": list(frame.size),
+                               "bytes": path.stat().st_size, "created": now, "used": now}
+            entries.move_to_end(digest)
+            self._evict(keep=digest)
+            self._save()
+        return str(path)
+
+    def path(self, digest: str):
+        """Повертає шлях до збереженого кадру або None"""
+        with self._lock:
+            entry = self._load().get(digest)
+            if entry is None:
+                return None
+            entry["used"] = time.time()
+            self._entries.move_to_end(digest)
+        path = self.root / entry["file"]
+        return str(path) if path.exists() else None
+
+    def open(self, digest: str):
+        """Відкриває збережений кадр за хешем вмісту"""
+        from screenshot import Frame
+        path = self.path(digest)
+        if path is None:
+            raise KeyError(digest)
+        frame = Frame.open(path)
+        frame.digest = digest
+        return frame
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._load()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._load()
+            return {"count": len(entries), "bytes": sum(e["bytes"] for e in entries.values())}
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._load()):
+                self._remove(digest)
+            self._save()
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+            self._entries = OrderedDict(sorted(entries.items(), key=lambda item: item[1]["used"]))
+            if self._evict():
+                self._save()
+        return self._entries
+
+    def _evict(self, keep: str = None) -> int:
+        """Видаляє найдавніше використані кадри, поки сховище перевищує ліміти"""
+        removed = 0
+        now = time.time()
+        total = sum(e["bytes"] for e in self._entries.values())
+        for digest in list(self._entries):
+            entry = self._entries[digest]
+            over = (len(self._entries) > self.max_count or total > self.max_bytes
+                    or now - entry["used"] > self.max_age)
+            if not over:
+                break
+            if digest == keep:
+                continue
+            total -= entry["bytes"]
+            self._remove(digest)
+            removed += 1
+        return removed
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest)
+        try:
+            os.remove(self.root / entry["file"])
+        except OSError:
+            pass
+
+    def _save(self):
+        tmp_path = self.index_path.with_name("index.json.tmp")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"❌ Помилка збереження індексу скріншотів: {e}")
+
+
+screenshot_store = ScreenshotStore(SCREENSHOTS_DIR)
@@ -0,0 +1,472 @@
+import hmac
+import itertools
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+
+import tracing
+from config import (DAEMON_MODE, DAEMON_SOCKET, DAEMON_HOST, DAEMON_PORT, DAEMON_TIMEOUT,
+                    DAEMON_START_TIMEOUT, DAEMON_TOKEN_FILE, DAEMON_PROTOCOL, KNOWLEDGE_BASE_ENABLED)
+
+
+class DaemonError(Exception):
+    pass
+
+
+def daemon_address():
+    """Адреса демона: шлях Unix сокета або (host, port), якщо AF_UNIX недоступний"""
+    if hasattr(socket, "AF_UNIX"):
+        return str(DAEMON_SOCKET)
+    return (DAEMON_HOST, DAEMON_PORT)
+
+
+def write_token(path=DAEMON_TOKEN_FILE) -> str:
+    """Створює новий ключ доступу до демона у файлі, доступному лише власнику"""
+    import secrets
+    token = secrets.token_hex(32)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def read_token(path=DAEMON_TOKEN_FILE) -> str:
+    return Path(path).read_text(encoding="utf-8").strip()
+
+
+def check_token(token, expected: str) -> bool:
+    return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+def frame_meta(frame) -> dict:
+    """Метадані кадру для передачі клієнту (без пікселів)"""
+    window = getattr(frame, "window", None)
+    return {
+        "digest": frame.digest,
+        "left": frame.left,
+        "top": frame.top,
+        "size": list(frame.size),
+        "primary_size": list(frame.primary_size) if frame.primary_size else None,
+        "mode": frame.mode,
+        "program": frame.program,
+        "window": asdict(window) if window else None
+    }
+
+
+class FrameRef:
+    """Кадр, що живе в демоні: метадані та хеш вмісту замість пікселів"""
+
+    def __init__(self, meta: dict):
+        from desktop import WindowInfo
+        self.digest = meta["digest"]
+        self.left = meta["left"]
+        self.top = meta["top"]
+        self.size = tuple(meta["size"])
+        self.primary_size = tuple(meta["primary_size"]) if meta["primary_size"] else None
+        self.mode = meta["mode"]
+        self.program = meta["program"]
+        self.window = WindowInfo(**meta["window"]) if meta["window"] else None
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @property
+    def transform(self):
+        from screenshot import Transform
+        return Transform(offset_x=self.left, offset_y=self.top)
+
+
+def local_frame(frame):
+    """Кадр з пікселями; FrameRef демона, що зник, аналізувати локально неможливо"""
+    if isinstance(frame, FrameRef):
+        raise DaemonError("кадр лишився в демоні, що зник - зробіть новий скріншот")
+    return frame
+
+
+class LocalService:
+    """Аналіз екрану в поточному процесі; демон обслуговує клієнтів тим самим класом"""
+
+    def __init__(self):
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def capture(self, own_pids: tuple = ()):
+        """Захоплює екран; вікна процесів own_pids (оверлей клієнта демона) не вважаються активними"""
+        from screenshot import capture_frame
+        return capture_frame(own_pids=own_pids)
+
+    def open(self, path):
+        """Відкриває скріншот з диску як кадр"""
+        from screenshot import Frame
+        return Frame.open(path)
+
+    def identify(self, frame) -> dict:
+        from ai_client import local_identity
+        return local_identity(local_frame(frame))
+
+    def prefetch(self, frame):
+        """Запускає OCR та підготовку пошуку іконок кадру у фоні"""
+        from ocr_utils import prefetch_ocr_index
+        from icon_locator import prefetch_icons
+        frame = local_frame(frame)
+        prefetch_ocr_index(frame)
+        prefetch_icons(frame, frame.program)
+
+    def define_program(self, frame) -> dict:
+        from ai_client import define_program
+        return define_program(local_frame(frame))
+
+    def cache_stats(self) -> str:
+        from program_cache import define_program_cache
+        return define_program_cache.stats_text()
+
+    def instructions(self, frame, program_name: str, current_location: str, action: str,
+                     refresh: bool = False, should_stop=None, result: dict = None):
+        """Генерує кроки: з бази знань (result["recalled"]) або від моделі зі збереженням у базу"""
+        from ai_client import recall_instructions, stream_instructions
+        from knowledge_base import knowledge_base
+
+        frame = local_frame(frame)
+        result = {} if result is None else result
+        if KNOWLEDGE_BASE_ENABLED and not refresh:
+            steps = recall_instructions(program_name, current_location, action, frame)
+            if steps is not None:
+                result["recalled"] = True
+                yield from steps
+                return
+
+        received, answer = [], {}
+        for step in stream_instructions(program_name, current_location, action, frame, should_stop, answer):
+            received.append(step)
+            yield step
+        # Лише повна відповідь: обрізану (length) чи перервану не запам'ятовуємо
+        if KNOWLEDGE_BASE_ENABLED and answer.get("finish_reason") == "stop" and not (
+                should_stop and should_stop()):
+            knowledge_base.store(program_name, current_location, action, received)
+
+    def prefetch_instructions(self, frame, program_name: str, current_location: str, actions: list,
+                              should_stop=None, max_tokens: int = None):
+        """(action, step) для ще невідомих дій одним запитом; завершені блоки - в базу знань"""
+        from ai_client import stream_all_instructions
+        from knowledge_base import knowledge_base
+
+        frame = local_frame(frame)
+        if KNOWLEDGE_BASE_ENABLED:
+            known = knowledge_base.known(program_name, current_location, actions)
+            actions = [action for action in actions if action not in known]
+        if not actions:
+            return
+
+        steps = {}
+        options = {"max_tokens": max_tokens} if max_tokens else {}
+        for action, step in stream_all_instructions(program_name, current_location, actions, frame,
+                                                    should_stop=should_stop, **options):
+            if step is not None:
+                steps.setdefault(action, []).append(step)
+            elif KNOWLEDGE_BASE_ENABLED and not (should_stop and should_stop()):
+                knowledge_base.store(program_name, current_location, action, steps.get(action, []))
+            yield action, step
+
+    def locate_steps(self, frame, steps: list) -> list:
+        from ai_client import locate_step
+        frame = local_frame(frame)
+        return [locate_step(step, frame) for step in steps]
+
+    def watch(self, previous, masks=()) -> tuple:
+        """Порівнює область кадру з екраном: (None | "update" | "redefine", актуальний кадр); masks - власні вікна"""
+        from watcher import tile_hashes, watch_step
+
+        if isinstance(previous, FrameRef):
+            # Демон зник: його кадр не порівняти, тож знімаємо новий і аналізуємо екран заново
+            return "redefine", self.capture()
+        if getattr(previous, "raw", None) is None:
+            return None, previous
+        with self._lock:
+            hashes = self._hashes.get(previous.key)
+        if hashes is None:
+            hashes = tile_hashes(previous)
+
+        event, frame, hashes = watch_step(previous, hashes, masks)
+        with self._lock:
+            self._hashes[frame.key] = hashes
+            while len(self._hashes) > 4:
+                self._hashes.popitem(last=False)
+        return event, frame
+
+    def close(self):
+        pass
+
+
+class DaemonClient:
+    """Тонкий клієнт демона: JSON рядки через Unix сокет, відповіді розбирає окремий потік"""
+
+    def __init__(self, address=None, timeout: float = DAEMON_TIMEOUT, token_file=DAEMON_TOKEN_FILE):
+        self.address = address or daemon_address()
+        self.timeout = timeout
+        self.token_file = token_file
+        self.autostart = False
+        self.failed = False
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._socket = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, autostart: bool = False, address=None, token_file=DAEMON_TOKEN_FILE) -> "DaemonClient":
+        """Під'єднується до демона, за потреби запускає його та чекає на готовність"""
+        client = cls(address, DAEMON_START_TIMEOUT, token_file)
+        try:
+            client.call("ping")
+        except OSError:
+            if not autostart:
+                raise
+            start_daemon()
+            client._wait_ready()
+        client.timeout, client.autostart, client.failed = DAEMON_TIMEOUT, autostart, False
+        return client
+
+    def _wait_ready(self):
+        """Чекає, поки запущений демон прийме з'єднання та привітання"""
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while True:
+            try:
+                self._connection()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def _restart(self) -> bool:
+        """Запускає демон заново, якщо попередній зник; False - якщо новий не піднявся"""
+        print("🔁 Демон аналізу недоступний - перезапуск")
+        try:
+            start_daemon()
+            self._wait_ready()
+            return True
+        except (OSError, DaemonError) as e:
+            print(f"⚠️ Демон не перезапустився: {e}")
+            return False
+
+    def _connection(self) -> socket.socket:
+        with self._lock:
+            if self._socket is None:
+                family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.address)
+                    self._hello(sock)
+                except Exception:
+                    sock.close()
+                    raise
+                self._socket = sock
+                threading.Thread(target=self._read, args=(sock,), name="daemon-client",
+                                 daemon=True).start()
+            return self._socket
+
+    def _hello(self, sock: socket.socket):
+        """Перше повідомлення з'єднання: ключ доступу та перевірка версії протоколу"""
+        message = {"id": 0, "method": "hello", "params": {"token": read_token(self.token_file),
+                                                          "protocol": DAEMON_PROTOCOL}}
+        sock.settimeout(DAEMON_START_TIMEOUT)
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as lines:
+            line = lines.readline()
+        sock.settimeout(None)
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            raise DaemonError("демон не відповів на привітання")
+        if "error" in reply:
+            raise DaemonError(reply["error"])
+        if reply.get("result", {}).get("protocol") != DAEMON_PROTOCOL:
+            raise DaemonError(f"інша версія демона (протокол {reply.get('result', {}).get('protocol')}, "
+                              f"потрібен {DAEMON_PROTOCOL})")
+
+    def _read(self, sock: socket.socket):
+        try:
+            with sock.makefile("r", encoding="utf-8") as lines:
+                for line in lines:
+                    message = json.loads(line)
+                    replies = self._pending.get(message.get("id"))
+                    if replies is not None:
+                        replies.put(message)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._socket is sock:
+                self._socket = None
+            pending = list(self._pending.values())
+        for replies in pending:
+            replies.put({"error": "з'єднання з демоном втрачено"})
+
+    def _send(self, request_id: int, method: str, params: dict):
+        data = (json.dumps({"id": request_id, "method": method, "params": params},
+                           ensure_ascii=False) + "\n").encode("utf-8")
+        sock = self._connection()
+        with self._write_lock:
+            sock.sendall(data)
+
+    def _request(self, method: str, params: dict) -> tuple:
+        """Надсилає запит; якщо демон зник, один раз перезапускає його (autostart), інакше failed"""
+        for attempt in range(2):
+            request_id = next(self._ids)
+            replies = queue.SimpleQueue()
+            self._pending[request_id] = replies
+            try:
+                self._send(request_id, method, params)
+                return request_id, replies
+            except OSError:
+                self._pending.pop(request_id, None)
+                if attempt or not self.autostart or not self._restart():
+                    self.failed = True
+                    raise
+
+    def _reply(self, request_id: int, replies: queue.SimpleQueue) -> dict:
+        try:
+            message = replies.get(timeout=self.timeout)
+        except queue.Empty:
+            # Завислий демон: закриваємо з'єднання, get_service далі віддасть локальний сервіс
+            self._pending.pop(request_id, None)
+            self.failed = True
+            self.close()
+            raise DaemonError("демон не відповідає")
+        if "error" in message:
+            raise DaemonError(message["error"])
+        if "item" not in message:
+            tracing.merge(message.get("stages") or {}, message.get("tokens"))
+        return message
+
+    def call(self, method: str, **params):
+        request_id, replies = self._request(method, params)
+        try:
+            return self._reply(request_id, replies).get("result")
+        finally:
+            self._pending.pop(request_id, None)
+
+    def stream(self, method: str, should_stop=None, result: dict = None, **params):
+        """Повертає елементи потокової відповіді; should_stop() надсилає демону скасування"""
+        request_id, replies = self._request(method, params)
+        finished = False
+        try:
+            while True:
+                if should_stop and should_stop():
+                    return
+                message = self._reply(request_id, replies)
+                if "item" not in message:
+                    finished = True
+                    if result is not None:
+                        result.update(message.get("result") or {})
+                    return
+                yield message["item"]
+        finally:
+            self._pending.pop(request_id, None)
+            if not finished:
+                try:
+                    self._send(next(self._ids), "cancel", {"request": request_id})
+                except OSError:
+                    pass
+
+    def _frame(self, frame) -> dict:
+        if frame is None:
+            return {"frame": None}
+        return {"frame": frame.digest, "program": frame.program}
+
+    def capture(self):
+        return FrameRef(self.call("capture", client_pid=os.getpid()))
+
+    def open(self, path):
+        return FrameRef(self.call("open", path=str(Path(path).resolve())))
+
+    def identify(self, frame) -> dict:
+        return self.call("identify", **self._frame(frame))
+
+    def prefetch(self, frame):
+        self.call("prefetch", **self._frame(frame))
+
+    def define_program(self, frame) -> dict:
+        return self.call("define_program", **self._frame(frame))
+
+    def cache_stats(self) -> str:
+        return self.call("cache_stats")
+
+    def instructions(self, frame, program_name: str, current_location: str, action: str,
+                     refresh: bool = False, should_stop=None, result: dict = None):
+        return self.stream("instructions", should_stop, result, program_name=program_name,
+                           current_location=current_location, action=action, refresh=refresh,
+                           **self._frame(frame))
+
+    def prefetch_instructions(self, frame, program_name: str, current_location: str, actions: list,
+                              should_stop=None, max_tokens: int = None):
+        for action, step in self.stream("prefetch_instructions", should_stop, program_name=program_name,
+                                        current_location=current_location, actions=actions,
+                                        max_tokens=max_tokens, **self._frame(frame)):
+            yield action, step
+
+    def locate_steps(self, frame, steps: list) -> list:
+        steps = [{key: step.get(key) for key in ("action", "quoted_text")} for step in steps]
+        return self.call("locate_steps", steps=steps, **self._frame(frame))
+
+    def watch(self, previous, masks=()) -> tuple:
+        reply = self.call("watch", masks=[list(mask) for mask in masks], **self._frame(previous))
+        if reply["event"] is None:
+            return None, previous
+        return reply["event"], FrameRef(reply["frame"])
+
+    def close(self):
+        with self._lock:
+            sock, self._socket = self._socket, None
+        if sock is not None:
+            sock.close()
+
+
+def start_daemon():
+    """Запускає демон окремим процесом, що переживає оверлей"""
+    print("🚀 Запуск демона аналізу")
+    options = {"start_new_session": True} if os.name == "posix" else {
+        "creationflags": getattr(subprocess, "DETACHED_PROCESS", 0)}
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve().parent / "daemon.py")],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     cwd=Path(__file__).resolve().parent, **options)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """Повертає сервіс аналізу: клієнт демона (DAEMON_MODE) або аналіз у власному процесі"""
+    global _service
+    with _service_lock:
+        if isinstance(_service, DaemonClient) and _service.failed:
+            print("⚠️ Демон аналізу втрачено - далі аналіз у цьому процесі")
+            _service.close()
+            _service = LocalService()
+        if _service is None:
+            if DAEMON_MODE == "off":
+                _service = LocalService()
+            else:
+                try:
+                    _service = DaemonClient.connect(autostart=DAEMON_MODE == "auto")
+                    print("🔌 Під'єднано до демона аналізу")
+                except (OSError, DaemonError) as e:
+                    print(f"⚠️ Демон недоступний ({e}) - аналіз у цьому процесі")
+                    _service = LocalService()
+        return _service
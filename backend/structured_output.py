@@ -0,0 +1,160 @@
+import json
+import re
+
+STEP_FIELDS = {
+    "element": {"type": ["integer", "null"], "description": "[id] of the element used"},
+    "point": {
+        "type": ["object", "null"],
+        "description": "centre of a text-less icon in the image",
+        "properties": {"x": {"type": "integer"}, "y": {"type": "integer"}},
+        "required": ["x", "y"],
+        "additionalProperties": False
+    },
+}
+
+SCHEMAS = {
+    "program": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "location": {"type": "string"},
+            "actions": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["name", "location", "actions"],
+        "additionalProperties": False
+    },
+    "actions": {
+        "type": "object",
+        "properties": {"actions": {"type": "array", "items": {"type": "string"}}},
+        "required": ["actions"],
+        "additionalProperties": False
+    },
+    "instructions": {
+        "type": "object",
+        "properties": {"steps": {"type": "array", "items": "step"}},
+        "required": ["steps"],
+        "additionalProperties": False
+    },
+    "all_instructions": {
+        "type": "object",
+        "properties": {
+            "instructions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "action": {"type": "string"},
+                        "steps": {"type": "array", "items": "step"}
+                    },
+                    "required": ["action", "steps"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["instructions"],
+        "additionalProperties": False
+    },
+}
+
+TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "null": type(None),
+}
+
+
+class StructuredOutputError(ValueError):
+    """Відповідь моделі не є JSON або не відповідає схемі"""
+
+
+def step_schema(fields: tuple = ()) -> dict:
+    """Схема кроку: дія та назви елементів, плюс потрібні для режиму поля (element, point)"""
+    properties = {"action": {"type": "string"}, "labels": {"type": "array", "items": {"type": "string"}}}
+    properties.update((field, STEP_FIELDS[field]) for field in fields)
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+
+def schema(name: str, fields: tuple = ()) -> dict:
+    """Повертає схему name, де кожен "step" замінено схемою кроку"""
+    def build(node):
+        if node == "step":
+            return step_schema(fields)
+        if isinstance(node, dict):
+            return {key: build(value) for key, value in node.items()}
+        return node
+    return build(SCHEMAS[name])
+
+
+def response_format(name: str, fields: tuple = ()) -> dict:
+    """Параметр response_format для строгої JSON схеми name"""
+    return {"type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": schema(name, fields)}}
+
+
+def _check(value, node: dict, path: str):
+    kinds = node["type"] if isinstance(node["type"], list) else [node["type"]]
+    if not any(isinstance(value, TYPES[kind]) and not (kind == "integer" and isinstance(value, bool))
+               for kind in kinds):
+        raise StructuredOutputError(f"{path}: очікується {' | '.join(kinds)}")
+    if isinstance(value, dict):
+        properties = node.get("properties", {})
+        for key in node.get("required", []):
+            if key not in value:
+                raise StructuredOutputError(f"{path}.{key}: поле відсутнє")
+        for key, item in value.items():
+            if key not in properties:
+                if node.get("additionalProperties", True) is False:
+                    raise StructuredOutputError(f"{path}.{key}: зайве поле")
+                continue
+            _check(item, properties[key], f"{path}.{key}")
+    elif isinstance(value, list):
+        for number, item in enumerate(value):
+            _check(item, node["items"], f"{path}[{number}]")
+
+
+def decode(text: str, name: str, fields: tuple = ()):
+    """Розбирає відповідь одним json.loads і перевіряє її за схемою name"""
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        raise StructuredOutputError(f"не JSON: {e}") from e
+    _check(value, schema(name, fields), "$")
+    return value
+
+
+def partial(text: str, name: str, fields: tuple = ()) -> dict:
+    """Обрізана (length) відповідь: значення схеми name лише з елементами масиву, що дійшли повністю"""
+    node = schema(name, fields)
+    (key, array), *others = node["properties"].items()
+    match = re.match(r'\s*\{\s*"%s"\s*:\s*\[' % re.escape(key), text)
+    if others or array["type"] != "array" or not match:
+        raise StructuredOutputError("відповідь обрізана (length)")
+
+    decoder, separator, items = json.JSONDecoder(), re.compile(r"\s*,?\s*"), []
+    position = match.end()
+    while True:
+        position = separator.match(text, position).end()
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except ValueError:
+            break
+        items.append(item)
+    value = {key: items}
+    _check(value, node, "$")
+    return value
+
+
+def empty(name: str, fields: tuple = ()) -> dict:
+    """Порожнє значення схеми name: масиви порожні, решта полів None"""
+    return {key: [] if node["type"] == "array" else None
+            for key, node in schema(name, fields)["properties"].items()}
+
+
+def repair_messages(text: str, error: Exception) -> list:
+    """Текстовий запит на виправлення відповіді (без зображення)"""
+    prompt = (f"Fix this reply so it is valid JSON for the schema. Keep the content.\n"
+              f"Error: {error}\nReply:\n{text}")
+    return [{"role": "user", "content": prompt}]
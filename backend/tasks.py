@@ -0,0 +1,102 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from config import TASK_WORKERS, TASK_LANES, UI_QUEUE_INTERVAL_MS
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    """Завдання каналу планувальника; застаріває, коли в каналі з'являється новіше"""
+
+    def __init__(self, scheduler: "TaskScheduler", channel: str, generation: int):
+        self.scheduler = scheduler
+        self.channel = channel
+        self.generation = generation
+
+    @property
+    def cancelled(self) -> bool:
+        return self.scheduler.generation(self.channel) != self.generation
+
+    def check(self):
+        if self.cancelled:
+            raise TaskCancelled(self.channel)
+
+
+class TaskScheduler:
+    """Обмежений виконавець фонових завдань зі скасуванням за поколіннями; lanes - канали з власними потоками"""
+
+    def __init__(self, max_workers: int = TASK_WORKERS, lanes: dict = TASK_LANES):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self._lanes = {channel: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"task-{channel}")
+                       for channel, workers in lanes.items()}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, channel: str) -> int:
+        with self._lock:
+            return self._generations.get(channel, 0)
+
+    def cancel(self, channel: str):
+        """Робить застарілими всі поточні та заплановані завдання каналу"""
+        with self._lock:
+            self._generations[channel] = self._generations.get(channel, 0) + 1
+
+    def submit(self, channel: str, fn, *args) -> Future:
+        """Запускає fn(task, *args), скасовуючи попередні завдання цього каналу"""
+        with self._lock:
+            generation = self._generations.get(channel, 0) + 1
+            self._generations[channel] = generation
+        task = Task(self, channel, generation)
+
+        def run():
+            if task.cancelled:
+                return None
+            try:
+                return fn(task, *args)
+            except TaskCancelled:
+                return None
+
+        return self._lanes.get(channel, self._executor).submit(run)
+
+    def shutdown(self):
+        for channel in list(self._generations):
+            self.cancel(channel)
+        for executor in [self._executor, *self._lanes.values()]:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class UiQueue:
+    """Черга змін віджетів, яку розбирає Tk потік через root.after"""
+
+    def __init__(self, root, interval_ms: int = UI_QUEUE_INTERVAL_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._queue = queue.SimpleQueue()
+        self.root.after(self.interval_ms, self._drain)
+
+    def post(self, fn, *args):
+        """Виконує fn(*args) в Tk потоці"""
+        self._queue.put((None, fn, args))
+
+    def post_for(self, task: Task, fn, *args):
+        """Виконує fn(*args) в Tk потоці, якщо завдання ще не застаріло"""
+        self._queue.put((task, fn, args))
+
+    def _drain(self):
+        while True:
+            try:
+                task, fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None and task.cancelled:
+                continue
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"❌ Помилка оновлення UI: {e}")
+
+        self.root.after(self.interval_ms, self._drain)
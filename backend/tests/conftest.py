@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test")  # справжні запити в тестах не виконуються
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_trace_file(monkeypatch):
+    import tracing
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", False)
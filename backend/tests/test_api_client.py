@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from api_client import ApiClient, ApiError
+
+
+def test_retries_until_success(monkeypatch):
+    monkeypatch.setattr("api_client.retry_delay", lambda number, error: 0.01)
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise asyncio.TimeoutError()
+        return "ok"
+
+    assert asyncio.run(ApiClient(max_retries=3)._with_retries(attempt)) == "ok"
+    assert len(attempts) == 3
+
+
+def test_non_retryable_error_is_raised_at_once():
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ApiError):
+        asyncio.run(ApiClient(max_retries=3)._with_retries(attempt))
+    assert len(attempts) == 1
+
+
+def test_should_stop_interrupts_backoff(monkeypatch):
+    monkeypatch.setattr("api_client.retry_delay", lambda number, error: 30.0)
+    started = time.monotonic()
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        raise asyncio.TimeoutError()
+
+    stop_at = started + 0.2
+    result = asyncio.run(ApiClient(max_retries=3)._with_retries(
+        attempt, should_stop=lambda: time.monotonic() > stop_at))
+
+    assert result is None
+    assert len(attempts) == 1
+    assert time.monotonic() - started < 2
@@ -0,0 +1,57 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import batch
+from api_client import ApiError
+
+
+def api_error(cause: Exception) -> ApiError:
+    try:
+        raise ApiError(str(cause)) from cause
+    except ApiError as e:
+        return e
+
+
+def test_retries_transient_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(batch.time, "sleep", sleeps.append)
+    monkeypatch.setattr(batch, "retry_delay", lambda number, error: number + 1.0)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise api_error(asyncio.TimeoutError())
+        return "ok"
+
+    assert batch.with_retries(call, retries=3) == "ok"
+    assert sleeps == [1.0, 2.0]
+
+
+def test_does_not_retry_permanent_errors(monkeypatch):
+    monkeypatch.setattr(batch.time, "sleep", lambda delay: pytest.fail("unexpected retry"))
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise api_error(ValueError("bad request"))
+
+    with pytest.raises(ApiError):
+        batch.with_retries(call, retries=3)
+    assert len(attempts) == 1
+
+
+def test_iter_images_walks_directories_and_skips_other_files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.png", "sub/b.JPG", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert sorted(Path(path).name for path in batch.iter_images([str(tmp_path)])) == ["a.png", "b.JPG"]
+
+
+def test_resume_skips_only_successful_images(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"path": "a.png", "status": "ok"}\n{"path": "b.png", "status": "error"}\nnot json\n',
+                      encoding="utf-8")
+    assert batch.load_done(str(output)) == {"a.png"}
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import config
+
+
+def test_find_tesseract_prefers_environment(tmp_path, monkeypatch):
+    binary = tmp_path / "tesseract"
+    binary.write_text("")
+    monkeypatch.setenv("TESSERACT_PATH", str(binary))
+    assert config.find_tesseract(default=str(tmp_path / "missing")) == str(binary)
+
+
+def test_find_tesseract_ignores_missing_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("TESSERACT_PATH", str(tmp_path / "missing"))
+    monkeypatch.setattr(config.shutil, "which", lambda name: None)
+    assert config.find_tesseract(default=str(tmp_path / "also_missing")) is None
+
+
+def test_api_key_is_required_only_when_used(monkeypatch):
+    monkeypatch.setattr(config, "_env_loaded", True)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(ValueError, match="OPENAI_API_KEY"):
+        config.require_api_key()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    assert config.require_api_key() == "sk-test"
+
+
+def test_overlay_import_skips_heavy_modules():
+    code = "import sys, program; print(sorted({'openai', 'mss', 'pytesseract', 'PIL'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(config.__file__).parent,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
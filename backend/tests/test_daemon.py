@@ -0,0 +1,224 @@
+import json
+import os
+import socket
+import threading
+
+import pytest
+from PIL import Image
+
+import ai_client
+import service
+import tracing
+from api_client import ApiClient
+from daemon import DaemonServer, FrameRegistry
+from fake_openai import FakeOpenAIServer
+from program_cache import ProgramCache
+from screenshot import Frame
+from service import DaemonClient, DaemonError, FrameRef, LocalService, frame_meta
+
+
+def make_frame(value: int) -> Frame:
+    return Frame(bytes([value]) * 16 * 16 * 4, (16, 16))
+
+
+def test_frame_registry_evicts_least_recently_used():
+    frames = FrameRegistry(max_frames=2)
+    first, second, third = make_frame(1), make_frame(2), make_frame(3)
+    frames.add(first)
+    frames.add(second)
+    assert frames.get(first.digest) is first
+    frames.add(third)
+
+    assert len(frames) == 2
+    assert frames.get(first.digest, program="Editor").program == "Editor"
+    with pytest.raises(KeyError):
+        frames.get(second.digest)
+    assert frames.get(None) is None
+
+
+def start_server(tmp_path, service) -> DaemonServer:
+    server = DaemonServer(address=str(tmp_path / "daemon.sock"), service=service,
+                          token_file=tmp_path / "daemon.token")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    fake = FakeOpenAIServer(latency=0, token_delay=0).start()
+    monkeypatch.setattr(ai_client, "client", ApiClient(api_key="test", base_url=fake.base_url))
+    monkeypatch.setattr(ai_client, "define_program_cache", ProgramCache(tmp_path / "programs.json"))
+    monkeypatch.setattr(ai_client, "RESPONSE_FORMAT", "text")
+    monkeypatch.setattr(service, "KNOWLEDGE_BASE_ENABLED", False)
+
+    server = start_server(tmp_path, LocalService())
+    client = DaemonClient(address=server.address, timeout=10, token_file=server.token_file)
+    yield client, tmp_path
+    client.close()
+    server.shutdown()
+    server.server_close()
+    fake.stop()
+
+
+def test_daemon_round_trip(daemon):
+    client, tmp_path = daemon
+    path = tmp_path / "screen.png"
+    Image.new("RGB", (64, 48), "white").save(path)
+
+    assert client.call("ping")["frames"] == 0
+    frame = client.open(path)
+    assert frame.size == (64, 48)
+
+    with tracing.trace("screenshot") as trace:
+        program = client.define_program(frame)
+    assert program["Name"] == "Text Editor"
+    assert "api" in trace.stages and sum(trace.tokens.values()) > 0
+
+
+def test_daemon_reports_errors(daemon):
+    client, _ = daemon
+    with pytest.raises(DaemonError, match="невідомий кадр"):
+        client.call("identify", frame="missing")
+    with pytest.raises(DaemonError, match="невідомий метод"):
+        client.call("missing", frame=None)
+
+
+def test_capture_skips_client_windows(tmp_path):
+    class RecordingService(LocalService):
+        def capture(self, own_pids=()):
+            self.own_pids = own_pids
+            return make_frame(7)
+
+    recording = RecordingService()
+    server = start_server(tmp_path, recording)
+    client = DaemonClient(address=server.address, timeout=10, token_file=server.token_file)
+    try:
+        assert client.capture().digest == make_frame(7).digest
+        assert recording.own_pids == (os.getpid(),)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_connection_without_token_is_rejected(tmp_path):
+    server = start_server(tmp_path, LocalService())
+    try:
+        assert oct(server.token_file.stat().st_mode & 0o777) == "0o600"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(server.address)
+        sock.sendall(b'POST / HTTP/1.1\r\n{"id": 1, "method": "ping"}\n')
+        assert sock.recv(1024) == b""
+        sock.close()
+
+        server.token_file.write_text("wrong")
+        with pytest.raises(DaemonError, match="доступ заборонено"):
+            DaemonClient(address=server.address, token_file=server.token_file).call("ping")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not server.token_file.exists()
+
+
+def test_protocol_mismatch_is_reported(tmp_path, monkeypatch):
+    server = start_server(tmp_path, LocalService())
+    monkeypatch.setattr(service, "DAEMON_PROTOCOL", -1)
+    try:
+        with pytest.raises(DaemonError, match="інша версія"):
+            DaemonClient(address=server.address, token_file=server.token_file).call("ping")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_idle_daemon_stops(tmp_path):
+    server = DaemonServer(address=str(tmp_path / "daemon.sock"), service=LocalService(),
+                          token_file=tmp_path / "daemon.token")
+    server.last_active -= 10
+    server.serve_until_idle(idle_timeout=5)
+    server.server_close()
+
+
+def test_hung_daemon_falls_back_to_local(monkeypatch):
+    def hung(*args, **kwargs):
+        raise DaemonError("демон не відповідає")
+
+    monkeypatch.setattr(DaemonClient, "connect", hung)
+    monkeypatch.setattr(service, "DAEMON_MODE", "connect")
+    monkeypatch.setattr(service, "_service", None)
+    assert isinstance(service.get_service(), LocalService)
+
+
+def test_dead_daemon_is_restarted(tmp_path, monkeypatch):
+    servers = [start_server(tmp_path, LocalService())]
+    monkeypatch.setattr(service, "start_daemon",
+                        lambda: servers.append(start_server(tmp_path, LocalService())))
+    client = DaemonClient.connect(autostart=True, address=servers[0].address,
+                                  token_file=servers[0].token_file)
+    try:
+        servers[0].shutdown()
+        servers[0].server_close()
+        client.close()
+        assert client.call("ping")["protocol"] == service.DAEMON_PROTOCOL
+        assert len(servers) == 2 and not client.failed
+    finally:
+        client.close()
+        servers[-1].shutdown()
+        servers[-1].server_close()
+
+
+def test_dead_daemon_switches_to_local(tmp_path, monkeypatch):
+    server = start_server(tmp_path, LocalService())
+    client = DaemonClient.connect(address=server.address, token_file=server.token_file)
+    server.shutdown()
+    server.server_close()
+    client.close()
+    with pytest.raises(OSError):
+        client.call("ping")
+    assert client.failed
+
+    monkeypatch.setattr(service, "_service", client)
+    assert isinstance(service.get_service(), LocalService)
+
+
+def test_hung_daemon_marks_client_failed(tmp_path, monkeypatch):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(tmp_path / "hung.sock"))
+    listener.listen(1)
+    (tmp_path / "hung.token").write_text("secret")
+
+    def accept_and_hang():
+        sock, _ = listener.accept()
+        lines = sock.makefile("r", encoding="utf-8")
+        hello = json.loads(lines.readline())
+        sock.sendall((json.dumps({"id": hello["id"], "result": {"protocol": service.DAEMON_PROTOCOL}})
+                      + "\n").encode("utf-8"))
+        for _ in lines:
+            pass
+
+    threading.Thread(target=accept_and_hang, daemon=True).start()
+    client = DaemonClient(address=str(tmp_path / "hung.sock"), timeout=0.2,
+                          token_file=tmp_path / "hung.token")
+    try:
+        with pytest.raises(DaemonError, match="не відповідає"):
+            client.call("ping")
+        assert client.failed and not client._pending and client._socket is None
+
+        monkeypatch.setattr(service, "_service", client)
+        assert isinstance(service.get_service(), LocalService)
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_local_service_rejects_daemon_frames(monkeypatch):
+    stale = FrameRef(frame_meta(make_frame(5)))
+    local = LocalService()
+    with pytest.raises(DaemonError, match="новий скріншот"):
+        local.define_program(stale)
+    with pytest.raises(DaemonError, match="новий скріншот"):
+        local.locate_steps(stale, [])
+
+    monkeypatch.setattr(local, "capture", lambda own_pids=(): make_frame(6))
+    event, frame = local.watch(stale)
+    assert event == "redefine" and frame.digest == make_frame(6).digest
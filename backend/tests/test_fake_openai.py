@@ -0,0 +1,18 @@
+from api_client import ApiClient
+from fake_openai import INSTRUCTIONS_REPLY, PROGRAM_REPLY, FakeOpenAIServer
+
+
+def test_fake_server_answers_plain_and_streaming_requests():
+    fake = FakeOpenAIServer(latency=0, token_delay=0).start()
+    try:
+        client = ApiClient(api_key="test", base_url=fake.base_url)
+        response = client.create(model="gpt-4o-mini",
+                                 messages=[{"role": "user", "content": "Name: Location: Action:"}])
+        assert response.choices[0].message.content == PROGRAM_REPLY
+
+        chunks = client.stream(model="gpt-4o-mini", messages=[{"role": "user", "content": "Steps"}])
+        text = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+        assert text == INSTRUCTIONS_REPLY
+        assert fake.requests == 2
+    finally:
+        fake.stop()
@@ -0,0 +1,84 @@
+import numpy as np
+from PIL import Image
+
+import ai_client
+from icon_locator import FrameSpectrum, IconLibrary, IconTemplate, icon_key, match_template
+
+
+def icon(value: int) -> Image.Image:
+    pixels = np.full((32, 32), 255, dtype=np.uint8)
+    pixels[8:24, 8:24] = value
+    return Image.fromarray(pixels)
+
+
+def test_candidate_needs_a_second_frame(tmp_path):
+    library = IconLibrary(tmp_path)
+    assert not library.propose("Editor", "Bold", icon(0), "frame-1")
+    assert not library.propose("Editor", "Bold", icon(0), "frame-1")
+    assert library.template("Editor", "Bold") is None
+
+    assert library.propose("Editor", "Bold", icon(5), "frame-2")
+    assert library.template("Editor", "Bold") is not None
+
+
+def test_disagreeing_candidates_are_not_saved(tmp_path):
+    library = IconLibrary(tmp_path)
+    library.propose("Editor", "Bold", icon(0), "frame-1")
+    assert not library.propose("Editor", "Bold", icon(200), "frame-2")
+    assert library.template("Editor", "Bold") is None
+
+
+def test_learned_icon_expires_and_yields_to_contradicting_hint(tmp_path):
+    library = IconLibrary(tmp_path, learned_max_age=60)
+    library.propose("Editor", "Bold", icon(0), "frame-1")
+    library.propose("Editor", "Bold", icon(0), "frame-2")
+    assert library.propose("Editor", "Bold", icon(3), "frame-3")
+
+    assert not library.propose("Editor", "Bold", icon(200), "frame-4")
+    assert library.template("Editor", "Bold") is None
+
+    library.propose("Editor", "Bold", icon(0), "frame-5")
+    library.propose("Editor", "Bold", icon(0), "frame-6")
+    library._entries[icon_key("Editor", "Bold")]["confirmed"] -= 120
+    assert library.template("Editor", "Bold") is None
+    assert library.stats()["count"] == 0
+
+
+def test_ocr_confirmed_icon_ignores_hints(tmp_path):
+    library = IconLibrary(tmp_path, learned_max_age=60)
+    library.put("Editor", "Bold", icon(0))
+    library._entries[icon_key("Editor", "Bold")]["confirmed"] -= 120
+    assert not library.propose("Editor", "Bold", icon(200), "frame-1")
+    assert library.template("Editor", "Bold") is not None
+
+
+def test_ocr_hit_ranks_above_icon_match(monkeypatch):
+    monkeypatch.setattr(ai_client, "ICON_LOCATOR", True)
+    monkeypatch.setattr(ai_client, "locate_labels", lambda labels, screenshot: {"x": 1, "source": "ocr"})
+    monkeypatch.setattr(ai_client, "find_icon", lambda *args: (50, 50, 10, 10))
+    step = {"action": 'Click "Bold"', "quoted_text": ["Bold"]}
+    assert ai_client.locate_step(step, object())["source"] == "ocr"
+
+    monkeypatch.setattr(ai_client, "locate_labels", lambda labels, screenshot: None)
+    assert ai_client.locate_step(step, object())["x"] == 55
+
+
+def test_library_evicts_least_recently_used_icon(tmp_path):
+    library = IconLibrary(tmp_path, max_count=2)
+    library.put("Editor", "Bold", icon(0))
+    library.put("Editor", "Italic", icon(0))
+    assert library.template("Editor", "Bold") is not None
+
+    library.put("Editor", "Underline", icon(0))
+    assert library.template("Editor", "Italic") is None
+    assert library.template("Editor", "Bold") is not None
+    assert library.stats()["count"] == 2
+
+
+def test_template_is_found_on_frame():
+    pattern = np.random.default_rng(0).integers(0, 256, (32, 32)).astype(np.uint8)
+    frame = np.full((300, 400), 255, dtype=np.uint8)
+    frame[120:152, 200:232] = pattern
+
+    box = match_template(FrameSpectrum(Image.fromarray(frame)), IconTemplate(pattern.astype(np.float32)))
+    assert box is not None and abs(box[0] - 200) <= 1 and abs(box[1] - 120) <= 1
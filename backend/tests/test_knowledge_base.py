@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+import ai_client
+import knowledge_base as kb_module
+import service
+from knowledge_base import KnowledgeBase
+from service import LocalService
+
+STEPS = [{"action": 'Click "File"', "quoted_text": ["File"]}, {"action": 'Click "Save"', "quoted_text": ["Save"]}]
+
+
+@pytest.fixture
+def kb(tmp_path):
+    return KnowledgeBase(tmp_path / "knowledge.sqlite3", max_entries=2, max_age=60)
+
+
+def test_store_and_lookup_normalizes_key(kb):
+    kb.store("Text Editor", "Main window", "Save As", STEPS)
+    assert kb.lookup("text editor", "main  window", "save as!") == STEPS
+    assert kb.known("Text Editor", "Main window", ["Save As", "Print"]) == {"Save As"}
+
+
+def test_expired_entries_are_not_returned(kb):
+    kb.store("Editor", "Main", "Save", STEPS)
+    kb._connect().execute("UPDATE instructions SET created = ?", (time.time() - 120,))
+
+    assert kb.lookup("Editor", "Main", "Save") is None
+    assert kb.known("Editor", "Main", ["Save"]) == set()
+    kb.store("Editor", "Main", "Open", STEPS)
+    assert kb.stats()["count"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(kb):
+    for action in ("Save", "Open", "Print"):
+        kb.store("Editor", "Main", action, STEPS)
+        time.sleep(0.01)
+    assert kb.lookup("Editor", "Main", "Save") is None
+    assert kb.stats()["count"] == 2
+
+
+@pytest.mark.parametrize("finish_reason, stored", [("stop", True), ("length", False), (None, False)])
+def test_service_stores_only_complete_answers(kb, monkeypatch, finish_reason, stored):
+    def stream_instructions(program_name, current_location, action, frame, should_stop, result):
+        yield from STEPS
+        if finish_reason:
+            result["finish_reason"] = finish_reason
+
+    monkeypatch.setattr(kb_module, "knowledge_base", kb)
+    monkeypatch.setattr(ai_client, "stream_instructions", stream_instructions)
+    monkeypatch.setattr(service, "KNOWLEDGE_BASE_ENABLED", True)
+
+    steps = list(LocalService().instructions(None, "Editor", "Main", "Save", refresh=True))
+
+    assert steps == STEPS
+    assert (kb.lookup("Editor", "Main", "Save") is not None) == stored
@@ -0,0 +1,77 @@
+import pickle
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+import ocr_engine
+
+
+def word(text, left, top, line, width=20, height=10):
+    return (text, left, top, width, height, 90.0, line)
+
+
+def test_tile_boxes_cover_frame_with_cores():
+    boxes = ocr_engine.tile_boxes(1000, 300, tile_size=400, overlap=50)
+    cores = sorted({(core[0], core[2]) for _, core in boxes})
+    assert cores[0][0] == 0 and cores[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(cores, cores[1:]))
+
+
+def test_join_lines_merges_line_split_by_tiles():
+    words = [word("Save", 380, 100, (0, 1, 1, 1)), word("as", 410, 101, (1, 1, 1, 1)),
+             word("Open", 380, 200, (0, 1, 1, 2))]
+    joined = ocr_engine._join_lines(words)
+    assert joined[0][6] == joined[1][6]
+    assert joined[2][6] != joined[0][6]
+
+
+def test_join_lines_keeps_lines_of_same_tile_apart():
+    words = [word("File", 10, 100, (0, 1, 1, 1)), word("Edit", 40, 100, (0, 1, 1, 2))]
+    joined = ocr_engine._join_lines(words)
+    assert joined[0][6] != joined[1][6]
+
+
+def test_worker_errors_are_picklable(monkeypatch):
+    class Unpicklable(Exception):
+        def __reduce__(self):
+            raise TypeError("cannot pickle")
+
+    def fail(img):
+        raise Unpicklable("no tesseract")
+
+    monkeypatch.setattr(ocr_engine, "_recognize_image", fail)
+    with pytest.raises(RuntimeError) as error:
+        ocr_engine._recognize_tile("L", (4, 4), bytes(16))
+    assert "no tesseract" in str(pickle.loads(pickle.dumps(error.value)))
+
+
+def test_broken_pool_is_rebuilt_then_falls_back(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, **options):
+            pass
+
+    pools = []
+
+    def get_pool():
+        pools.append(BrokenPool())
+        return pools[-1]
+
+    monkeypatch.setattr(ocr_engine, "OCR_BACKEND", "pool")
+    monkeypatch.setattr(ocr_engine, "_get_pool", get_pool)
+    monkeypatch.setattr(ocr_engine, "_recognize_image", lambda img: [word("OK", 1, 1, (1, 1, 1))])
+
+    words = ocr_engine.recognize(Image.new("L", (64, 64), 255))
+    assert len(pools) == 2
+    assert [w[0] for w in words] == ["OK"]
+
+
+def test_slow_path_is_reported_once(monkeypatch, capsys):
+    monkeypatch.setattr(ocr_engine.importlib.util, "find_spec", lambda name: None)
+    monkeypatch.setattr(ocr_engine, "_slow_path_reported", False)
+    ocr_engine._report_slow_path()
+    ocr_engine._report_slow_path()
+    assert len(capsys.readouterr().out.splitlines()) == 1
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import ocr_preprocess
+
+
+def test_components_match_four_connectivity():
+    mask = np.array([
+        [1, 1, 0, 0, 1],
+        [0, 1, 0, 0, 1],
+        [0, 1, 1, 0, 0],
+        [1, 0, 0, 0, 1],
+    ], dtype=bool)
+    assert ocr_preprocess._components(mask) == [(0, 0, 2, 2), (0, 4, 1, 4), (3, 0, 3, 0), (3, 4, 3, 4)]
+
+
+def test_components_merge_u_shape_in_scan_order():
+    mask = np.array([
+        [1, 0, 1],
+        [1, 0, 1],
+        [1, 1, 1],
+    ], dtype=bool)
+    assert ocr_preprocess._components(mask) == [(0, 0, 2, 2)]
+
+
+def test_normalize_inverts_dark_theme_and_stretches_contrast():
+    gray = np.full((64, 64), 30, dtype=np.uint8)
+    gray[20:40, 10:50] = 200
+    normalized = ocr_preprocess.normalize(gray)
+    assert normalized[0, 0] == 255 and normalized[30, 30] == 0
+
+
+def test_text_regions_find_text_block():
+    img = Image.new("L", (320, 160), 255)
+    ImageDraw.Draw(img).text((40, 60), "Save As  Open File", fill=0)
+    regions = ocr_preprocess.text_regions(np.asarray(img))
+    assert len(regions) == 1
+    x, y, width, height = regions[0]
+    assert x <= 40 and y <= 60 and x + width >= 120 and height < 40
+
+
+def test_index_is_rebuilt_when_program_profile_changes(monkeypatch):
+    import ocr_utils
+    from screenshot import Frame
+
+    built = []
+    monkeypatch.setattr(ocr_preprocess, "OCR_PREPROCESS_PROFILES", {"Terminal": {"regions": False}})
+    monkeypatch.setattr(ocr_utils.OcrIndex, "from_image",
+                        classmethod(lambda cls, img, settings=None: built.append(settings) or cls([])))
+    monkeypatch.setattr(ocr_utils, "_index_cache", ocr_utils.OrderedDict())
+
+    frame = Frame(bytes([9]) * 16 * 16 * 4, (16, 16))
+    ocr_utils.get_ocr_index(frame)
+    frame.program = "Terminal"
+    ocr_utils.get_ocr_index(frame)
+    ocr_utils.get_ocr_index(frame)
+    assert [settings["regions"] for settings in built] == [True, False]
+
+
+def test_profile_matches_program_name_or_window(monkeypatch):
+    monkeypatch.setattr(ocr_preprocess, "OCR_PREPROCESS_PROFILES", {"Terminal": {"regions": False}})
+    assert ocr_preprocess.profile_for(program_name="GNOME Terminal")["regions"] is False
+    window = SimpleNamespace(wm_class="gnome-terminal-server", title="bash")
+    assert ocr_preprocess.profile_for(SimpleNamespace(program=None, window=window))["regions"] is False
+    assert ocr_preprocess.profile_for(program_name="Editor")["regions"] is True
@@ -0,0 +1,25 @@
+import ai_client
+from ocr_utils import OcrIndex, OcrWord
+
+
+def word(text, left, top=10, line=(1, 1, 1), width=30, height=10):
+    return OcrWord(text, left, top, width, height, 90.0, line)
+
+
+WORDS = [word("File", 0), word("Edit", 40), word("Help", 200), word("Save", 0, top=30, line=(1, 1, 2))]
+
+
+def test_elements_split_lines_at_wide_gaps():
+    index = OcrIndex(WORDS)
+    assert index.element_map() == "[1] File Edit @0,10,70x10\n[2] Help @200,10,30x10\n[3] Save @0,30,30x10"
+    assert index.element(3).text == "Save"
+    assert index.element(4) is None
+
+
+def test_step_takes_coordinates_from_referenced_element(monkeypatch):
+    index = OcrIndex(WORDS)
+    monkeypatch.setattr(ai_client, "get_ocr_index", lambda screenshot: index)
+
+    step = ai_client.parse_step('Click "Help" [2]', screenshot=object())
+    assert step["action"] == 'Click "Help"' and step["element_ids"] == [2]
+    assert step["coordinates"] == index.element(2).coordinates
@@ -0,0 +1,19 @@
+import ai_client
+
+
+def test_one_stream_is_split_into_blocks_per_action(monkeypatch):
+    lines = ['Action: "Save As"', 'Click "File" menu', 'Click "Save As"',
+             'Action: "Print"', 'Click "Print"']
+
+    def completion_lines(messages, should_stop, max_tokens, result, **options):
+        result["finish_reason"] = "length"
+        yield from lines
+
+    monkeypatch.setattr(ai_client, "completion_lines", completion_lines)
+    monkeypatch.setattr(ai_client, "all_instructions_messages", lambda *args: [])
+
+    events = [(action, step and step["action"]) for action, step in
+              ai_client.stream_all_instructions("Editor", "Main", ["Save As", "Print"], None)]
+    # Обрізаний останній блок не вважається завершеним
+    assert events == [("Save As", 'Click "File" menu'), ("Save As", 'Click "Save As"'),
+                      ("Save As", None), ("Print", 'Click "Print"')]
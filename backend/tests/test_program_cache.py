@@ -0,0 +1,39 @@
+import time
+
+from program_cache import ProgramCache
+
+
+def make_cache(tmp_path, **options):
+    return ProgramCache(tmp_path / "define_program.json", **options)
+
+
+def test_exact_hit(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store(0b1011, {"Name": "Editor"})
+    assert cache.lookup(0b1011) == {"Name": "Editor"}
+
+
+def test_near_hit_within_threshold(tmp_path):
+    cache = make_cache(tmp_path, threshold=2)
+    cache.store(0b1111, {"Name": "Editor"})
+    assert cache.lookup(0b1110) == {"Name": "Editor"}
+    assert cache.lookup(0b0000) is None
+
+
+def test_expired_exact_hit_is_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_age=60)
+    cache.store(7, {"Name": "Editor"})
+    for entries in (cache._memory, cache._disk):
+        entries[format(7, "x")]["created"] = time.time() - 120
+
+    assert cache.lookup(7) is None
+    assert not cache._memory and not cache._disk
+
+
+def test_expired_entries_not_loaded_from_disk(tmp_path):
+    cache = make_cache(tmp_path, max_age=60)
+    cache.store(7, {"Name": "Editor"})
+    cache._disk[format(7, "x")]["created"] = time.time() - 120
+    cache._save_disk()
+
+    assert make_cache(tmp_path, max_age=60).lookup(7) is None
@@ -0,0 +1,20 @@
+from desktop import WindowInfo
+from program_identity import identify_program
+
+
+def window(title: str, wm_class: str = "") -> WindowInfo:
+    return WindowInfo(title=title, wm_class=wm_class, left=0, top=0, width=800, height=600)
+
+
+def test_known_program_by_class_keeps_document_as_location():
+    identity = identify_program(window("report.docx - Word", "OpusApp"))
+    assert identity["Name"] == "Microsoft Word"
+    assert identity["Location"] == "report.docx"
+    assert "Save As" in identity["Actions"]
+
+
+def test_unknown_program_is_named_by_title_suffix():
+    assert identify_program(window("notes.txt - Gedit", "gedit")) == {
+        "Name": "Gedit", "Location": "notes.txt", "Actions": []}
+    assert identify_program(window("Untitled", "unknown")) is None
+    assert identify_program(None) is None
@@ -0,0 +1,33 @@
+import os
+
+from screenshot import Frame
+from screenshot_store import ScreenshotStore
+
+
+def make_frame(value: int) -> Frame:
+    return Frame(bytes([value]) * 16 * 16 * 4, (16, 16))
+
+
+def test_identical_frames_are_stored_once(tmp_path):
+    store = ScreenshotStore(tmp_path, fmt="PNG")
+    path = store.put(make_frame(1))
+    assert store.put(make_frame(1)) == path
+    assert store.stats()["count"] == 1
+    assert store.open(make_frame(1).digest).size == (16, 16)
+
+
+def test_least_recently_used_frames_are_evicted(tmp_path):
+    store = ScreenshotStore(tmp_path, fmt="PNG", max_count=2)
+    frames = [make_frame(value) for value in (1, 2, 3)]
+    paths = [store.put(frame) for frame in frames]
+    assert frames[0].digest not in store and not os.path.exists(paths[0])
+    assert frames[2].digest in store
+
+
+def test_old_frames_expire_on_load(tmp_path):
+    store = ScreenshotStore(tmp_path, fmt="PNG", max_age=60)
+    frame = make_frame(1)
+    store.put(frame)
+    store._entries[frame.digest]["used"] -= 120
+    store._save()
+    assert frame.digest not in ScreenshotStore(tmp_path, fmt="PNG", max_age=60)
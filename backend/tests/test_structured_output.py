@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import ai_client
+from structured_output import StructuredOutputError, decode, partial, response_format, schema
+
+STEPS = [{"action": 'Click "File"', "labels": ["File"]}, {"action": 'Click "Save"', "labels": ["Save"]}]
+
+
+def test_schema_inlines_step_fields():
+    steps = schema("instructions", ("element",))["properties"]["steps"]["items"]
+    assert steps["required"] == ["action", "labels", "element"]
+    assert response_format("instructions")["json_schema"]["strict"] is True
+
+
+def test_decode_valid_reply():
+    assert decode(json.dumps({"steps": STEPS}), "instructions") == {"steps": STEPS}
+
+
+@pytest.mark.parametrize("text, error", [
+    ("not json", "не JSON"),
+    ('{"steps": [{"action": "Click", "labels": []}], "extra": 1}', "зайве поле"),
+    ('{"steps": [{"action": 1, "labels": []}]}', "очікується string"),
+    ('{"steps": [{"action": "Click"}]}', "поле відсутнє"),
+    ('{"name": "Editor", "location": "Main", "actions": [true]}', "очікується string"),
+])
+def test_decode_rejects_invalid_replies(text, error):
+    name = "program" if "name" in text else "instructions"
+    with pytest.raises(StructuredOutputError, match=error):
+        decode(text, name)
+
+
+def test_partial_keeps_only_complete_items():
+    text = json.dumps({"steps": STEPS})
+    truncated = text[:text.index("Save") + 2]
+    assert partial(truncated, "instructions") == {"steps": STEPS[:1]}
+
+
+def test_partial_rejects_non_array_schema():
+    with pytest.raises(StructuredOutputError, match="обрізана"):
+        partial('{"name": "Edi', "program")
+
+
+def test_truncated_reply_is_not_repaired(monkeypatch):
+    monkeypatch.setattr(ai_client.client, "create", lambda **kwargs: pytest.fail("unexpected repair"))
+    text = json.dumps({"instructions": [{"action": "Save As", "steps": STEPS},
+                                        {"action": "Print", "steps": STEPS}]})
+    reply = ai_client.structured_reply(text[:-30], "all_instructions", finish_reason="length")
+    assert [block["action"] for block in reply["instructions"]] == ["Save As"]
+
+
+def test_truncated_program_reply_gives_empty_result(monkeypatch):
+    monkeypatch.setattr(ai_client, "RESPONSE_FORMAT", "json")
+    monkeypatch.setattr(ai_client.client, "create", lambda **kwargs: pytest.fail("unexpected repair"))
+    response = SimpleNamespace(choices=[SimpleNamespace(
+        message=SimpleNamespace(content='{"name": "Te'), finish_reason="length")])
+
+    program = ai_client.program_result(response, None, use_cache=False)
+    assert program == {"Name": None, "Location": None, "Actions": []}
+
+
+def test_all_instructions_keep_only_requested_complete_blocks(monkeypatch):
+    blocks = [{"action": "save as", "steps": STEPS}, {"action": "Made up", "steps": STEPS},
+              {"action": "Print", "steps": STEPS}]
+    text = json.dumps({"instructions": blocks})
+
+    def completion_lines(messages, should_stop, max_tokens, result, **options):
+        result["finish_reason"] = "length"
+        yield text[:-20]
+
+    monkeypatch.setattr(ai_client, "RESPONSE_FORMAT", "json")
+    monkeypatch.setattr(ai_client, "completion_lines", completion_lines)
+    monkeypatch.setattr(ai_client, "json_step", lambda item, screenshot: dict(item))
+
+    events = list(ai_client.stream_all_instructions("Editor", "Main", ["Save As", "Print"], None))
+    assert events == [("Save As", STEPS[0]), ("Save As", STEPS[1]), ("Save As", None)]
+
+
+def test_invalid_reply_is_repaired_by_one_text_request(monkeypatch):
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        content = json.dumps({"steps": STEPS})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    monkeypatch.setattr(ai_client.client, "create", create)
+    assert ai_client.structured_reply('{"steps": [{"action": "Click"', "instructions") == {"steps": STEPS}
+    assert len(requests) == 1 and "image_url" not in json.dumps(requests[0]["messages"])
@@ -0,0 +1,39 @@
+import threading
+
+from tasks import TaskScheduler
+
+
+def test_new_task_cancels_previous_in_channel():
+    tasks = TaskScheduler(max_workers=1, lanes={})
+    first = tasks.submit("instructions", lambda task: task)
+    first_task = first.result(timeout=5)
+    assert not first_task.cancelled
+
+    tasks.submit("instructions", lambda task: task).result(timeout=5)
+    assert first_task.cancelled
+    tasks.shutdown()
+
+
+def test_cancel_skips_queued_task_and_keeps_other_channels():
+    tasks = TaskScheduler(max_workers=1, lanes={})
+    release = threading.Event()
+    tasks.submit("busy", lambda task: release.wait(5))
+    queued = tasks.submit("instructions", lambda task: "ran")
+    other = tasks.submit("screenshot", lambda task: "ran")
+    tasks.cancel("instructions")
+    release.set()
+
+    assert queued.result(timeout=5) is None
+    assert other.result(timeout=5) == "ran"
+    tasks.shutdown()
+
+
+def test_lane_does_not_block_other_channels():
+    tasks = TaskScheduler(max_workers=1, lanes={"prefetch": 1})
+    release = threading.Event()
+    prefetch = tasks.submit("prefetch", lambda task: release.wait(5))
+
+    assert tasks.submit("instructions", lambda task: "clicked").result(timeout=2) == "clicked"
+    release.set()
+    assert prefetch.result(timeout=5) is True
+    tasks.shutdown()
@@ -0,0 +1,42 @@
+import threading
+from types import SimpleNamespace
+
+import tracing
+
+
+def test_trace_sums_direct_stages_and_tokens():
+    with tracing.trace("screenshot") as root:
+        with tracing.span("capture"):
+            with tracing.span("encode"):
+                pass
+        with tracing.span("api") as item:
+            item.add_usage(SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+        tracing.record("parse", 0.25)
+
+    assert set(root.stages) == {"capture", "api", "parse"}
+    assert root.stages["parse"] == 0.25
+    assert root.tokens == {"prompt_tokens": 10, "completion_tokens": 5}
+    assert root.breakdown_text().endswith("15 tok")
+
+
+def test_spans_from_helper_threads_join_the_trace():
+    def work():
+        with tracing.span("ocr"):
+            pass
+
+    with tracing.trace("screenshot") as root:
+        thread = threading.Thread(target=tracing.run_in_context(work))
+        thread.start()
+        thread.join()
+    assert "ocr" in root.stages
+
+
+def test_metrics_render_prometheus_histograms():
+    metrics = tracing.Metrics(buckets=(0.1, 1.0))
+    metrics.observe("screenshot", "api", 0.5)
+    metrics.add_tokens("prompt", 7)
+
+    text = metrics.render()
+    assert 'koi_span_seconds_bucket{trace="screenshot",span="api",le="0.1"} 0' in text
+    assert 'koi_span_seconds_bucket{trace="screenshot",span="api",le="1.0"} 1' in text
+    assert 'koi_tokens_total{kind="prompt"} 7' in text
@@ -0,0 +1,45 @@
+from screenshot import Frame
+from watcher import changed_regions, mask_regions, tile_hashes
+
+
+def make_frame(width, height, left=0, top=0, fill=0):
+    return Frame(bytes([fill]) * width * height * 4, (width, height), left=left, top=top)
+
+
+def paint(frame, x, y, width, height, value=255):
+    raw = bytearray(frame.raw)
+    stride = frame.width * 4
+    for row in range(y, y + height):
+        raw[row * stride + x * 4:row * stride + (x + width) * 4] = bytes([value]) * width * 4
+    frame.raw = bytes(raw)
+    return frame
+
+
+def test_change_under_mask_is_ignored():
+    previous = make_frame(64, 64, left=100, top=50)
+    frame = paint(make_frame(64, 64, left=100, top=50), 10, 10, 8, 8)
+
+    masked = mask_regions(frame, previous, [(105, 55, 20, 20)])
+
+    assert masked.raw == previous.raw
+    assert tile_hashes(masked, 16) == tile_hashes(previous, 16)
+
+
+def test_change_outside_mask_is_kept():
+    previous = make_frame(64, 64)
+    frame = paint(make_frame(64, 64), 40, 40, 8, 8)
+
+    masked = mask_regions(frame, previous, [(0, 0, 20, 20), (200, 200, 10, 10)])
+
+    assert masked.raw == frame.raw
+    assert tile_hashes(masked, 16) != tile_hashes(previous, 16)
+
+
+def test_changed_tiles_merge_into_one_region():
+    previous = make_frame(64, 64)
+    frame = paint(make_frame(64, 64), 20, 4, 16, 8)
+
+    old, new = tile_hashes(previous, 16), tile_hashes(frame, 16)
+    changed = {tile for tile, (a, b) in enumerate(zip(old, new)) if a != b}
+    assert changed == {1, 2}
+    assert changed_regions(changed, 4, frame, 16) == [(16, 0, 32, 16)]
@@ -0,0 +1,247 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logging.handlers import RotatingFileHandler
+
+from config import (TRACE_ENABLED, TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS,
+                    METRICS_PORT)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("koi_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """Відрізок часу одного етапу; корінь (trace) збирає суми своїх прямих етапів"""
+
+    def __init__(self, name: str, parent: "Span" = None, attrs: dict = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.id = next(_span_ids)
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.duration = None
+        self.stages = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def finish(self, duration: float = None):
+        self.duration = time.perf_counter() - self._started if duration is None else duration
+        if self.parent is self.root:
+            with self.root._lock:
+                self.root.stages[self.name] = self.root.stages.get(self.name, 0.0) + self.duration
+        _metrics.observe(self.root.name, self.name, self.duration)
+        _export(self)
+
+    def add_usage(self, usage):
+        """Додає кількість токенів відповіді OpenAI до відрізка та його кореня"""
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            count = getattr(usage, kind, None) or 0
+            self.attrs[kind] = self.attrs.get(kind, 0) + count
+            with self.root._lock:
+                self.root.tokens[kind] = self.root.tokens.get(kind, 0) + count
+            _metrics.add_tokens(kind.split("_")[0], count)
+
+    def breakdown_text(self) -> str:
+        """Короткий підсумок для статус-бару: 'capture 20ms · api 1.4s · 812 tok'"""
+        with self._lock:
+            stages = list(self.stages.items())
+            tokens = sum(self.tokens.values())
+        parts = [f"{name} {_format_duration(seconds)}" for name, seconds in stages]
+        if tokens:
+            parts.append(f"{tokens} tok")
+        return " · ".join(parts)
+
+    def timings(self) -> dict:
+        """Етапи та токени кореня для передачі в інший процес (див. merge)"""
+        with self._lock:
+            return {"stages": dict(self.stages), "tokens": dict(self.tokens)}
+
+    def to_record(self) -> dict:
+        return {
+            "trace": self.root.name,
+            "trace_id": self.root.id,
+            "span": self.name,
+            "span_id": self.id,
+            "parent_id": self.parent.id if self.parent else None,
+            "start": round(self.start, 3),
+            "duration_ms": round(self.duration * 1000, 2),
+            "thread": threading.current_thread().name,
+            **self.attrs
+        }
+
+
+def _format_duration(seconds: float) -> str:
+    return f"{seconds:.1f}s" if seconds >= 1 else f"{seconds * 1000:.0f}ms"
+
+
+def current() -> Span:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, parent: Span = None, **attrs):
+    """Вимірює етап name як дочірній до поточного відрізка (або parent)"""
+    item = Span(name, parent or _current.get(), attrs)
+    token = _current.set(item)
+    try:
+        yield item
+    except Exception as e:
+        item.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        item.finish()
+
+
+@contextmanager
+def trace(name: str):
+    """Продовжує поточну трасу або починає нову з коренем name"""
+    active = _current.get()
+    if active is not None:
+        yield active.root
+        return
+    with span(name) as root:
+        yield root
+
+
+def record(name: str, duration: float, usage=None, **attrs) -> Span:
+    """Записує вже виміряний етап (наприклад, потік відповіді через генератор)"""
+    item = Span(name, _current.get(), attrs)
+    item.start -= duration
+    item.add_usage(usage)
+    item.finish(duration)
+    return item
+
+
+def merge(stages: dict, tokens: dict = None):
+    """Додає до поточної траси етапи та токени, виміряні в іншому процесі (демоні)"""
+    active = _current.get()
+    if active is None:
+        return
+    root = active.root
+    with root._lock:
+        for name, seconds in stages.items():
+            root.stages[name] = root.stages.get(name, 0.0) + seconds
+        for kind, count in (tokens or {}).items():
+            root.tokens[kind] = root.tokens.get(kind, 0) + count
+
+
+def run_in_context(fn):
+    """Обгортає fn для іншого потоку так, щоб її відрізки належали поточній трасі"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class Metrics:
+    """Гістограми тривалості етапів і лічильники токенів у форматі Prometheus"""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def observe(self, trace_name: str, name: str, seconds: float):
+        with self._lock:
+            counts, total = self._histograms.get((trace_name, name), ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._histograms[(trace_name, name)] = (counts, total + seconds)
+
+    def add_tokens(self, kind: str, count: int):
+        with self._lock:
+            self._tokens[kind] = self._tokens.get(kind, 0) + count
+
+    def render(self) -> str:
+        lines = ["# HELP koi_span_seconds Stage duration",
+                 "# TYPE koi_span_seconds histogram"]
+        with self._lock:
+            for (trace_name, name), (counts, total) in sorted(self._histograms.items()):
+                labels = f'trace="{trace_name}",span="{name}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'koi_span_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'koi_span_seconds_bucket{{{labels},le="+Inf"}} {counts[-1]}')
+                lines.append(f"koi_span_seconds_sum{{{labels}}} {total:.6f}")
+                lines.append(f"koi_span_seconds_count{{{labels}}} {counts[-1]}")
+
+            lines += ["# HELP koi_tokens_total OpenAI tokens used",
+                      "# TYPE koi_tokens_total counter"]
+            for kind, count in sorted(self._tokens.items()):
+                lines.append(f'koi_tokens_total{{kind="{kind}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+_logger = None
+_logger_lock = threading.Lock()
+_server = None
+
+
+def _get_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = logging.getLogger("koi.spans")
+            _logger.propagate = False
+            _logger.setLevel(logging.INFO)
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES,
+                                          backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+        return _logger
+
+
+def _export(item: Span):
+    if not TRACE_ENABLED:
+        return
+    try:
+        _get_logger().info(json.dumps(item.to_record(), ensure_ascii=False, default=str))
+    except Exception as e:
+        print(f"⚠️ Трасування: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = _metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Запускає локальний /metrics endpoint (лише 127.0.0.1), якщо заданий порт"""
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Метрики: порт {port} недоступний ({e})")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Метрики: http://127.0.0.1:{port}/metrics")
+    return _server
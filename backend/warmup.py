@@ -0,0 +1,50 @@
+import importlib
+import threading
+
+import tracing
+from config import DAEMON_MODE
+
+HEAVY_MODULES = ["screenshot", "program_cache", "ocr_utils", "watcher", "ai_client"]
+
+_thread = None
+
+
+def warm_up(connect: bool = False):
+    """Імпортує важкі модулі, відкриває з'єднання з API та перевіряє tesseract (або під'єднується до демона)"""
+    with tracing.trace("warm_up"):
+        if connect:
+            from service import DaemonClient, get_service
+            with tracing.span("daemon_connect"):
+                if isinstance(get_service(), DaemonClient):
+                    return
+
+        with tracing.span("imports"):
+            for name in HEAVY_MODULES:
+                importlib.import_module(name)
+
+        import ai_client
+        with tracing.span("api_connect"):
+            ai_client.client.warm_up()
+
+        from config import TESSERACT_PATH
+        import ocr_engine
+        import pytesseract
+        with tracing.span("tesseract"):
+            if not TESSERACT_PATH:
+                print("⚠️ Tesseract не знайдено: задайте TESSERACT_PATH або додайте tesseract у PATH")
+                return
+            try:
+                version = pytesseract.get_tesseract_version()
+                ocr_engine.warm_up()
+                print(f"🔤 Tesseract {version}")
+            except Exception as e:
+                print(f"⚠️ Tesseract недоступний: {e}")
+
+
+def start(connect: bool = DAEMON_MODE != "off") -> threading.Thread:
+    """Запускає прогрів у фоновому потоці (один раз)"""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=warm_up, args=(connect,), name="warm-up", daemon=True)
+        _thread.start()
+    return _thread
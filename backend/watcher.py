@@ -0,0 +1,181 @@
+import threading
+import zlib
+
+from config import WATCH_INTERVAL, WATCH_TILE_SIZE, WATCH_REDEFINE_FRACTION
+from screenshot import Frame, capture_frame
+from ocr_utils import update_ocr_index
+
+
+def tile_hashes(frame: Frame, tile_size: int = WATCH_TILE_SIZE) -> list:
+    """Рахує CRC32 кожної плитки tile_size x tile_size сирого BGRA буфера"""
+    width, height = frame.size
+    stride = width * 4
+    columns = (width + tile_size - 1) // tile_size
+    raw = memoryview(frame.raw)
+
+    hashes = []
+    for band_top in range(0, height, tile_size):
+        band = [0] * columns
+        for y in range(band_top, min(band_top + tile_size, height)):
+            row = raw[y * stride:(y + 1) * stride]
+            for column in range(columns):
+                band[column] = zlib.crc32(row[column * tile_size * 4:(column + 1) * tile_size * 4],
+                                          band[column])
+        hashes.extend(band)
+    return hashes
+
+
+def mask_regions(frame: Frame, previous: Frame, masks) -> Frame:
+    """Копіює з попереднього кадру пікселі під власними вікнами (left, top, width, height на екрані)"""
+    if not masks or frame.size != previous.size:
+        return frame
+    stride = frame.width * 4
+    raw, old = None, memoryview(previous.raw)
+    for left, top, width, height in masks:
+        x0, y0 = max(0, left - frame.left), max(0, top - frame.top)
+        x1 = min(frame.width, left + width - frame.left)
+        y1 = min(frame.height, top + height - frame.top)
+        if x1 <= x0 or y1 <= y0:
+            continue
+        if raw is None:
+            raw = bytearray(frame.raw)
+        for y in range(y0, y1):
+            start, end = y * stride + x0 * 4, y * stride + x1 * 4
+            raw[start:end] = old[start:end]
+    if raw is not None:
+        frame.raw = bytes(raw)
+    return frame
+
+
+def changed_regions(changed: set, columns: int, frame: Frame, tile_size: int = WATCH_TILE_SIZE) -> list:
+    """Об'єднує сусідні змінені плитки у прямокутники (left, top, width, height)"""
+    regions = []
+    remaining = set(changed)
+    while remaining:
+        stack = [remaining.pop()]
+        tiles = []
+        while stack:
+            tile = stack.pop()
+            tiles.append(tile)
+            column = tile % columns
+            neighbours = [tile - columns, tile + columns]
+            if column > 0:
+                neighbours.append(tile - 1)
+            if column < columns - 1:
+                neighbours.append(tile + 1)
+            for neighbour in neighbours:
+                if neighbour in remaining:
+                    remaining.remove(neighbour)
+                    stack.append(neighbour)
+
+        rows = [t // columns for t in tiles]
+        cols = [t % columns for t in tiles]
+        left, top = min(cols) * tile_size, min(rows) * tile_size
+        right = min((max(cols) + 1) * tile_size, frame.width)
+        bottom = min((max(rows) + 1) * tile_size, frame.height)
+        regions.append((left, top, right - left, bottom - top))
+    return regions
+
+
+def watch_step(previous: Frame, previous_hashes: list, masks=(), tile_size: int = WATCH_TILE_SIZE,
+               redefine_fraction: float = WATCH_REDEFINE_FRACTION) -> tuple:
+    """Захоплює область кадру знову: (None | "update" | "redefine", кадр, хеші плиток)"""
+    frame = mask_regions(capture_frame(save=False, region=previous.region), previous, masks)
+    frame.primary_size = previous.primary_size
+    frame.mode = previous.mode
+    frame.window = previous.window
+    frame.program = previous.program
+    if frame.raw == previous.raw:
+        return None, previous, previous_hashes
+
+    hashes = tile_hashes(frame, tile_size)
+    changed = {i for i, (old, new) in enumerate(zip(previous_hashes, hashes)) if old != new}
+    if not changed:
+        return None, previous, previous_hashes
+
+    fraction = len(changed) / len(hashes)
+    if fraction >= redefine_fraction:
+        print(f"👁 Змінилось {fraction:.0%} екрану - новий аналіз")
+        return "redefine", frame, hashes
+
+    columns = (frame.width + tile_size - 1) // tile_size
+    regions = changed_regions(changed, columns, frame, tile_size)
+    print(f"👁 Змінилось {len(changed)} плиток, OCR {len(regions)} областей")
+
+    update_ocr_index(previous, frame, regions)
+    return "update", frame, hashes
+
+
+class ScreenWatcher:
+    """Стежить за областю кадру й оновлює OCR лише у змінених плитках"""
+
+    def __init__(self, on_update, on_redefine, should_watch=None, masks=None, service=None,
+                 interval: float = WATCH_INTERVAL):
+        self.on_update = on_update
+        self.on_redefine = on_redefine
+        self.should_watch = should_watch
+        self.masks = masks
+        self.service = service
+        self.interval = interval
+        self._frame = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, frame: Frame):
+        """Починає стежити за областю кадру frame"""
+        self.stop()
+        self.reset(frame)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def reset(self, frame: Frame):
+        """Приймає новий базовий кадр (наприклад, після нового скріншоту)"""
+        with self._lock:
+            self._frame = frame
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.should_watch and not self.should_watch():
+                continue
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"❌ Помилка спостереження: {e}")
+
+    def _tick(self):
+        with self._lock:
+            previous = self._frame
+        if previous is None:
+            return
+
+        # Сервіс береться на кожному кроці: якщо демон зник, get_service уже віддасть локальний
+        from service import get_service
+        service = self.service or get_service()
+        event, frame = service.watch(previous, self.masks() if self.masks else ())
+        if event is None:
+            return
+        if event == "redefine":
+            self._replace(previous, frame)
+            self.on_redefine(frame)
+        elif self._replace(previous, frame):
+            self.on_update(frame)
+
+    def _replace(self, previous: Frame, frame: Frame) -> bool:
+        """Замінює базовий кадр, якщо його не змінили ззовні під час обробки"""
+        with self._lock:
+            if self._frame is not previous:
+                return False
+            self._frame = frame
+            return True